@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+#
+# Description:
+#     Benchmark raid.py on representative workloads and check that
+#     its results still match the golden outputs of the examples in
+#     README.md.
+#
+# License:
+#     The same as raid.py, see the LICENSE file.
+#
+import getopt
+import itertools
+import json
+import os
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+RAID = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'raid.py')
+README = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'README.md')
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+# The workloads in addition to the examples of README.md: (name,
+# arguments, data rows). The startup workload does not compute
+# anything. Unlike the timings of the baseline, the row counts do not
+# depend on the machine.
+WORKLOADS = [
+    ('startup', ['-V'], 0),
+    ('large-n', ['-n', '2-20000', '--no-key'], 119991),
+    ('large-n-csv', ['-n', '2-20000', '--csv'], 119991),
+    ('large-n-sweep', ['-n', '2-50000', '--sweep', '--no-key'], 299991),
+    ('many-filters', ['-n', '2-20000', '--no-key'] +
+     [x for n in range(0, 1000, 10) for x in ['-f', r'RAID-10\(M=%d\)' % (n)]] +
+     ['-f', 'Z1', '-f', 'Z2', '-f', 'Z3'], 60093),
+    ('ranges', ['-n', '3-24', '--mtbf', '500000-1500000:100000',
+                '--mttr', '12-48:12', '-j', '1', '--no-key'], 5764),
+    ]
+
+# A data row of a text or CSV report.
+ROW = re.compile(r'^\s*\d+\s+\d+\s+\S+|^,,\d')
+
+def usage():
+    p = os.path.basename(sys.argv[0])
+    print("""
+NAME
+        %s - benchmark raid.py
+
+SYNOPSIS
+        %s [OPTIONS]
+
+DESCRIPTION
+        Run the examples of README.md and a set of larger
+        workloads: big -n ranges, many filters, CSV and text output
+        and parameter ranges. Report the rows per second, the wall
+        time and the peak memory of each one. The startup workload
+        measures the time to start raid.py.
+
+        The data rows of the examples are compared with the golden
+        outputs in README.md, and the row counts of the other
+        workloads with the counts in this script. The timings and
+        the memory are compared with a baseline saved by an earlier
+        run on the same machine. The first run saves one when there
+        is none, the baseline is not part of the source tree. The
+        exit status is 1 if a golden output or a row count does not
+        match, or a workload regressed.
+
+OPTIONS
+        -b <file>, --baseline <file>
+                        The baseline file. The default is
+                        bench_baseline.json next to this script,
+                        which is ignored by git.
+
+        -h, --help      This help message.
+
+        -p <python>, --python <python>
+                        The Python interpreter that runs raid.py. The
+                        default is the one running this script.
+
+        -r <n>, --repeat <n>
+                        The number of runs of each workload, the
+                        fastest one is reported. The default is 3.
+
+        -s, --save      Save the results as the new baseline.
+
+        -t <pct>, --tolerance <pct>
+                        The slowdown or memory growth, in percent,
+                        that is reported as a regression. The default
+                        is 25.
+
+        -w <pattern>, --workload <pattern>
+                        Only run the workloads whose names match the
+                        pattern. The golden outputs are always
+                        checked.
+""" % (p,p))
+    sys.exit(0)
+
+def run(python, args, count=False):
+    """
+    Run raid.py.
+
+    The peak RSS of a child includes the peak RSS of this process
+    before the exec, so the output of the large workloads is counted
+    line by line instead of being read into memory.
+
+    @param python  The Python interpreter.
+    @param args    The arguments of raid.py.
+    @param count   Return the number of data rows instead of the
+                   output, unless it failed.
+    @returns the (exit status, output or rows, seconds, peak RSS in KB)
+             tuple.
+    """
+    with tempfile.TemporaryFile('w+') as out:
+        start = time.time()
+        p = subprocess.Popen([python, RAID] + args, stdout=out, stderr=subprocess.STDOUT)
+        (pid, status, rusage) = os.wait4(p.pid, 0)
+        seconds = time.time() - start
+        out.seek(0)
+        if count and status == 0:
+            return (status, sum(1 for line in out if ROW.match(line)), seconds, rusage.ru_maxrss)
+        return (status, out.read(), seconds, rusage.ru_maxrss)
+
+def data_rows(text):
+    """
+    Get the data rows of a report.
+
+    @param text  The report.
+    @returns the list of rows, each one split into its columns.
+    """
+    return [line.split() for line in text.splitlines() if ROW.match(line)]
+
+def examples(text):
+    """
+    Get the examples of README.md.
+
+    Each example is a code block that starts with its header
+    comment.
+
+    @param text  The README.md text.
+    @returns the list of (name, commands, golden rows) tuples where
+             commands is the list of raid.py argument lists.
+    """
+    result = []
+    for block in re.split(r'\n\s*% # =+\n\s*% # Example ', text)[1:]:
+        block = block.split('\n```')[0]
+        name = 'example-' + block.split(':')[0]
+        commands = []
+        golden = []
+        cmd = None
+        for line in block.splitlines():
+            line = line.strip()
+            if cmd is None and re.search(r'^(% )?python3? \S+ ', line):
+                cmd = ''
+            if cmd is not None:
+                cmd += line.rstrip('\\') + ' '
+                if not line.endswith('\\'):
+                    commands.append(shlex.split(cmd.split(None, 2 if cmd.startswith('%') else 1)[-1])[1:])
+                    cmd = None
+            elif ROW.match(line):
+                golden.append(line.split())
+        result.append((name, commands, golden))
+    return result
+
+def check_golden(python):
+    """
+    Check the data rows of the examples against README.md.
+
+    @param python  The Python interpreter.
+    @returns the (examples, errors) tuple where errors is the list of
+             error messages.
+    """
+    with open(README) as fp:
+        result = examples(fp.read())
+    errors = []
+    for (name, commands, golden) in result:
+        rows = []
+        for args in commands:
+            (status, out, seconds, rss) = run(python, args)
+            if status != 0:
+                errors.append('%s: raid.py %s failed:\n%s' % (name, ' '.join(args), out))
+            rows.extend(data_rows(out))
+        if not golden:
+            errors.append('%s: no golden rows found' % (name))
+        for (i, (x, y)) in enumerate(itertools.zip_longest(golden, rows)):
+            if x != y:
+                errors.append('%s: row %d is %s, expected %s' % (name, i+1, y and ' '.join(y), x and ' '.join(x)))
+                break
+    return (result, errors)
+
+def bench(python, workloads, repeat=3):
+    """
+    Run the workloads.
+
+    @param python     The Python interpreter.
+    @param workloads  The list of (name, list of argument lists).
+    @param repeat     The number of runs of each workload.
+    @returns the dictionary of the results keyed by workload name:
+             rows, seconds (of the fastest run), rows_per_sec and
+             max_rss_kb.
+    """
+    results = {}
+    for (name, commands) in workloads:
+        best = None
+        rss = 0
+        for i in range(repeat):
+            seconds = 0.
+            rows = 0
+            for args in commands:
+                (status, out, t, m) = run(python, args, True)
+                if status != 0:
+                    sys.exit('%s: raid.py %s failed:\n%s' % (name, ' '.join(args), out))
+                seconds += t
+                rows += out
+                rss = max(rss, m)
+            if best is None or seconds < best:
+                best = seconds
+        results[name] = {'rows': rows, 'seconds': best,
+                         'rows_per_sec': rows/best if best > 0 else 0.,
+                         'max_rss_kb': rss}
+        sys.stdout.write('%-16s %9d %9.3f %11.0f %10d\n' % (name, rows, best, results[name]['rows_per_sec'], rss))
+        sys.stdout.flush()
+    return results
+
+def regressions(results, baseline, tolerance=25.):
+    """
+    Compare the results with the baseline.
+
+    @param results    The results of bench().
+    @param baseline   The results of an earlier run.
+    @param tolerance  The allowed slowdown and memory growth in percent.
+    @returns the list of regression messages.
+    """
+    msgs = []
+    limit = 1. + tolerance/100.
+    for (name, r) in sorted(results.items()):
+        b = baseline.get(name)
+        if b is None:
+            continue
+        if r['seconds'] > b['seconds']*limit:
+            msgs.append('%s: %.3fs, the baseline is %.3fs' % (name, r['seconds'], b['seconds']))
+        if r['max_rss_kb'] > b['max_rss_kb']*limit:
+            msgs.append('%s: %dKB, the baseline is %dKB' % (name, r['max_rss_kb'], b['max_rss_kb']))
+    return msgs
+
+def check_rows(results, workloads):
+    """
+    Check the row counts of the workloads.
+
+    @param results    The results of bench().
+    @param workloads  The list of (name, arguments, data rows).
+    @returns the list of error messages.
+    """
+    return ['%s: %d rows, expected %d' % (name, results[name]['rows'], rows)
+            for (name, args, rows) in workloads
+            if name in results and results[name]['rows'] != rows]
+
+def main():
+    """
+    main
+    """
+    try:
+        opts, args = getopt.gnu_getopt(sys.argv[1:], 'b:hp:r:st:w:',
+                                       ['baseline=', 'help', 'python=', 'repeat=',
+                                        'save', 'tolerance=', 'workload='])
+    except getopt.GetoptError as err:
+        print(str(err))
+        print('exiting ...')
+        sys.exit(1)
+
+    baseline = BASELINE
+    python = sys.executable
+    repeat = 3
+    save = False
+    tolerance = 25.
+    pattern = None
+    for opt,arg in opts:
+        if opt in ['-h', '--help']:
+            usage()
+        elif opt in ['-b', '--baseline']:
+            baseline = arg
+        elif opt in ['-p', '--python']:
+            python = arg
+        elif opt in ['-r', '--repeat', '-t', '--tolerance']:
+            try:
+                x = float(arg)
+            except ValueError:
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            if opt in ['-r', '--repeat']:
+                repeat = max(1, int(x))
+            else:
+                tolerance = x
+        elif opt in ['-s', '--save']:
+            save = True
+        elif opt in ['-w', '--workload']:
+            pattern = re.compile(arg)
+
+    (found, errors) = check_golden(python)
+    for msg in errors:
+        print('GOLDEN MISMATCH %s' % (msg))
+    print('golden outputs: %d examples, %d errors' % (len(found), len(errors)))
+
+    workloads = [(name, commands) for (name, commands, golden) in found]
+    workloads += [(name, [args]) for (name, args, rows) in WORKLOADS]
+    if pattern is not None:
+        workloads = [x for x in workloads if pattern.search(x[0])]
+    print()
+    print('%-16s %9s %9s %11s %10s' % ('workload', 'rows', 'seconds', 'rows/s', 'RSS (KB)'))
+    print('%-16s %9s %9s %11s %10s' % ('='*16, '='*9, '='*9, '='*11, '='*10))
+    results = bench(python, workloads, repeat)
+
+    failed = len(errors) > 0
+    msgs = check_rows(results, WORKLOADS)
+    for msg in msgs:
+        print('ROW COUNT MISMATCH %s' % (msg))
+    failed = failed or len(msgs) > 0
+    if save or not os.path.exists(baseline):
+        with open(baseline, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+        print('saved the baseline to %s' % (baseline))
+    else:
+        with open(baseline) as fp:
+            msgs = regressions(results, json.load(fp), tolerance)
+        for msg in msgs:
+            print('REGRESSION %s' % (msg))
+        print('baseline %s: %d regressions' % (baseline, len(msgs)))
+        failed = failed or len(msgs) > 0
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-#!/usr/bin/env python2.7
+#!/usr/bin/env python3
 #
 # Author:        Joe Linoff
 # Version:       1
@@ -24,17 +24,76 @@
 #     tool; if not, write to the Free Software Foundation, Inc., 59
 #     Temple Place, Suite 330, Boston, MA 02111-1307 USA.
 #
+# Only the modules that every run needs are imported here. NumPy, see
+# load_numpy(), and the modules of the other modes (the server, the
+# caches, the worker pools, the catalogs) are imported when they are
+# first used, which keeps the startup of a simple report fast.
+import collections
+import decimal
+import functools
 import getopt
+import heapq
+import itertools
+import math
+import operator
 import os
 import sys
 import re
+import struct
+import time
+
+# NumPy, imported by load_numpy().
+numpy = None
 
 VERSION='1.2'
 
+# The version of the computed values. Change it when the results of
+# the models or the Row fields change so that persistent caches are
+# invalidated.
+MODEL_VERSION=8
+
+# The natural log of the largest float.
+LOG_FLOAT_MAX = math.log(sys.float_info.max)
+
+# The --stats instrumentation, see Stats. None when it is off.
+STATS = None
+
+# The context of the Decimal MTTDL values, with the widest exponent
+# range so that huge arrays do not underflow to zero.
+DECIMAL = decimal.Context(Emin=-999999999999999999, Emax=999999999999999999)
+
+# The table of log(k!), see log_factorial().
+LOG_FACTORIAL = [0.0]
+LOG_FACTORIAL_ARRAY = None
+
+# The ure_table() tables, keyed by (disk size, URE rate).
+URE_TABLES = {}
+
+# The spare_table() tables, keyed by the mean failures in a lead time.
+SPARE_TABLES = {}
+
+def load_numpy(what='this mode'):
+    """
+    Import NumPy the first time it is needed. Only some of the modes
+    need it and it takes longer to import than a simple report takes
+    to run.
+
+    @param what  The feature that needs NumPy, for the error message.
+    @returns the numpy module.
+    @raises ImportError if NumPy is not installed.
+    """
+    global numpy
+    if numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError('%s requires numpy' % (what))
+    return numpy
+
 def usage():
     global VERSION
     p = os.path.basename(sys.argv[0])
-    print """
+    print("""
 NAME
         %s - RAID configuration analyzer
 
@@ -47,6 +106,10 @@ DESCRIPTION
 
         It is useful for planning a storage system.
 
+        It requires Python 3. Run it as "python3 -m raid" from its
+        directory to start faster, Python then reuses the compiled
+        script instead of compiling it on every run.
+
         By default it covers these RAID configurations:
 
           Config        Description
@@ -58,21 +121,37 @@ DESCRIPTION
           RAID-Z3       3 parity stripes.
           RAID-10(M)    RAID-10 with M-1 mirrors
 
+        Other schemes, erasure codes, RAID-50/60, mirrors of more
+        copies and dRAID, are added with --scheme.
+
 OPTIONS
+        The options are grouped by topic and sorted in each group.
+        README.md describes the modes in more detail, with the file
+        formats and examples.
+
+    Arrays and disks
         -c <n>, --jbod-capacity <n>
                         The JBOD capacity where n is the number of
-                        disks. The default is 24.
+                        disks. It can be a range or list like -n to
+                        compare several JBOD sizes. The default is 24.
 
-        --csv           Output the data in CSV format for inclusion
-                        into a spreadsheet. The title and key are not
-                        printed.
+        --catalog <file>
+                        Report every disk model of a catalog in one
+                        run instead of the disk described by -d, -s,
+                        --mtbf and --mttr. The file is CSV, JSON or
+                        YAML (.csv, .json, .yaml or .yml, YAML
+                        requires PyYAML) of disk models, with a name,
+                        mtbf, mttr and size, and JBOD chassis, with a
+                        name and a capacity. Every disk model is
+                        reported in every chassis or, when there are
+                        none, for the -c values. See Catalogs in
+                        README.md.
 
         -d <name>, --disk-name <name>
                         The name of the disks being used. This
                         information is only used for reporting.
                         Ex. -d 'Seagate Barracuda ST2000DM001'
 
-
         -f <pattern>, --filter <pattern>
                         Filter out RAID types that do not match the
                         pattern. By default all of them are
@@ -80,9 +159,25 @@ OPTIONS
                         and RAID-6 patterns you could specify -f
                         'RAID-5' -f 'RAID-6'.
 
-        -h, --help      This help message.
+        --mtbf <hrs>    The mean time between failures for the disks in
+                        hours as specified by the manufacturer. A
+                        typical value is 750000. It can be a range
+                        or list like -n. A range can have a step
+                        after a colon, for example 500000-1000000:100000.
+                        The default is 750000.
+
+        --mttr <hrs>    The mean time to repair a failed disk in hours.
+                        This includes the time to physically replace
+                        disk and the time to re-silver (format,
+                        populate) it. A typical value is 24. It can
+                        be a fractional number or a range or list with
+                        an optional step, for example 12-48:12 or
+                        4-6:0.5. The default is 24. With
+                        --rebuild-rate it is only the time to replace
+                        the disk, the re-silver time is added for each
+                        RAID type.
 
-        -n <num>        The number of disks in each RAID array. A 
+        -n <num>        The number of disks in each RAID array. A
                         JBOD will consist of multiple arrays, each
                         array will have <num> disks. This switch can
                         be specified multiple times or with ranges or
@@ -92,223 +187,351 @@ OPTIONS
                         and 12 you could specify -n 4-8,12. The
                         default is 6.
 
-        --mtbf <hrs>    The mean time between failures for the disks in
-                        hours as specified by the manufacturer. A
-                        typical value is 750000. The default is 750000.
+        -s <TB>, --disk-size <TB>
+                        The disk size in TB. A disk that is smaller
+                        than 1 TB can be specified as a fractional
+                        number. For example, a 500GB can be specified
+                        as "-s .5". It can be a range or list with an
+                        optional step, for example -s 1-4:.5. The
+                        default is 2TB.
 
-        --mttr <hrs>    The mean time to repair a failed disk in hours.
-                        This includes the time to physically replace
-                        disk and the time to re-silver (format,
-                        populate) it. A typical value is 24. The
-                        default is 24.
+                        When more than one value is given for --mtbf,
+                        --mttr, -s or -c, a report is generated for
+                        every combination, in the order of the values.
 
-        --no-key        Do not print the key (explanation of terms).
+        --scheme <spec> Add a RAID scheme to the reports, after the
+                        default ones. It can be repeated. The schemes
+                        that cannot be built from N disks are skipped.
+                        The specifications are RS(k,m) erasure codes,
+                        RAID-50(G=g) and RAID-60(G=g) groups,
+                        RAID-10(C=c) mirrors of c copies and
+                        dRAIDp:dd:ss, see Schemes in README.md.
+
+        --spares <n>    Keep at least n disks of each JBOD as spares
+                        instead of the disks left over by the arrays
+                        or, when there are none, one array of them.
+                        The spares are S, the arrays use the rest.
+
+    Reliability models
+        --corr <f>      The correlated failure factor for the Markov
+                        model (--markov). Once a disk has failed the
+                        others fail f times faster. The default is 1.
+
+        --lead-time <hrs>
+                        Share the spares (S) of each JBOD as a pool of
+                        hot spares for all of its arrays, a failed
+                        disk is replaced after the lead time in hours.
+                        The expected wait for a spare (Wait) is added
+                        to the MTTR and the report has the chance that
+                        a failed disk finds no spare (Exh). For
+                        example: --lead-time 168 --spares 2
+
+        --lse <n>       The number of latent sector errors per TB read
+                        for the Markov model (--markov). An error
+                        found while rebuilding the last redundant
+                        disk loses data. The default is 0.
+
+        --markov        Compute the MTTDL from a continuous time Markov
+                        chain of each RAID configuration instead of
+                        the closed form formula. It accounts for
+                        latent sector errors (--lse) and correlated
+                        failures (--corr), and uses the rebuild times
+                        of --rebuild-rate. With the defaults the
+                        results are close to the closed form. It
+                        requires NumPy.
+
+        --rebuild-load <pct>
+                        The percent of the rebuild bandwidth
+                        (--rebuild-rate) taken by the foreground I/O.
+                        The default is 0.
+
+        --rebuild-rate <MB/s>
+                        Derive the MTTR of each row from the time to
+                        rebuild a failed disk instead of using --mttr
+                        as is. A rebuild reads the disks that the RAID
+                        type needs to reconstruct the failed one, one
+                        for a mirror and N-P for RAID-5/6/Z3, and
+                        writes the new disk through the rebuild
+                        bandwidth of the array, in MB/s, less
+                        --rebuild-load. The rebuild time is added to
+                        the MTTR. The report shows the MTTR and the
+                        rebuild I/O (RIO) of each row. For example:
+                        -n 8 -s 16 --rebuild-rate 200.
+
+        --ure <rate>    The unrecoverable read error (URE) rate of
+                        the disks per bit read, for example 1e-14 for
+                        desktop disks or 1e-15 for enterprise disks.
+                        A URE while rebuilding a disk with no
+                        redundancy left loses data. The MTTDL, the
+                        AFR and the filters include it, and the
+                        report shows the probability that a rebuild
+                        hits a URE. --simulate does not simulate
+                        UREs. The default is to ignore them.
+
+    Filters and searches
+        --max-afr <pct> Filter out the rows whose AFR is greater than
+                        pct percent.
+
+        --min-ft <n>    Filter out the rows whose fault tolerance is
+                        less than n disks.
+
+        --min-jdc <TB>  Filter out the rows whose JBOD data capacity
+                        is less than TB.
+
+        --min-mttdl <yrs>
+                        Filter out the rows whose MTTDL is less than
+                        yrs years.
+
+        --optimize <n>  Report the n configurations with the lowest
+                        TCO per usable TB of the cost model over the
+                        whole grid: the array sizes, the RAID types,
+                        the disk models and the JBOD capacities,
+                        within the filters. It requires NumPy. For
+                        example: --catalog disks.csv -n 4-36
+                        --min-mttdl 1e6 --loss-cost 500 --optimize 5
+
+        --pareto        Only report the Pareto optimal configurations:
+                        the ones where no other configuration has more
+                        JBOD data capacity (JDC), a longer MTTDL and
+                        more spares (S) without being worse in one of
+                        them. The frontier is across all of the JBOD
+                        capacities, disk models and other parameter
+                        values, only the reports with rows on it are
+                        printed. For example: -n 2-24 -c 24,48
+                        --min-mttdl 1e6 --pareto.
+
+    Fleets
+        --domain-mttr <hrs>
+                        The time to repair a failed JBOD or rack of
+                        --fleet, the disks in it are down until then.
+                        The default is 24.
+
+        --fleet <n>     Aggregate the JBOD of each report to a fleet
+                        of n JBODs and report the fleet data capacity
+                        (FDC), the fleet MTTDL (FMTTDL) and the
+                        expected data loss events per year (DLE). The
+                        JBODs and the racks are failure domains, see
+                        Fleets in README.md. For example:
+                        --fleet 10000 --rack-size 42 --span 4
+                        --jbod-mtbf 500000 --rack-mtbf 1000000
+
+        --jbod-mtbf <hrs>
+                        The mean time between failures of a JBOD for
+                        --fleet, for example of its backplane or
+                        power. The default is no JBOD failures.
+
+        --rack-mtbf <hrs>
+                        The mean time between failures of a rack for
+                        --fleet. It requires --rack-size. The default
+                        is no rack failures.
+
+        --rack-size <n> The number of JBODs in a rack for --fleet.
+
+        --span <n>      The number of JBODs that each array of
+                        --fleet spans. The default is 1.
+
+    Costs
+        Any of these options adds the cost columns to the report:
+        the disk and chassis cost and the disk power per usable TB
+        ($/TB, W/TB), the expected cost of data loss per year (ELC)
+        and the total cost of ownership per usable TB (TCO) over the
+        --mission years. See Costs in README.md.
+
+        --chassis-price <$>
+                        The price of a JBOD chassis. The default is 0.
+
+        --disk-price <$>
+                        The price of a disk. The default is 0.
+
+        --disk-watts <W>
+                        The average power of a disk in watts. The
+                        default is 0.
+
+        --kwh-price <$> The price of a kWh. The default is 0.10.
+
+        --loss-cost <$> The cost of a TB of lost data. The default is
+                        0.
+
+    Simulation and uncertainty
+        --mission <yrs> The mission time for --simulate and the years
+                        of the TCO of the cost model. The default is
+                        5.
+
+        --mtbf-sd <pct> The spread of the MTBF for --uncertainty: the
+                        standard deviation of its log in percent,
+                        about its relative standard deviation. The
+                        default is 30.
+
+        --mttr-sd <pct> The spread of the MTTR for --uncertainty, like
+                        --mtbf-sd. The default is 30.
+
+        --seed <n>      The random seed for --simulate and
+                        --uncertainty. The same seed gives the same
+                        results whatever the number of jobs. The
+                        default is 0.
+
+        --sensitivity   Add the elasticities of the MTTDL to the
+                        report: the percent change of the MTTDL for a
+                        1%% change of the MTBF, the MTTR or the disk
+                        size (E(MTBF), E(MTTR), E(Size)). An E(MTBF)
+                        of 3 loses 30%% of the MTTDL when the MTBF is
+                        10%% lower than the vendor figure. It cannot be
+                        used with --markov or --lead-time.
+
+        --simulate      Validate the MTTDL with a Monte Carlo
+                        simulation of the disk failures and repairs
+                        of the arrays of each JBOD over the mission
+                        time (--mission). The probability of data
+                        loss, with a 95%% confidence interval, is
+                        compared with the one implied by the MTTDL.
+                        With --lead-time the spares are simulated as
+                        a shared pool. The trials are spread across
+                        the jobs (-j). It requires NumPy.
+
+        --size-sd <pct> The spread of the disk size for --uncertainty,
+                        like --mtbf-sd. The default is 0.
+
+        --trials <n>    The number of JBODs simulated for each row by
+                        --simulate. The default is 100000.
+
+        --uncertainty <n>
+                        Propagate the uncertainty of the inputs to
+                        the MTTDL: draw the MTBF, the MTTR and the
+                        disk size n times from lognormal distributions
+                        around their values (--mtbf-sd, --mttr-sd,
+                        --size-sd) and add the 5th, 50th and 95th
+                        percentiles of the MTTDL in years to the
+                        report (P5, P50, P95). It requires NumPy and
+                        cannot be used with --markov or --lead-time.
+                        For example: --uncertainty 20000 --mtbf-sd 50
+
+        --weibull <shape>
+                        Draw the disk failure times for --simulate from
+                        a Weibull distribution with this shape and the
+                        same MTBF. A shape less than 1 models infant
+                        mortality, greater than 1 wear out. The default
+                        is exponential failures (shape 1).
+
+    Output
+        --compare <report>
+                        Compare two reports instead of printing one.
+                        A report is a file saved by --csv or --format
+                        or the edits of the command line parameters
+                        with the keys of the --serve queries, like
+                        mtbf=500000&mttr=48. With one --compare the
+                        first report is the command line. The rows
+                        are joined on N, P and the RAID type. See
+                        Comparing reports in README.md. For example:
+                        -n 3-8 -f Z --compare 'mttr=48'
+
+        --csv           Output the data in CSV format for inclusion
+                        into a spreadsheet. The title and key are not
+                        printed. It is the same as --format csv.
+
+        --format <fmt>  The output format: text (the default), csv,
+                        npy, arrow or parquet. The last three write
+                        the rows of all the reports to the --output
+                        file as binary columnar records with full
+                        precision. The npy format requires NumPy, the
+                        arrow and parquet formats require pyarrow. See
+                        Output formats in README.md.
 
         --no-header     Do not display the column headers.
 
+        --no-key        Do not print the key (explanation of terms).
+
         --no-title      Do not print the title.
 
-        -s <TB>, --disk-size <TB>
-                        The disk size in TB. A disk that is smaller
-                        than 1 TB can be specified as a fractional
-                        number. For example, a 500GB can be specified
-                        as "-s .5". The default is 2TB.
+        -o <file>, --output <file>
+                        Write the output to file instead of stdout.
+                        It is required by the binary --format values.
+
+    Running
+        --cache <file>  Keep the computed rows in a SQLite cache file
+                        that is shared between runs. The file is
+                        emptied when the model version changes and the
+                        least recently used rows are evicted after a
+                        million entries. It is not used by --sweep.
+
+        --cache-size <n>
+                        The maximum number of array sizes whose rows
+                        are kept in memory. The default is 4096. The
+                        rows are only cached with --cache,
+                        --cache-size or --serve, because a cache
+                        computes all of the RAID types of an array
+                        size, the ones that -f and the limits filter
+                        out too.
+
+        -h, --help      This help message.
+
+        --interactive   Read edits of the report from stdin instead
+                        of printing it once, for what-if sessions. An
+                        edit only recomputes the columns that change.
+                        An edit is a key of the --serve queries and
+                        its new values, for example "mttr 12", and
+                        "show [rows]" writes the report. It requires
+                        NumPy. See Interactive sessions in README.md.
+
+        -j <n>, --jobs <n>
+                        The number of worker processes used to
+                        evaluate the combinations of --mtbf, --mttr,
+                        -s and -c values. The default is the number
+                        of CPUs.
+
+        --profile <file>
+                        Run the report under cProfile and save the
+                        profile to file. Read it with python -m
+                        pstats <file>.
+
+        --serve <[host:]port>
+                        Run an HTTP server that answers MTTDL queries
+                        with JSON instead of printing a report. The
+                        default host is 127.0.0.1. A query is a GET
+                        of /mttdl with URL parameters or a POST of
+                        /mttdl with a JSON object. See Server in
+                        README.md.
+
+        --stats         Print the instrumentation of the run to
+                        stderr: the wall time of each phase (option
+                        parsing, computing the rows, matching the
+                        filters, the Pareto search, the simulation,
+                        formatting and writing the output and the
+                        rest), the number of rows computed, filtered
+                        out and reported, the rows per second and the
+                        peak RSS. With several jobs the compute and
+                        filter times are summed over the workers.
+
+        --stats-json <file>
+                        Write the --stats instrumentation to file as
+                        JSON, for example to track it in CI. Use -
+                        for stderr.
+
+        --sweep         Compute the whole table in a single vectorized
+                        pass using NumPy instead of row by row. The
+                        output is the same. This is much faster for
+                        large -n ranges. It requires NumPy.
+
+        -V, --version   Print the version and exit.
+
 EXAMPLES
-        %% # ================================================================
-        %% # Example 1:
-        %% # Look at a number of different options.
-        %% # ================================================================
-        %% python %s -n 3-8 -s 2 \\
+        Look at a number of different options:
+
+            %% python3 %s -n 3-8 -s 2 \\
                 -d 'Seagate Barracuda ST2000DM001' \\
                 --mtbf 750000 --mttr 24
-        
-                                  MTTDL RAID Configuration Report
-                                   Seagate Barracuda ST2000DM001
-                                       MTBF: 750,000 (85.6)
-                                             MTTR: 24
-                                        Disk Size: 2.000TB
-                                         JBOD Capacity: 24
-        
-              MTTDL    MTTDL                
-        N  P  (hrs)    (yrs)    AFR       FT DC %%   DC   Min C  BD B  S  JDC   Types
-        == == ======== ======== ========= == ====== ==== === == == == == ===== ============
-         3  0  2.5e+05     28.5      3.5%%  0 100.0%%  6.0   1 24 21  7  3  42.0 RAID-0
-         3  1 3.91e+09 4.46e+05 0.000224%%  1  50.0%%  3.0   2 24 21  7  3  21.0 RAID-1/10/01
-         3  1 3.91e+09 4.46e+05 0.000224%%  1  66.7%%  4.0   2 24 21  7  3  28.0 RAID-5/Z1
-         3  2 1.22e+14 1.39e+10 7.18e-09%%  2  33.3%%  2.0   3 24 21  7  3  14.0 RAID-6/Z2
-         3  2 1.22e+14 1.39e+10 7.18e-09%%  2  33.3%%  2.0   3 24 21  7  3  14.0 RAID-10(M=2)
-        
-         4  0 1.88e+05     21.4     4.67%%  0 100.0%%  8.0   1 24 20  5  4  40.0 RAID-0
-         4  1 1.95e+09 2.23e+05 0.000449%%  1  50.0%%  4.0   2 24 20  5  4  20.0 RAID-1/10/01
-         4  1 1.95e+09 2.23e+05 0.000449%%  1  75.0%%  6.0   2 24 20  5  4  30.0 RAID-5/Z1
-         4  2 3.05e+13 3.48e+09 2.87e-08%%  2  50.0%%  4.0   3 24 20  5  4  20.0 RAID-6/Z2
-         4  3 9.54e+17 1.09e+14 9.19e-13%%  3  25.0%%  2.0   4 24 20  5  4  10.0 RAID-Z3
-         4  3 9.54e+17 1.09e+14 9.19e-13%%  3  25.0%%  2.0   4 24 20  5  4  10.0 RAID-10(M=3)
-        
-         5  0  1.5e+05     17.1     5.84%%  0 100.0%% 10.0   1 24 20  4  4  40.0 RAID-0
-         5  1 1.17e+09 1.34e+05 0.000748%%  1  50.0%%  5.0   2 24 20  4  4  20.0 RAID-1/10/01
-         5  1 1.17e+09 1.34e+05 0.000748%%  1  80.0%%  8.0   2 24 20  4  4  32.0 RAID-5/Z1
-         5  2 1.22e+13 1.39e+09 7.18e-08%%  2  60.0%%  6.0   3 24 20  4  4  24.0 RAID-6/Z2
-         5  3 1.91e+17 2.18e+13 4.59e-12%%  3  40.0%%  4.0   4 24 20  4  4  16.0 RAID-Z3
-         5  4 5.96e+21  6.8e+17 1.47e-16%%  4  20.0%%  2.0   5 24 20  4  4   8.0 RAID-10(M=4)
-        
-         6  0 1.25e+05     14.3     7.01%%  0 100.0%% 12.0   1 24 18  3  6  36.0 RAID-0
-         6  1 7.81e+08 8.92e+04  0.00112%%  1  50.0%%  6.0   2 24 18  3  6  18.0 RAID-1/10/01
-         6  1 7.81e+08 8.92e+04  0.00112%%  1  83.3%% 10.0   2 24 18  3  6  30.0 RAID-5/Z1
-         6  2  6.1e+12 6.97e+08 1.44e-07%%  2  66.7%%  8.0   3 24 18  3  6  24.0 RAID-6/Z2
-         6  3 6.36e+16 7.26e+12 1.38e-11%%  3  50.0%%  6.0   4 24 18  3  6  18.0 RAID-Z3
-         6  5  3.1e+25 3.54e+21 2.82e-20%%  5  16.7%%  2.0   6 24 18  3  6   6.0 RAID-10(M=5)
-        
-         7  0 1.07e+05     12.2     8.18%%  0 100.0%% 14.0   1 24 21  3  3  42.0 RAID-0
-         7  1 5.58e+08 6.37e+04  0.00157%%  1  50.0%%  7.0   2 24 21  3  3  21.0 RAID-1/10/01
-         7  1 5.58e+08 6.37e+04  0.00157%%  1  85.7%% 12.0   2 24 21  3  3  36.0 RAID-5/Z1
-         7  2 3.49e+12 3.98e+08 2.51e-07%%  2  71.4%% 10.0   3 24 21  3  3  30.0 RAID-6/Z2
-         7  3 2.72e+16 3.11e+12 3.21e-11%%  3  57.1%%  8.0   4 24 21  3  3  24.0 RAID-Z3
-         7  6 1.39e+29 1.58e+25 6.32e-24%%  6  14.3%%  2.0   7 24 21  3  3   6.0 RAID-10(M=6)
-        
-         8  0 9.38e+04     10.7     9.34%%  0 100.0%% 16.0   1 24 16  2  8  32.0 RAID-0
-         8  1 4.19e+08 4.78e+04  0.00209%%  1  50.0%%  8.0   2 24 16  2  8  16.0 RAID-1/10/01
-         8  1 4.19e+08 4.78e+04  0.00209%%  1  87.5%% 14.0   2 24 16  2  8  28.0 RAID-5/Z1
-         8  2 2.18e+12 2.49e+08 4.02e-07%%  2  75.0%% 12.0   3 24 16  2  8  24.0 RAID-6/Z2
-         8  3 1.36e+16 1.56e+12 6.43e-11%%  3  62.5%% 10.0   4 24 16  2  8  20.0 RAID-Z3
-         8  7 5.41e+32 6.18e+28 1.62e-27%%  7  12.5%%  2.0   8 24 16  2  8   4.0 RAID-10(M=7)
-        
-        
-                     Term    Definition
-                     ======= ================================================
-                     AFR     Annualized Failure Rate in years
-                     B       Number of RAID blocks
-                     BD      Number of RAID block disks
-                     C       JBOD capacity (number of disks)
-                     DC      RAID data capacity (TB)
-                     FT      Fault Tolerance: max bad disks with no data loss
-                     JDC     JBOD data capacity in TB
-                     Min     Minimum number of disks allowed
-                     MTBF    Mean Time Between Failures in hours
-                     MTTDL   Mean Time To Data Loss in hours
-                     MTTR    Mean Time To Recover (repair) in hours
-                     N       Number of disks in each RAID array
-                     P       Parity
-                     S       Spares, must be greater than zero
-
-        %% # ================================================================
-        %% # Example 2:
-        %% # Just look at the Z2 options for different array sizes.
-        %% # ================================================================
-        %% python %s -n 3-8 -s 2 \\
-                -d 'Seagate Barracuda ST2000DM001' \\
-                --mtbf 750000 --mttr 24  -f 'Z2'
-        
-                                  MTTDL RAID Configuration Report
-                                   Seagate Barracuda ST2000DM001
-                                       MTBF: 750,000 (85.6)
-                                             MTTR: 24
-                                        Disk Size: 2.000TB
-                                         JBOD Capacity: 24
-        
-              MTTDL    MTTDL                
-        N  P  (hrs)    (yrs)    AFR       FT DC %%   DC   Min C  BD B  S  JDC   Types
-        == == ======== ======== ========= == ====== ==== === == == == == ===== ============
-         3  2 1.22e+14 1.39e+10 7.18e-09%%  2  33.3%%  2.0   3 24 21  7  3  14.0 RAID-6/Z2
-         4  2 3.05e+13 3.48e+09 2.87e-08%%  2  50.0%%  4.0   3 24 20  5  4  20.0 RAID-6/Z2
-         5  2 1.22e+13 1.39e+09 7.18e-08%%  2  60.0%%  6.0   3 24 20  4  4  24.0 RAID-6/Z2
-         6  2  6.1e+12 6.97e+08 1.44e-07%%  2  66.7%%  8.0   3 24 18  3  6  24.0 RAID-6/Z2
-         7  2 3.49e+12 3.98e+08 2.51e-07%%  2  71.4%% 10.0   3 24 21  3  3  30.0 RAID-6/Z2
-         8  2 2.18e+12 2.49e+08 4.02e-07%%  2  75.0%% 12.0   3 24 16  2  8  24.0 RAID-6/Z2
-        
-                     Term    Definition
-                     ======= ================================================
-                     AFR     Annualized Failure Rate in years
-                     B       Number of RAID blocks
-                     BD      Number of RAID block disks
-                     C       JBOD capacity (number of disks)
-                     DC      RAID data capacity (TB)
-                     FT      Fault Tolerance: max bad disks with no data loss
-                     JDC     JBOD data capacity in TB
-                     Min     Minimum number of disks allowed
-                     MTBF    Mean Time Between Failures in hours
-                     MTTDL   Mean Time To Data Loss in hours
-                     MTTR    Mean Time To Recover (repair) in hours
-                     N       Number of disks in each RAID array
-                     P       Parity
-                     S       Spares, must be greater than zero
-
-
-        %% # ================================================================
-        %% # Example 3:
-        %% # Just look at the Z2 options for different array sizes.
-        %% # Output it in CSV format to include in a spreadsheet.
-        %% # ================================================================
-        %% python %s -n 3-8 -s 2 \\
-                -d 'Seagate Barracuda ST2000DM001' \\
-                --mtbf 750000 --mttr 24  -f 'Z2' \\
-                --csv
-        Disk,Seagate Barracuda ST2000DM001
-        Size,2.000
-        MTBF,750000
-        MTTR,24
-        
-        ,,N,Parity,MTTDL (hrs),MTTDL (yrs),AFR,FT,DC %%,DC,Min,C,BD,B,S,JDC,Types
-        ,,3,2,1.22e+14,1.39e+10,7.1762e-11,2,0.333,2.0,3,24,21,7,3,14.0,RAID-6/Z2
-        ,,4,2,3.05e+13,3.48e+09,2.8705e-10,2,0.500,4.0,3,24,20,5,4,20.0,RAID-6/Z2
-        ,,5,2,1.22e+13,1.39e+09,7.1762e-10,2,0.600,6.0,3,24,20,4,4,24.0,RAID-6/Z2
-        ,,6,2,6.1e+12,6.97e+08,1.4352e-09,2,0.667,8.0,3,24,18,3,6,24.0,RAID-6/Z2
-        ,,7,2,3.49e+12,3.98e+08,2.5117e-09,2,0.714,10.0,3,24,21,3,3,30.0,RAID-6/Z2
-        ,,8,2,2.18e+12,2.49e+08,4.0187e-09,2,0.750,12.0,3,24,16,2,8,24.0,RAID-6/Z2
-
-        %% # ================================================================
-        %% # Example 4:
-        %% # Script to print out storage diffs for Z1, Z2 and Z3 options.
-        %% # ================================================================
-        %% cat >x.sh <<EOF
-        #!/bin/bash
-        python %s -n 3-8 -s 2 \\
-            -d 'Seagate Barracuda ST2000DM001' \\
-            --mtbf 750000 --mttr 24  -f 'Z1' \\
-            --no-key
-        
-        python %s -n 3-8 -s 2 \\
-            -d 'Seagate Barracuda ST2000DM001' \\
-            --mtbf 750000 --mttr 24  -f 'Z2' \\
-            --no-title --no-header --no-key
-        
-        python %s -n 3-8 -s 2 \\
-            -d 'Seagate Barracuda ST2000DM001' \\
-            --mtbf 750000 --mttr 24  -f 'Z3' \\
-            --no-title --no-header --no-key
-        EOF
-        %% chmod a+x x.sh
-        %% ./x.sh
-
-                                  MTTDL RAID Configuration Report
-                                   Seagate Barracuda ST2000DM001
-                                       MTBF: 750,000 (85.6)
-                                             MTTR: 24
-                                        Disk Size: 2.000TB
-                                         JBOD Capacity: 24
-        
-              MTTDL    MTTDL
-        N  P  (hrs)    (yrs)    AFR       FT DC %   DC   Min C  BD B  S  JDC   Types
-        == == ======== ======== ========= == ====== ==== === == == == == ===== ============
-         3  1 3.91e+09 4.46e+05 0.000224%  1  66.7%  4.0   2 24 21  7  3  28.0 RAID-5/Z1
-         4  1 1.95e+09 2.23e+05 0.000449%  1  75.0%  6.0   2 24 20  5  4  30.0 RAID-5/Z1
-         5  1 1.17e+09 1.34e+05 0.000748%  1  80.0%  8.0   2 24 20  4  4  32.0 RAID-5/Z1
-         6  1 7.81e+08 8.92e+04  0.00112%  1  83.3% 10.0   2 24 18  3  6  30.0 RAID-5/Z1
-         7  1 5.58e+08 6.37e+04  0.00157%  1  85.7% 12.0   2 24 21  3  3  36.0 RAID-5/Z1
-         8  1 4.19e+08 4.78e+04  0.00209%  1  87.5% 14.0   2 24 16  2  8  28.0 RAID-5/Z1
-        
-         3  2 1.22e+14 1.39e+10 7.18e-09%  2  33.3%  2.0   3 24 21  7  3  14.0 RAID-6/Z2
-         4  2 3.05e+13 3.48e+09 2.87e-08%  2  50.0%  4.0   3 24 20  5  4  20.0 RAID-6/Z2
-         5  2 1.22e+13 1.39e+09 7.18e-08%  2  60.0%  6.0   3 24 20  4  4  24.0 RAID-6/Z2
-         6  2  6.1e+12 6.97e+08 1.44e-07%  2  66.7%  8.0   3 24 18  3  6  24.0 RAID-6/Z2
-         7  2 3.49e+12 3.98e+08 2.51e-07%  2  71.4% 10.0   3 24 21  3  3  30.0 RAID-6/Z2
-         8  2 2.18e+12 2.49e+08 4.02e-07%  2  75.0% 12.0   3 24 16  2  8  24.0 RAID-6/Z2
-        
-         4  3 9.54e+17 1.09e+14 9.19e-13%  3  25.0%  2.0   4 24 20  5  4  10.0 RAID-Z3
-         5  3 1.91e+17 2.18e+13 4.59e-12%  3  40.0%  4.0   4 24 20  4  4  16.0 RAID-Z3
-         6  3 6.36e+16 7.26e+12 1.38e-11%  3  50.0%  6.0   4 24 18  3  6  18.0 RAID-Z3
-         7  3 2.72e+16 3.11e+12 3.21e-11%  3  57.1%  8.0   4 24 21  3  3  24.0 RAID-Z3
-         8  3 1.36e+16 1.56e+12 6.43e-11%  3  62.5% 10.0   4 24 16  2  8  20.0 RAID-Z3
+
+        Just look at the Z2 options, in CSV format to include in a
+        spreadsheet:
+
+            %% python3 %s -n 3-8 -f 'Z2' --csv
+
+        Find the layouts with the most capacity for a reliability
+        target across two JBOD sizes:
+
+            %% python3 %s -n 2-24 -c 24,48 --min-mttdl 1e6 --pareto
+
+        README.md describes every mode, with more examples and their
+        output.
 
 AUTHOR
         Joe Linoff
@@ -339,7 +562,7 @@ LICENSE
         General Public License along with the RAID configuration
         analysis tool; if not, write to the Free Software Foundation,
         Inc., 59 Temple Place, Suite 330, Boston, MA 02111-1307 USA.
-""" % (p,p,p,p,p,p,p,p,VERSION)
+""" % (p,p,p,p,p,VERSION))
     sys.exit(0)
 
 def commaize(n,f='%.0f'):
@@ -375,23 +598,31 @@ def parse_nums(nums):
     @param nums  The argument list.
     @returns the explicit list of all numbers implied
     """
+    return [n for r in parse_num_ranges(nums) for n in r]
+
+def parse_num_ranges(nums):
+    """
+    Parse a parse_nums() argument without expanding the ranges.
+
+    @param nums  The argument list.
+    @returns the list of ascending range objects implied
+    """
     a = []
 
     # Is it a simple number?
     # ex. -N 10
-    m = re.search('^\d+$',nums)
+    m = re.search(r'^\d+$',nums)
     if m:
-        a.append(int(nums))
+        a.append(range(int(nums),int(nums)+1))
         return a
 
     # Is it a simple range?
     # ex. -N 3-12
-    m = re.search('^(\d+)-(\d+)$',nums)
+    m = re.search(r'^(\d+)-(\d+)$',nums)
     if m:
         beg = int(m.group(1))
         end = int(m.group(2))
-        for p in range(beg,end+1):
-            a.append(p)
+        a.append(range(beg,end+1))
         return a
 
     # Is it a combination of simple numbers and ranges?
@@ -399,23 +630,187 @@ def parse_nums(nums):
     if ',' in nums:
         ps = nums.split(',')
         for p in ps:
-            m = re.search('^\d+$',p)
+            m = re.search(r'^\d+$',p)
             if m:
-                a.append(int(p))
+                a.append(range(int(p),int(p)+1))
                 continue
-            m = re.search('^(\d+)-(\d+)$',p)
+            m = re.search(r'^(\d+)-(\d+)$',p)
             if m:
                 beg = int(m.group(1))
                 end = int(m.group(2))
-                for p in range(beg,end+1):
-                    a.append(p)
+                a.append(range(beg,end+1))
                 continue
-            raise 'bad syntax in number expression found for %s' % (nums)
+            raise ValueError('bad syntax in number expression found for %s' % (nums))
         return a
 
-    raise 'bad syntax in number expression found for %s' % (nums)
+    raise ValueError('bad syntax in number expression found for %s' % (nums))
+
+def iter_sorted(Ns):
+    """
+    Iterate over the array sizes in ascending order.
+
+    The ranges are merged lazily so memory use does not depend on how
+    many array sizes they cover. Duplicates are kept, just like
+    sorted().
+
+    @param Ns  The array sizes: numbers and ascending ranges (for
+               example the range objects from parse_num_ranges()).
+    @returns an iterator over the sorted array sizes.
+    """
+    return heapq.merge(*[[x] if isinstance(x,int) else x for x in Ns])
+
+class TypeFilter(object):
+    """
+    Match RAID types against the -f patterns.
+
+    The patterns are compiled once and the decision for each RAID
+    type is cached. They are not joined into a single regular
+    expression, so each one keeps its own inline flags and groups.
+    """
+    def __init__(self, patterns, cache_size=4096):
+        """
+        @param patterns    The patterns. If there are none, every RAID
+                           type matches.
+        @param cache_size  The maximum number of cached decisions. The
+                           RAID-10 types depend on N so a large sweep
+                           would otherwise grow the cache without bound.
+        @raises re.error if a pattern is not a regular expression.
+        """
+        self.patterns = list(patterns)
+        self.cache = {}
+        self.cache_size = cache_size
+        self.regexes = [re.compile(p) for p in self.patterns]
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __call__(self, ptype):
+        """
+        @param ptype  The RAID type.
+        @returns True if the RAID type is kept.
+        """
+        if not self.regexes:
+            return True
+        try:
+            return self.cache[ptype]
+        except KeyError:
+            pass
+        keep = any(r.search(ptype) for r in self.regexes)
+        if len(self.cache) < self.cache_size:
+            self.cache[ptype] = keep
+        return keep
+
+class TimedTypeFilter(TypeFilter):
+    """
+    A TypeFilter that charges its time to the filter phase of --stats.
+    """
+    def __call__(self, ptype):
+        STATS.push('filter')
+        try:
+            return TypeFilter.__call__(self, ptype)
+        finally:
+            STATS.pop()
+
+def type_filter(filters):
+    """
+    Get the TypeFilter for the -f patterns, timed with --stats.
+
+    @param filters  The patterns or a TypeFilter, None for no patterns.
+    @returns the TypeFilter.
+    """
+    if isinstance(filters, TypeFilter):
+        return filters
+    if filters is None:
+        filters = []
+    if STATS is not None:
+        return TimedTypeFilter(filters)
+    return TypeFilter(filters)
+
+def within_limits(limits, ft, mttdl_yrs, afr, jdc):
+    """
+    Check the structured filters.
+
+    The values can be scalars or NumPy arrays, in which case the result
+    is a boolean mask.
+
+    @param limits     The limits dictionary, any of: min_ft, min_mttdl
+                      (years), max_afr (percent) and min_jdc (TB).
+    @param ft         The fault tolerance.
+    @param mttdl_yrs  The MTTDL in years.
+    @param afr        The annualized failure rate in percent.
+    @param jdc        The JBOD data capacity in TB.
+    @returns True (or a mask) if the limits are met.
+    """
+    ok = True
+    if 'min_ft' in limits:
+        ok = ok & (ft >= limits['min_ft'])
+    if 'min_mttdl' in limits:
+        ok = ok & (mttdl_yrs >= limits['min_mttdl'])
+    if 'max_afr' in limits:
+        ok = ok & (afr <= limits['max_afr'])
+    if 'min_jdc' in limits:
+        ok = ok & (jdc >= limits['min_jdc'])
+    return ok
+
+def parse_range(expr, conv=int):
+    """
+    Parse an argument from the command line that can consist of a
+    number, a range separated by a dash or a list of numbers and
+    ranges separated by commas like parse_nums(). A range can also
+    have a step after a colon and, if conv is float, the numbers can
+    be fractional.
+
+    Examples:
+        24
+        12,24,48
+        500000-1000000:250000
+        .5-2:.5
+
+    @param expr  The argument.
+    @param conv  The number type: int or float.
+    @returns the explicit list of all numbers implied
+    """
+    if conv is float:
+        num = r'(\d+(?:\.\d*)?|\.\d+)'
+    else:
+        num = r'(\d+)'
+    a = []
+    for tok in expr.split(','):
+        m = re.search('^%s$' % (num),tok)
+        if m:
+            a.append(conv(m.group(1)))
+            continue
+        m = re.search('^%s-%s(?::%s)?$' % (num,num,num),tok)
+        if not m:
+            raise ValueError('bad syntax in number expression found for %s' % (expr))
+        beg = conv(m.group(1))
+        end = conv(m.group(2))
+        step = conv(m.group(3)) if m.group(3) else conv(1)
+        if step <= 0:
+            raise ValueError('bad step in number expression found for %s' % (expr))
+        if end < beg:
+            continue
+        # Count the steps up front so that fractional steps do not
+        # accumulate rounding errors.
+        for k in range(int((end-beg)/step + 1e-9) + 1):
+            if conv is float:
+                a.append(round(beg + k*step, 9))
+            else:
+                a.append(beg + k*step)
+    return a
+
+def num2str(x):
+    """
+    Format a number that is usually, but not always, integral.
+
+    @param x  The number.
+    @returns the number as an integer if it has no fraction.
+    """
+    if x == int(x):
+        return '%d' % (x)
+    return '%g' % (x)
 
-def center(width, title):
+def center(width, title, out=None):
     """
     Center and print a title line.
 
@@ -423,209 +818,4316 @@ def center(width, title):
 
     @param width  The width of the display area.
     @param title  The title.
+    @param out    The output stream, the default is stdout.
     """
     if title not in ['',None]:
-        prefix = (width - len(title)) / 2 # Center
-        print '%*s%s' % (prefix,' ',title)
+        prefix = (width - len(title)) // 2 # Center
+        (out or sys.stdout).write('%*s%s\n' % (prefix,' ',title))
 
-def main():
+class ChunkWriter(object):
     """
-    main
+    Collect output in memory and write it to the underlying stream in
+    large chunks to reduce the number of system calls.
     """
-    try:
-        opts, args = getopt.gnu_getopt(sys.argv[1:],
-                                       'c:d:f:hn:s:vV',
-                                       ['jbod-capacity=',
-                                        'csv',
-                                        'disk-name=',
-                                        'disk-size=',
-                                        'filters=',
-                                        'help',
-                                        'mtbf=',
-                                        'mttr=',
-                                        'no-key',
-                                        'no-header',
-                                        'no-title',
-                                        'verbose',
-                                        'version'])
-    except getopt.GetoptError, err:
-        print str(err)
-        print 'exiting ...'
-        sys.exit(1)
-        
-    disk = ''
-    first=True
-    Ns = [6]
-    C = 24  # JBOD capacity
-    mtbf = 750000  # mean time between failures in hours
-    mttr = 24      # mean time to recovery in hours
-    disk = ''
-    size = 2.0 # TB
-    filters = []
-    verbose = 0
-    print_key = True
-    print_header = True
-    print_title = True
-    fmt = 'text'
-    for opt,arg in opts:
-        if opt in ['-h','--help'] :
-            usage()
-        elif opt in ['-c', '--jbod-capacity']:
-            if not re.search('^\d+$',arg):
-                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
-            C = int(arg)
-        elif opt in ['--csv']:
-            fmt = 'csv'
-        elif opt in ['-d', '--disk-name']:
-            disk = arg
-        elif opt in ['-f', '--filter']:
-            filters.append(arg)
-        elif opt in ['--mtbf'] :
-            if not re.search('^\d+$',arg):
-                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
-            mtbf = int(arg)
-        elif opt in ['--mttr'] :
-            if not re.search('^\d+$',arg):
-                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
-            mttr = int(arg)
-        elif opt in ['--no-key'] :
-            print_key = False
-        elif opt in ['--no-header'] :
-            print_header = False
-        elif opt in ['--no-title'] :
-            print_title = False
-        elif opt in ['-n'] :
-            if first:
-                first = False
-                Ns = []
-            try:
-                m = parse_nums(arg)
-                for n in m:
-                    Ns.append(n)
-            except Exception as msg:
-                sys.exit(msg)
-        elif opt in ["-s", "--disk-size"] :
-            size = float(arg)
-        elif opt in ['-v','--verbose'] :
-            verbose += 1
-        elif opt in ['-V','--version'] :
-            global VERSION
-            msg.info('Version: '+VERSION)
-            sys.exit(0)
-        else:
-            sys.exit('Unrecognized option '+opt)
+    def __init__(self, out, size=1<<16):
+        """
+        @param out   The underlying output stream.
+        @param size  The number of characters collected before they
+                     are written.
+        """
+        self.out = out
+        self.size = size
+        self.buf = []
+        self.num = 0
 
-    hdr = []
-    hdr.append('      MTTDL    MTTDL')
-    hdr.append('N  P  (hrs)    (yrs)    AFR       FT DC %   DC   Min C  BD B  S  JDC   Types')
-    hdr.append('== == ======== ======== ========= == ====== ==== === == == == == ===== ============')
-    hdr_width = max(len(h) for h in hdr)
+    def write(self, s):
+        self.buf.append(s)
+        self.num += len(s)
+        if self.num >= self.size:
+            self.flush()
 
-    if fmt == 'text':
-        if print_title:
-            print
-            center(hdr_width,'MTTDL RAID Configuration Report')
-            center(hdr_width,disk)
-            center(hdr_width,'MTBF: %s (%.3g)'%(commaize(mtbf),(float(mtbf)/(24.*365.))))
-            center(hdr_width,'MTTR: %d'%(mttr))
-            if size>0:
-                center(hdr_width,'Disk Size: %.3fTB' % (size))
-            if C>0:
-                center(hdr_width,'JBOD Capacity: %d' % (C))
-        if print_header:
-            print
-            for h in hdr:
-                print h
-    elif fmt == 'csv':
-        if disk != '':
-            print 'Disk,%s' % (disk)
-        if size>0:
-            print 'Size,%.3f' % (size)
-        print 'MTBF,%d' % (mtbf)
-        print 'MTTR,%d' % (mttr)
-        print
-        print ',,N,Parity,MTTDL (hrs),MTTDL (yrs),AFR,FT,DC %,DC,Min,C,BD,B,S,JDC,Types'
-
-    if len(Ns)>1:
-        Ns = sorted(Ns)
-    for N in Ns:
-        pt = ['RAID-0', 'RAID-1/10/01', 'RAID-5/Z1', 'RAID-6/Z2', 'RAID-Z3', 'RAID-10(M=%d)' % (N-1)]
-        pf = [0,1,1,2,3,N-1]
-        pm = [1,2,2,3,4,N]
-        pe = [1.,0.5,float((N-1.0)/N),float((N-2.0)/N),float((N-3.0)/N),float(1.0/N)]
-        i = 0
-        num_lines_printed = 0
-        for p in pf:
-            if N < pm[i]:
-                # Skip if this level parity is not supported.
-                i += 1
-                continue
+    def flush(self):
+        if self.buf:
+            self.out.write(''.join(self.buf))
+            self.buf = []
+            self.num = 0
+        self.out.flush()
 
-            if len(filters)>0:
-                # Skip if the match criteria isn't met.
-                skip = True
-                for f in filters:
-                    if re.search(f,pt[i]):
-                        skip = False
-                        break
-                if skip:
-                    i += 1
-                    continue
-
-            num_lines_printed += 1
-            n1 = pow(mtbf,p+1)
-            d1 = pow(mttr,p)
-            d2l = list(N-x for x in range(p+1))
-            d2 = reduce(lambda x,y: x*y,d2l)
-            mttdl = n1 / (d1*d2) # hours
-            mttdl_yrs = float(mttdl) / float(365*24)
-            AFR = 100.*(1./float(mttdl_yrs)) # annualized failure rate
-            DCp =  100.*pe[i] 
-            DC = float(size)*float(N)*pe[i]
-            m = C%N
-            B = C/N
-            if m>0:
-                S = m
-            else:
-                S = N
-                B -= 1
-            BD = N*B
-            JDC = float(B) * float(DC)
-            if fmt == 'text':
-                print '%2d %2d %8.3g %8.3g %8.3g%% %2d %5.1f%% %4.1f %3d %2d %2d %2d %2d %5.1f %s' % (N,p,mttdl,mttdl_yrs, AFR, pf[i], DCp, DC, pm[i], C, BD, B, S, JDC, pt[i])
-            elif fmt == 'csv':
-                print ',,%d,%d,%.3g,%.3g,%.5g,%d,%.3f,%.1f,%d,%d,%d,%d,%d,%.1f,%s' % (N,p,mttdl,mttdl_yrs, AFR/100., pf[i], DCp/100., DC, pm[i], C, BD, B, S, JDC, pt[i])
-
-            i += 1
-        if num_lines_printed>1:
-            print
+# A single report row. The fields are in column order, except for the
+# ones after the type which are only shown, before the types, with a
+# rebuild, a fleet or a cost model, see report_columns():
+#
+#   n          The number of disks in each array.
+#   p          The parity, the number of parity or mirror disks.
+#   mttdl      The MTTDL in hours, a Decimal when it does not fit in
+#              a float.
+#   mttdl_yrs  The MTTDL in years.
+#   afr        The annual failure rate of the array in percent.
+#   ft         The fault tolerance, the disks that can fail.
+#   dcp        The data capacity in percent of the disks.
+#   dc         The data capacity of an array in TB.
+#   min        The minimum number of disks of the RAID type.
+#   c          The JBOD capacity in disks.
+#   bd         The disks of the JBOD used by the arrays.
+#   b          The number of arrays in the JBOD.
+#   s          The number of spares, the disks left over.
+#   jdc        The JBOD data capacity in TB.
+#   type       The RAID type.
+#
+# The rebuild fields are always set, they are only reported with a
+# rebuild model (--rebuild-rate, --ure, --lead-time):
+#
+#   mttr       The effective MTTR in hours: the repair time, the
+#              rebuild time and the wait for a spare.
+#   rio        The rebuild I/O of a failed disk in TB, read and written.
+#   ure        The chance that a rebuild hits a URE.
+#   wait       The expected wait for a hot spare in hours.
+#   exh        The chance that the spare pool is exhausted.
+#
+# The fields of the modes that post-process the rows are in extra, a
+# dictionary keyed by the field names that is None when no mode is on,
+# see row_value():
+#
+#   fdc, fmttdl, fdle   The fleet data capacity in TB, the fleet MTTDL
+#                       in years and the data loss events per year,
+#                       see fleet_rows().
+#   ctb, wtb, elc, tco  The cost and the power per usable TB, the
+#                       expected cost of data loss per year and the
+#                       TCO per usable TB, see cost_rows().
+#   eb, er, es          The elasticities of the MTTDL to the MTBF, the
+#                       MTTR and the disk size, see sensitivity_rows().
+#   q05, q50, q95       The percentiles of the MTTDL in years of
+#                       --uncertainty, see sensitivity_rows().
+Row = collections.namedtuple('Row', ['n', 'p', 'mttdl', 'mttdl_yrs', 'afr',
+                                     'ft', 'dcp', 'dc', 'min', 'c', 'bd',
+                                     'b', 's', 'jdc', 'type', 'mttr', 'rio',
+                                     'ure', 'wait', 'exh', 'extra'],
+                             defaults=(None, None, None, None, None, None))
 
-    if fmt == 'text' and print_key:
-        key = []
-        key.append('KEY')
-        key.append('Term    Definition')
-        key.append('======= ================================================')
-        key.append('AFR     Annualized Failure Rate in years')
-        key.append('B       Number of RAID blocks')
-        key.append('BD      Number of RAID block disks')
-        key.append('C       JBOD capacity (number of disks)')
-        key.append('DC      RAID data capacity (TB)')
-        key.append('FT      Fault Tolerance: max bad disks with no data loss')
-        key.append('JDC     JBOD data capacity in TB')
-        key.append('Min     Minimum number of disks allowed')
-        key.append('MTBF    Mean Time Between Failures in hours')
-        key.append('MTTDL   Mean Time To Data Loss in hours')
-        key.append('MTTR    Mean Time To Recover (repair) in hours')
-        key.append('N       Number of disks in each RAID array')
-        key.append('P       Parity')
-        key.append('S       Spares, must be greater than zero')
-        key_width = max(len(k) for k in key)
-        p = (hdr_width - key_width)/2
-        ps = ' '*p
-        print
-        for k in key:
-            print ps+k
-    print
+def row_value(row, name):
+    """
+    @param row   The Row record.
+    @param name  The name of a Row field or of a field of extra.
+    @returns the value of the field, None for a field of a mode that
+             is off.
+    """
+    if name in Row._fields:
+        return getattr(row, name)
+    return row.extra.get(name) if row.extra else None
+
+def add_fields(row, **fields):
+    """
+    @param row     The Row record.
+    @param fields  The fields of a mode.
+    @returns the row with the fields added to its extra.
+    """
+    return row._replace(extra=dict(row.extra or (), **fields))
+
+def row_dict(row):
+    """
+    @param row  The Row record.
+    @returns the dictionary of the Row fields and of the fields of
+             extra.
+    """
+    d = row._asdict()
+    d.update(d.pop('extra') or ())
+    return d
+
+HEADER = ['      MTTDL    MTTDL',
+          'N  P  (hrs)    (yrs)    AFR       FT DC %   DC   Min C  BD B  S  JDC   Types',
+          '== == ======== ======== ========= == ====== ==== === == == == == ===== ============']
+
+CSV_HEADER = ',,N,Parity,MTTDL (hrs),MTTDL (yrs),AFR,FT,DC %,DC,Min,C,BD,B,S,JDC,Types'
+
+# An optional report column, shown before the types: the Row field,
+# the two header lines, the text format and the factor applied to the
+# value for it, the CSV header and format, and the key entry.
+Column = collections.namedtuple('Column', ['field', 'head', 'text', 'scale',
+                                           'csv_head', 'csv', 'key'])
+
+# The columns of a rebuild rate (--rebuild-rate).
+REBUILD_COLUMNS = [Column('mttr', ('MTTR', '(hrs)'), '%6.1f', 1., 'MTTR (hrs)', '%.2f', None),
+                   Column('rio', ('RIO', '(TB)'), '%6.1f', 1., 'Rebuild I/O (TB)', '%.3f',
+                          'RIO     Rebuild I/O per failed disk in TB')]
+
+# The columns of an unrecoverable read error rate (--ure).
+URE_COLUMNS = [Column('ure', ('', 'URE'), '%8.3g%%', 100., 'URE', '%.5g',
+                      'URE     Chance of a read error while rebuilding a disk')]
+
+# The columns of a shared pool of hot spares (--lead-time).
+SPARE_COLUMNS = [Column('wait', ('Wait', '(hrs)'), '%8.3g', 1., 'Spare Wait (hrs)', '%.5g',
+                        'Wait    Expected wait for a hot spare per failed disk in hours'),
+                 Column('exh', ('', 'Exh'), '%8.3g%%', 100., 'Spares Exhausted', '%.5g',
+                        'Exh     Chance that a failed disk finds no hot spare')]
+
+# The columns of a fleet of JBODs (--fleet).
+FLEET_COLUMNS = [Column('fdc', ('', 'FDC'), '%9.0f', 1., 'FDC', '%.1f',
+                        'FDC     Fleet data capacity in TB'),
+                 Column('fmttdl', ('FMTTDL', '(yrs)'), '%8.3g', 1., 'FMTTDL (yrs)', '%.3g',
+                        'FMTTDL  Fleet MTTDL: years to the first data loss'),
+                 Column('fdle', ('DLE', '(/yr)'), '%8.3g', 1., 'DLE (/yr)', '%.5g',
+                        'DLE     Expected data loss events per year')]
+
+# The columns of a cost model (--disk-price, --disk-watts, ...).
+COST_COLUMNS = [Column('ctb', ('', '$/TB'), '%7.1f', 1., 'Cost ($/TB)', '%.2f',
+                       '$/TB    Disk and chassis cost per usable TB'),
+                Column('wtb', ('', 'W/TB'), '%5.2f', 1., 'Power (W/TB)', '%.3f',
+                       'W/TB    Disk power per usable TB in watts'),
+                Column('elc', ('ELC', '($/yr)'), '%8.3g', 1., 'ELC ($/yr)', '%.5g',
+                       'ELC     Expected cost of data loss per JBOD-year'),
+                Column('tco', ('TCO', '($/TB)'), '%7.1f', 1., 'TCO ($/TB)', '%.2f',
+                       'TCO     Total cost of ownership per usable TB')]
+
+# The columns of the elasticities of the MTTDL (--sensitivity).
+SENSITIVITY_COLUMNS = [Column('eb', ('', 'E(MTBF)'), '%7.2f', 1., 'E(MTBF)', '%.4f',
+                              'E(x)    Elasticity: % change of the MTTDL for a 1% change of x'),
+                       Column('er', ('', 'E(MTTR)'), '%7.2f', 1., 'E(MTTR)', '%.4f', None),
+                       Column('es', ('', 'E(Size)'), '%7.2f', 1., 'E(Size)', '%.4f', None)]
+
+# The columns of the MTTDL percentiles (--uncertainty).
+UNCERTAINTY_COLUMNS = [Column('q05', ('P5', '(yrs)'), '%8.3g', 1., 'MTTDL P5 (yrs)', '%.3g',
+                              'P5      5th percentile of the MTTDL over the input draws'),
+                       Column('q50', ('P50', '(yrs)'), '%8.3g', 1., 'MTTDL P50 (yrs)', '%.3g',
+                              'P50     Median of the MTTDL over the input draws'),
+                       Column('q95', ('P95', '(yrs)'), '%8.3g', 1., 'MTTDL P95 (yrs)', '%.3g',
+                              'P95     95th percentile of the MTTDL over the input draws')]
+
+KEY = ['KEY',
+       'Term    Definition',
+       '======= ================================================',
+       'AFR     Annualized Failure Rate in years',
+       'B       Number of RAID blocks',
+       'BD      Number of RAID block disks',
+       'C       JBOD capacity (number of disks)',
+       'DC      RAID data capacity (TB)',
+       'FT      Fault Tolerance: max bad disks with no data loss',
+       'JDC     JBOD data capacity in TB',
+       'Min     Minimum number of disks allowed',
+       'MTBF    Mean Time Between Failures in hours',
+       'MTTDL   Mean Time To Data Loss in hours',
+       'MTTR    Mean Time To Recover (repair) in hours',
+       'N       Number of disks in each RAID array',
+       'P       Parity',
+       'S       Spares, must be greater than zero']
+
+# A RAID scheme of the registry, see register_scheme(). The values
+# other than the names are numbers or functions of the array size N
+# that work on numbers and on NumPy arrays, so that the registry is
+# evaluated once for all of the array sizes of a sweep:
+#
+#   name    The RAID type, formatted with param(N) if param is given.
+#   ft      The fault tolerance P of each failure group.
+#   min     The minimum number of disks.
+#   eff     The data efficiency, the fraction of the disks for data.
+#   amp     The read amplification, the number of disks read to
+#           rebuild one.
+#   param   The number in the name that depends on N, if any.
+#   width   The number of disks in each failure group, None for N.
+#   groups  The number of failure groups. The data is lost when any
+#           of them loses more than P disks, so the MTTDL is the one
+#           of a group divided by the number of groups. The scheme is
+#           only built from N disks if N = width*groups.
+#   spread  The factor by which the rebuild rate grows because the
+#           rebuild is spread over the array, see rebuild_mttr().
+Scheme = collections.namedtuple('Scheme', ['name', 'ft', 'min', 'eff', 'amp',
+                                           'param', 'width', 'groups', 'spread'],
+                                defaults=(None, None, 1, 1))
+
+# The registry of the RAID schemes in report order.
+SCHEMES = [Scheme('RAID-0', 0, 1, 1., 0),
+           Scheme('RAID-1/10/01', 1, 2, 0.5, 1),
+           Scheme('RAID-5/Z1', 1, 2, lambda N: (N-1.0)/N, lambda N: N-1),
+           Scheme('RAID-6/Z2', 2, 3, lambda N: (N-2.0)/N, lambda N: N-2),
+           Scheme('RAID-Z3', 3, 4, lambda N: (N-3.0)/N, lambda N: N-3),
+           Scheme('RAID-10(M=%d)', lambda N: N-1, lambda N: N, lambda N: 1.0/N, 1,
+                  param=lambda N: N-1)]
+
+# The number of schemes that are always registered. The others are
+# part of the RowCache keys.
+BUILTIN_SCHEMES = len(SCHEMES)
+
+def scheme_value(x, N):
+    """
+    Evaluate a value of a Scheme.
+
+    @param x  The number or the function of N.
+    @param N  The array size or the array of array sizes.
+    @returns the value for N.
+    """
+    return x(N) if callable(x) else x
+
+def scheme_name(scheme, N):
+    """
+    @param scheme  The Scheme.
+    @param N       The array size.
+    @returns the RAID type of the scheme for N disks.
+    """
+    if scheme.param is None:
+        return scheme.name
+    return scheme.name % (scheme_value(scheme.param, N))
+
+def scheme_layout(scheme, N):
+    """
+    @param scheme  The Scheme.
+    @param N       The array size or the array of array sizes.
+    @returns the (width, groups) tuple of the failure groups.
+    """
+    width = N if scheme.width is None else scheme_value(scheme.width, N)
+    return (width, scheme_value(scheme.groups, N))
+
+def find_scheme(N, ptype):
+    """
+    Get the failure groups of a report row.
+
+    @param N      The array size.
+    @param ptype  The RAID type.
+    @returns the (width, groups) tuple, (N, 1) if the type is not
+             registered.
+    """
+    for x in SCHEMES:
+        if scheme_name(x, N) == ptype:
+            return scheme_layout(x, N)
+    return (N, 1)
+
+def parse_scheme(spec):
+    """
+    Get the Scheme of a --scheme specification:
+
+        RS(k,m)        Reed-Solomon erasure coding, stripes of k data
+                       and m parity disks.
+        RAID-50(G=g)   g RAID-5 groups striped together.
+        RAID-60(G=g)   g RAID-6 groups striped together.
+        RAID-10(C=c)   Mirrors of c copies, 3 for triple mirrors.
+        dRAIDp:dd:ss   ZFS dRAID with p parity and d data disks in
+                       each redundancy group and s distributed spares,
+                       for example dRAID2:8d:2s. The spares are
+                       optional.
+
+    @param spec  The specification.
+    @returns the Scheme.
+    @raises ValueError if the specification is not valid.
+    """
+    m = re.search(r'^RS\((\d+),(\d+)\)$', spec)
+    if m:
+        (k, m) = (int(m.group(1)), int(m.group(2)))
+        if k < 1:
+            raise ValueError('RS(k,m) needs at least one data disk: %s' % (spec))
+        return Scheme(spec, m, k+m, k/float(k+m), k,
+                      width=k+m, groups=lambda N: N//(k+m))
+    m = re.search(r'^RAID-([56])0\(G=(\d+)\)$', spec)
+    if m:
+        (p, g) = (int(m.group(1))-4, int(m.group(2)))
+        if g < 1:
+            raise ValueError('RAID-%d0 needs at least one group: %s' % (p+4, spec))
+        return Scheme(spec, p, g*(p+2), lambda N: (N-p*g)/N, lambda N: N//g-p,
+                      width=lambda N: N//g, groups=g)
+    m = re.search(r'^RAID-10\(C=(\d+)\)$', spec)
+    if m:
+        c = int(m.group(1))
+        if c < 1:
+            raise ValueError('RAID-10 needs at least one copy: %s' % (spec))
+        return Scheme(spec, c-1, c, 1.0/c, min(c-1, 1),
+                      width=c, groups=lambda N: N//c)
+    m = re.search(r'^dRAID(\d+):(\d+)d(?::(\d+)s)?$', spec)
+    if m:
+        (p, d, sp) = (int(m.group(1)), int(m.group(2)), int(m.group(3) or 0))
+        if d < 1:
+            raise ValueError('dRAID needs at least one data disk: %s' % (spec))
+        # The rebuild reads and writes all of the children instead of
+        # the disks of one redundancy group.
+        return Scheme(spec, p, d+p+sp, lambda N: d/float(d+p)*(N-sp)/N, d,
+                      spread=lambda N: (N-sp)/float(d+p))
+    raise ValueError('unknown RAID scheme: %s' % (spec))
+
+def register_scheme(scheme):
+    """
+    Add a RAID scheme to the reports, after the ones that are already
+    registered.
+
+    @param scheme  The Scheme.
+    """
+    SCHEMES.append(scheme)
+    RAID_TYPES.clear()
+
+# The raid_types() tables of the recently used N, the least recently
+# used first. They do not depend on the disk, so they are shared by all
+# of the reports.
+RAID_TYPES = collections.OrderedDict()
+RAID_TYPES_SIZE = 256
+
+def raid_types(N):
+    """
+    Get the RAID configurations that are analyzed for arrays of N
+    disks, the registered schemes that can be built from N disks.
+
+    The tables of the recently used N are cached, the callers must not
+    modify them.
+
+    @param N  The number of disks in each RAID array.
+    @returns the parallel lists of types, parity (fault tolerance),
+             minimum number of disks, data efficiency, read
+             amplification, failure group width, number of failure
+             groups and rebuild spread, see Scheme.
+    """
+    types = RAID_TYPES.pop(N, None)
+    if types is None:
+        types = tuple([] for i in range(8))
+        for x in SCHEMES:
+            (width, groups) = scheme_layout(x, N)
+            if width*groups != N:
+                continue
+            for (t, v) in zip(types, (scheme_name(x, N), x.ft, x.min, x.eff, x.amp, width, groups, x.spread)):
+                t.append(scheme_value(v, N))
+        if len(RAID_TYPES) >= RAID_TYPES_SIZE:
+            RAID_TYPES.popitem(last=False)
+    RAID_TYPES[N] = types
+    return types
+
+class RowCache(object):
+    """
+    A least recently used cache of the rows computed for an array size
+    and a set of parameters. It can be backed by a SQLite file so
+    that the rows are shared between invocations. The file is emptied
+    when the MODEL_VERSION changes.
+    """
+    def __init__(self, size=4096, path=None, max_rows=1000000):
+        """
+        @param size      The maximum number of entries kept in memory.
+        @param path      The SQLite cache file, if any.
+        @param max_rows  The maximum number of entries kept in the
+                         file. The least recently used ones are
+                         evicted.
+        """
+        self.size = size
+        self.path = path
+        self.max_rows = max_rows
+        self.lru = collections.OrderedDict()
+        self.db = None
+        self.pending = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        # The database connection cannot be sent to the worker
+        # processes, they open their own.
+        return {'size': self.size, 'path': self.path, 'max_rows': self.max_rows}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def open(self):
+        """
+        Open the cache file the first time it is needed.
+
+        @returns the database connection or None.
+        """
+        if self.db is None and self.path:
+            import sqlite3
+            self.db = sqlite3.connect(self.path, timeout=60)
+            self.db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, used REAL, data BLOB)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS rows_used ON rows (used)')
+            r = self.db.execute("SELECT value FROM meta WHERE name='version'").fetchone()
+            if r is None or r[0] != str(MODEL_VERSION):
+                self.db.execute('DELETE FROM rows')
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(MODEL_VERSION),))
+                self.db.commit()
+        return self.db
+
+    def remember(self, key, rows):
+        self.lru[key] = rows
+        if len(self.lru) > self.size:
+            self.lru.popitem(last=False)
+
+    def get(self, key):
+        """
+        @param key  The parameter tuple.
+        @returns the cached list of Row records or None.
+        """
+        rows = self.lru.pop(key, None)
+        if rows is not None:
+            self.lru[key] = rows
+            self.hits += 1
+            return rows
+        db = self.open()
+        if db is not None:
+            import pickle
+            r = db.execute('SELECT data FROM rows WHERE key=?', (repr(key),)).fetchone()
+            if r is not None:
+                rows = [Row(*x) for x in pickle.loads(r[0])]
+                db.execute('UPDATE rows SET used=? WHERE key=?', (time.time(), repr(key)))
+                self.pending += 1
+                self.remember(key, rows)
+                self.hits += 1
+                return rows
+        self.misses += 1
+        return None
+
+    def put(self, key, rows):
+        """
+        @param key   The parameter tuple.
+        @param rows  The list of Row records.
+        """
+        self.remember(key, rows)
+        db = self.open()
+        if db is not None:
+            import pickle
+            # Store plain tuples, the Row class is __main__.Row when
+            # this runs as a script.
+            data = pickle.dumps([tuple(x) for x in rows], pickle.HIGHEST_PROTOCOL)
+            db.execute('INSERT OR REPLACE INTO rows VALUES (?,?,?)',
+                       (repr(key), time.time(), data))
+            self.pending += 1
+            if self.pending >= 1000:
+                self.flush()
+
+    def flush(self):
+        """
+        Evict the least recently used entries of the file and commit.
+        """
+        if self.db is not None and self.pending:
+            n = self.db.execute('SELECT COUNT(*) FROM rows').fetchone()[0]
+            if n > self.max_rows:
+                self.db.execute('DELETE FROM rows WHERE key IN (SELECT key FROM rows ORDER BY used LIMIT ?)',
+                                (n-self.max_rows,))
+            self.db.commit()
+            self.pending = 0
+
+    def close(self):
+        self.flush()
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+def raid_rows(N, mtbf=750000, mttr=24, size=2.0, C=24, scheme=None, filters=None, limits=None, markov=None, cache=None, rebuild=None):
+    """
+    Compute the report rows for arrays of N disks.
+
+    This is the library entry point, nothing is printed.
+
+    Example:
+        >>> import raid
+        >>> for row in raid.raid_rows(6, scheme='RAID-6/Z2'):
+        ...     print(row.mttdl_yrs, row.jdc)
+
+    @param N        The number of disks in each RAID array.
+    @param mtbf     The mean time between failures in hours.
+    @param mttr     The mean time to repair in hours.
+    @param size     The disk size in TB.
+    @param C        The JBOD capacity (number of disks).
+    @param scheme   The RAID type to report, for example 'RAID-6/Z2'
+                    or 'RAID-10'. The default is all of them.
+    @param filters  The patterns of the RAID types to keep or a
+                    TypeFilter.
+    @param limits   The structured filters, see within_limits().
+    @param markov   The Markov model parameters, see markov_mttdl().
+                    The default is the closed form formula.
+    @param cache    The RowCache, if any. All of the RAID types are
+                    computed and cached, the filters are applied to
+                    the cached rows.
+    @param rebuild  The rebuild model, see rebuild_mttr(). The default
+                    is to use the MTTR as is.
+    @returns the list of Row records in report order.
+    """
+    rows = []
+    filters = type_filter(filters)
+    if limits is None:
+        limits = {}
+    if cache is not None:
+        key = (N, mtbf, mttr, size, C,
+               tuple(sorted(markov.items())) if markov is not None else None,
+               tuple(sorted(rebuild.items())) if rebuild is not None else None)
+        if len(SCHEMES) > BUILTIN_SCHEMES:
+            key += tuple(x.name for x in SCHEMES[BUILTIN_SCHEMES:])
+        rows = cache.get(key)
+        if rows is None:
+            rows = raid_rows(N, mtbf, mttr, size, C, markov=markov, rebuild=rebuild)
+            cache.put(key, rows)
+        elif STATS is not None:
+            STATS.count('candidates', len(rows))
+        return [x for x in rows
+                if (scheme is None or scheme == x.type or x.type.startswith(scheme+'('))
+                and filters(x.type)
+                and (not limits or within_limits(limits, x.ft, x.mttdl_yrs, x.afr, x.jdc))]
+    pt, pf, pm, pe, pa, pw, pg, ps = raid_types(N)
+    ure = rebuild_ure(size, pa, rebuild)
+    if rebuild is not None and rebuild.get('spares') is not None:
+        B = max(C-rebuild['spares'], 0)//N
+        S = C-N*B
+    else:
+        m = C%N
+        B = C//N
+        if m>0:
+            S = m
+        else:
+            S = N
+            B -= 1
+    BD = N*B
+    (wait, exh) = spare_wait(S, BD, mtbf, rebuild)
+    for i in range(len(pf)):
+        p = pf[i]
+        if N < pm[i]:
+            # Skip if this level parity is not supported.
+            continue
+
+        if scheme is not None and scheme != pt[i] and not pt[i].startswith(scheme+'('):
+            continue
+
+        if STATS is not None:
+            STATS.count('candidates')
+
+        if not filters(pt[i]):
+            # Skip if the match criteria isn't met.
+            continue
+
+        if 'min_ft' in limits and pf[i] < limits['min_ft']:
+            continue
+
+        (hrs, RIO) = rebuild_mttr(mttr, size, pa[i], rebuild, ps[i])
+        if rebuild is not None and 'lead' in rebuild:
+            hrs += wait
+        URE = ure[i]
+        if markov is not None:
+            mttdl = float(markov_mttdl(pw[i], p, mtbf, hrs, size, markov, URE, pa[i])[0]) / pg[i]
+        else:
+            mttdl = closed_mttdl(pw[i], p, mtbf, hrs, URE, pg[i]) # hours
+        (mttdl_yrs, AFR) = mttdl_columns(mttdl) # AFR: annualized failure rate
+        DCp =  100.*pe[i]
+        DC = float(size)*float(N)*pe[i]
+        JDC = float(B) * float(DC)
+        if limits and not within_limits(limits, pf[i], mttdl_yrs, AFR, JDC):
+            continue
+        rows.append(Row(N,p,mttdl,mttdl_yrs,AFR,pf[i],DCp,DC,pm[i],C,BD,B,S,JDC,pt[i],hrs,RIO,URE,wait,exh))
+    return rows
+
+def markov_mttdl(N, p, mtbf, mttr, size, markov, ure=0., amp=None):
+    """
+    Compute the MTTDL from a continuous time Markov chain instead of
+    the closed form formula.
+
+    The chain for an array of N disks that tolerates p failures has
+    the transient states 0..p, the number of failed disks, and an
+    absorbing data loss state. In state k the disks fail at the rate
+    (N-k)/mtbf, multiplied by the correlation factor once a disk has
+    already failed, and a failed disk is rebuilt at the rate 1/mttr.
+    A latent sector error or an unrecoverable read error found while
+    rebuilding with no redundancy left (state p) loses the data. The
+    rebuild reads the amp disks of the read amplification, like the
+    URE of rebuild_ure().
+
+    The generator is tridiagonal so the mean absorption time is found
+    by forward elimination of the banded system: the expected time to
+    go from state k to k+1 is (1 + r_k*T_k-1)/f_k where f_k is the
+    rate up and r_k the rate of successful repairs. All of the chains
+    share this structure, whatever their N and p, so they are solved
+    together one state at a time.
+
+    @param N       The array sizes, a number or an array.
+    @param p       The fault tolerance of each array.
+    @param mtbf    The mean time between failures in hours.
+    @param mttr    The mean time to repair in hours, a number or an
+                   array like N, see rebuild_mttr().
+    @param size    The disk size in TB.
+    @param markov  The model parameters: lse, the latent sector errors
+                   per TB read, and corr, the correlated failure
+                   factor.
+    @param ure     The probability that a rebuild hits an
+                   unrecoverable read error, a number or an array like
+                   N, see rebuild_ure().
+    @param amp     The read amplification, a number or an array like
+                   N. The default is the N-p disks left.
+    @returns the MTTDL in hours as an array.
+    """
+    load_numpy('the Markov model')
+    N = numpy.atleast_1d(numpy.asarray(N, dtype=numpy.float64))
+    p = numpy.atleast_1d(numpy.asarray(p, dtype=numpy.int64))
+    lse = markov.get('lse', 0.)
+    corr = markov.get('corr', 1.)
+    mu = numpy.broadcast_to(1./numpy.asarray(mttr, dtype=numpy.float64), N.shape)
+    with numpy.errstate(divide='ignore'):
+        # A certain URE is -inf, the rebuild always fails.
+        ure = numpy.broadcast_to(numpy.log1p(-numpy.asarray(ure, dtype=numpy.float64)), N.shape)
+    if amp is None:
+        amp = N - p
+    amp = numpy.broadcast_to(numpy.asarray(amp, dtype=numpy.float64), N.shape)
+
+    T = numpy.zeros(len(N))      # time to go from state k-1 to k
+    mttdl = numpy.zeros(len(N))
+    with numpy.errstate(over='ignore', invalid='ignore'):
+        for k in range(int(p.max())+1 if len(p) else 0):
+            i = numpy.flatnonzero(p >= k)
+            up = (N[i]-k)/float(mtbf)
+            if k == 0:
+                T[i] = 1./up
+            else:
+                up *= corr
+                # Latent sector errors on the disks read to rebuild
+                # the last redundant disk, or a URE.
+                h = numpy.where(p[i] == k, -numpy.expm1(-lse*float(size)*amp[i] + ure[i]), 0.)
+                up += mu[i]*h
+                T[i] = (1. + mu[i]*(1.-h)*T[i])/up
+            mttdl[i] += T[i]
+    return mttdl
+
+def log_factorial(n, array=False):
+    """
+    Get the table of log(k!) for k = 0..n.
+
+    The table is computed with lgamma() and grows as needed, it at
+    least doubles so that an ascending sweep only extends it a few
+    times.
+
+    @param n      The largest k needed.
+    @param array  Return the table as a NumPy array.
+    @returns the table with at least n+1 entries.
+    """
+    global LOG_FACTORIAL_ARRAY
+    t = LOG_FACTORIAL
+    if len(t) <= n:
+        t.extend(math.lgamma(k+1) for k in range(len(t), max(n+1, 2*len(t))))
+        LOG_FACTORIAL_ARRAY = None
+    if array:
+        if LOG_FACTORIAL_ARRAY is None:
+            LOG_FACTORIAL_ARRAY = load_numpy().array(t)
+        return LOG_FACTORIAL_ARRAY
+    return t
+
+def exp_mttdl(lm):
+    """
+    Get the MTTDL from its natural log.
+
+    @param lm  The log of the MTTDL.
+    @returns the MTTDL as a float or, if it is too large or too small
+             for a float, as a Decimal.
+    """
+    if -LOG_FLOAT_MAX < lm < LOG_FLOAT_MAX:
+        return math.exp(lm)
+    # Split 10^(lm/ln 10) into a float mantissa and a decimal exponent,
+    # Decimal.exp() is much slower and more precise than needed.
+    (e, f) = divmod(lm / math.log(10), 1)
+    return DECIMAL.scaleb(decimal.Decimal(repr(10**f)), int(e))
+
+def log_big(x):
+    """
+    Get the natural log of a Decimal that does not fit in a float.
+
+    @param x  The number.
+    @returns the log as a float.
+    """
+    e = x.adjusted()
+    return (e + math.log10(float(x.scaleb(-e)))) * math.log(10)
+
+def rebuild_mttr(mttr, size, amp, rebuild=None, spread=1):
+    """
+    Get the MTTR of an array and the I/O of a rebuild.
+
+    Rebuilding a failed disk reads amp disks, the ones that the RAID
+    type needs to reconstruct it, and writes the new disk. With a
+    rebuild model all of that I/O goes through the rebuild bandwidth
+    that the foreground load leaves, so the rebuild time grows with
+    the disk size and, for parity RAID, with the array width. It is
+    added to the MTTR, which is then the time to replace the disk.
+
+    It works on numbers and on NumPy arrays, so the loop and the sweep
+    engines get the same values.
+
+    @param mttr     The mean time to repair in hours.
+    @param size     The disk size in TB.
+    @param amp      The read amplification, the number of disks read
+                    to rebuild one. 0 means that there is no rebuild.
+    @param rebuild  The rebuild model: rate, the rebuild bandwidth in
+                    MB/s, load, the percent of it taken by the
+                    foreground I/O, ure, the unrecoverable read
+                    error rate per bit, see rebuild_ure(), spares,
+                    the minimum number of spares of a JBOD, see
+                    sweep_jbod(), and lead, the replacement lead
+                    time of the spares, see spare_wait(). Without a
+                    rate the MTTR is used as is.
+    @param spread   The factor by which the rebuild rate grows because
+                    the rebuild is spread over the array, see Scheme.
+    @returns the (MTTR in hours, rebuild I/O in TB) tuple.
+    """
+    # The new disk is only written when there is something to read.
+    rio = (amp + (amp > 0)) * float(size)
+    if rebuild is None or 'rate' not in rebuild:
+        return (mttr, rio)
+    rate = rebuild['rate'] * (1. - rebuild.get('load', 0.)/100.) * spread
+    return (mttr + rio*1e6/rate/3600., rio)
+
+def ure_table(n, size, ure, array=False):
+    """
+    Get the table of the probability that reading k disks hits an
+    unrecoverable read error, for k = 0..n.
+
+    Reading b bits has no error with the probability (1-ure)^b, so the
+    probability of an error is -expm1(b*log1p(-ure)), which keeps its
+    precision for the tiny rates and the huge numbers of bits. The
+    tables grow like the log factorial table.
+
+    @param n      The largest number of disks read.
+    @param size   The disk size in TB.
+    @param ure    The unrecoverable read errors per bit read.
+    @param array  Return the table as a NumPy array.
+    @returns the table with at least n+1 entries.
+    """
+    key = (float(size), ure)
+    t = URE_TABLES.get(key)
+    if t is None or len(t[0]) <= n:
+        if len(URE_TABLES) >= 1<<10:
+            URE_TABLES.clear()
+        bits = float(size)*8e12
+        x = math.log1p(-ure)
+        t = URE_TABLES[key] = ([-math.expm1(k*bits*x) for k in range(max(n+1, 2*len(t[0]) if t else 0))], None)
+    if array:
+        if t[1] is None:
+            t = URE_TABLES[key] = (t[0], load_numpy().array(t[0]))
+        return t[1]
+    return t[0]
+
+def rebuild_ure(size, amp, rebuild=None):
+    """
+    Get the probability that a rebuild hits an unrecoverable read
+    error (URE).
+
+    It works on the lists of raid_types() and on NumPy arrays, the
+    probabilities are looked up in the same table for both.
+
+    @param size     The disk size in TB.
+    @param amp      The read amplifications, the numbers of disks read
+                    to rebuild one.
+    @param rebuild  The rebuild model, see rebuild_mttr().
+    @returns the probabilities, 0 without a URE rate.
+    """
+    if isinstance(amp, list):
+        if rebuild is None or not rebuild.get('ure'):
+            return [0.]*len(amp)
+        t = ure_table(max(amp), size, rebuild['ure'])
+        return [t[k] for k in amp]
+    if rebuild is None or not rebuild.get('ure'):
+        return amp*0.
+    return ure_table(int(amp.max()) if len(amp) else 0, size, rebuild['ure'], True)[amp]
+
+def spare_table(m):
+    """
+    Get the tables of a pool of hot spares for k = 0, 1, ... spares.
+
+    A failed disk takes a spare and is replaced, as a new spare, after
+    the lead time, so the number of replacements on order is Poisson
+    with the mean m, the failures during a lead time. A failed disk
+    that finds the j orders using all of the k spares waits for the
+    (j-k+1)th one to arrive, the lead times that are left are uniform
+    so that is (j-k+1)/(j+1) lead times on average. The tables are
+    the chance that the pool is exhausted, Q(k) = P(j >= k), and the
+    expected wait in lead times, the sum over j >= k of
+    P(j)*(1-k/(j+1)). The tails are summed from the far end with the
+    log factorial table so that the tiny ones keep their precision.
+
+    @param m  The mean number of failures during a lead time.
+    @returns the (exhausted, wait) tables. Their last entry is 0, the
+             value for all the larger numbers of spares.
+    """
+    t = SPARE_TABLES.get(m)
+    if t is None:
+        if len(SPARE_TABLES) >= 1<<12:
+            SPARE_TABLES.clear()
+        # The chance of more orders than this is too small to matter.
+        K = int(m + 12*math.sqrt(m)) + 40
+        lf = log_factorial(K)
+        if m > 0:
+            lm = math.log(m)
+            pmf = [math.exp(j*lm - m - lf[j]) for j in range(K+1)]
+        else:
+            pmf = [1.] + [0.]*K
+        exh = [0.]*(K+2)
+        wait = [0.]*(K+2)
+        (t0, t1) = (0., 0.)
+        for j in range(K, -1, -1):
+            t0 += pmf[j]
+            t1 += pmf[j]/(j+1)
+            exh[j] = t0
+            wait[j] = max(t0 - j*t1, 0.)
+        t = SPARE_TABLES[m] = (exh, wait)
+    return t
+
+def spare_wait(S, BD, mtbf, rebuild=None):
+    """
+    Get the expected wait for a hot spare and the chance that a failed
+    disk finds none.
+
+    The S spares of a JBOD are a pool shared by all of its arrays, so
+    a failed disk is only rebuilt right away while the pool is not
+    exhausted by the BD disks of the arrays, which fail at the rate
+    BD/mtbf. See spare_table().
+
+    It works on numbers and on NumPy arrays, the values are looked up
+    in the same tables for both. The arrays only need one table for
+    each distinct BD, they are concatenated so that all of the rows
+    are looked up at once.
+
+    @param S        The number of spares.
+    @param BD       The number of disks in the arrays.
+    @param mtbf     The mean time between failures in hours.
+    @param rebuild  The rebuild model: lead, the replacement lead time
+                    in hours, see rebuild_mttr().
+    @returns the (wait in hours, chance that the pool is exhausted)
+             tuple, 0 without a lead time.
+    """
+    if rebuild is None or 'lead' not in rebuild:
+        return (S*0., S*0.)
+    lead = rebuild['lead']
+    if not hasattr(S, 'shape'):
+        (exh, wait) = spare_table(BD*lead/float(mtbf))
+        k = min(S, len(exh)-1)
+        return (lead*wait[k], exh[k])
+    (u, inv) = numpy.unique(BD, return_inverse=True)
+    tables = [spare_table(x*lead/float(mtbf)) for x in u.tolist()]
+    sizes = numpy.array([len(x[0]) for x in tables], dtype=numpy.int64)
+    offsets = numpy.cumsum(sizes) - sizes
+    i = offsets[inv] + numpy.minimum(S, sizes[inv]-1)
+    exh = numpy.array([y for x in tables for y in x[0]])
+    wait = numpy.array([y for x in tables for y in x[1]])
+    return (lead*wait[i], exh[i])
+
+def closed_mttdl(N, p, mtbf, mttr, ure=0., groups=1):
+    """
+    Compute the closed form MTTDL in hours:
+
+        mtbf^(p+1) / (mttr^p * N*(N-1)*...*(N-p))
+
+    When the numerator and the denominator fit in a float they are
+    computed directly and, if mtbf and mttr are integers, divided like
+    integers. Otherwise, for example RAID-10 with a large N, the MTTDL
+    is computed in log space with the falling factorial taken from the
+    log factorial table. That runs at float speed instead of with huge
+    integers and the result is finite even when it is too large for a
+    float, in which case it is a Decimal.
+
+    An unrecoverable read error (URE) during the rebuild with no
+    redundancy left loses the data like another disk failure. The
+    chance of that failure is (N-p)*mttr/mtbf, so the rate of data
+    loss is multiplied by 1 + ure*mtbf/((N-p)*mttr), the effective
+    MTTDL is divided by it.
+
+    An array of several failure groups loses data when any of them
+    does, so the MTTDL of a group is divided by the number of groups.
+
+    @param N       The number of disks in the array, or in each failure
+                   group.
+    @param p       The fault tolerance.
+    @param mtbf    The mean time between failures in hours.
+    @param mttr    The mean time to repair in hours.
+    @param ure     The probability that a rebuild hits a URE, see
+                   rebuild_ure().
+    @param groups  The number of failure groups.
+    @returns the MTTDL in hours.
+    """
+    # Without parity there is no MTTR term, the MTTR can be 0.
+    lr = p*math.log(mttr) if p else 0.
+    # The URE term, ure/(chance of another failure during a rebuild).
+    u = ure*float(mtbf)/(float(N-p)*mttr) if p and ure > 0 else 0.
+    if p <= 170 and (p+1)*math.log(mtbf) < LOG_FLOAT_MAX and lr < LOG_FLOAT_MAX:
+        n1 = float(mtbf)**(p+1)
+        d = float(mttr)**p * functools.reduce(operator.mul, (float(N-x) for x in range(p+1)))
+        if d < float('inf'):
+            mttdl = n1 / d
+            if isinstance(mtbf,int) and isinstance(mttr,int):
+                mttdl = math.floor(mttdl)
+            if u > 0:
+                mttdl /= 1. + u
+            if groups > 1:
+                mttdl /= groups
+            return mttdl
+    lf = log_factorial(N)
+    return exp_mttdl((p+1)*math.log(mtbf) - lr - (lf[N] - lf[N-p-1]) - math.log1p(u) - math.log(groups))
+
+def mttdl_columns(mttdl):
+    """
+    Get the MTTDL in years and the annualized failure rate.
+
+    @param mttdl  The MTTDL in hours, a float or a Decimal.
+    @returns the (MTTDL in years, AFR in percent) tuple.
+    """
+    if isinstance(mttdl, decimal.Decimal):
+        mttdl_yrs = DECIMAL.divide(mttdl, 365*24)
+        return (mttdl_yrs, DECIMAL.divide(100, mttdl_yrs))
+    mttdl_yrs = float(mttdl) / float(365*24)
+    if mttdl_yrs == 0:
+        return (mttdl_yrs, float('inf'))
+    return (mttdl_yrs, 100.*(1./float(mttdl_yrs)))
+
+def format_big(x, prec):
+    """
+    Format a Decimal that does not fit in a float like %g does.
+
+    @param x     The number.
+    @param prec  The number of significant digits.
+    @returns the formatted number.
+    """
+    e = x.adjusted()
+    (m, me) = ('%.*e' % (prec-1, float(x.scaleb(-e)))).split('e')
+    if '.' in m:
+        m = m.rstrip('0').rstrip('.')
+    return '%se%+03d' % (m, e+int(me))
+
+TEXT_ROW = '%2d %2d %8.3g %8.3g %8.3g%% %2d %5.1f%% %4.1f %3d %2d %2d %2d %2d %5.1f %s'
+CSV_ROW = ',,%d,%d,%.3g,%.3g,%.5g,%d,%.3f,%.1f,%d,%d,%d,%d,%d,%.1f,%s'
+
+# The formats for the rows whose MTTDL is a Decimal.
+TEXT_ROW_BIG = TEXT_ROW.replace('%8.3g', '%8s')
+CSV_ROW_BIG = CSV_ROW.replace('%.3g', '%s').replace('%.5g', '%s')
+
+def report_columns(rebuild, fleet=None, cost=None, sens=None):
+    """
+    Get the optional columns of a report.
+
+    @param rebuild  The rebuild model, if any.
+    @param fleet    The fleet model, if any.
+    @param cost     The cost model, if any.
+    @param sens     The sensitivity model, if any.
+    @returns the list of Column records.
+    """
+    columns = []
+    if rebuild is not None:
+        if 'rate' in rebuild:
+            columns += REBUILD_COLUMNS
+        if 'lead' in rebuild:
+            if 'rate' not in rebuild:
+                columns += REBUILD_COLUMNS[:1]
+            columns += SPARE_COLUMNS
+        if 'ure' in rebuild:
+            columns += URE_COLUMNS
+    if fleet is not None:
+        columns += FLEET_COLUMNS
+    if cost is not None:
+        columns += COST_COLUMNS
+    if sens is not None:
+        if sens.get('elasticity'):
+            columns += SENSITIVITY_COLUMNS
+        if sens.get('draws'):
+            columns += UNCERTAINTY_COLUMNS
+    return columns
+
+def report_header(fmt, columns):
+    """
+    Get the column headers of a report.
+
+    @param fmt      The output format: 'text' or 'csv'.
+    @param columns  The optional columns, see report_columns().
+    @returns the list of text header lines or the CSV header.
+    """
+    if fmt == 'csv':
+        return CSV_HEADER.replace(',Types', ''.join(','+c.csv_head for c in columns)+',Types')
+    if not columns:
+        return HEADER
+    i = HEADER[2].rindex(' ') + 1   # where the types start
+    widths = [len(c.text % 0) for c in columns]
+    extra = [''.join(c.head[k].ljust(w)+' ' for (c, w) in zip(columns, widths)) for k in range(2)]
+    return [(HEADER[0].ljust(i) + extra[0]).rstrip(),
+            HEADER[1][:i] + extra[1] + HEADER[1][i:],
+            HEADER[2][:i] + ''.join('='*w+' ' for w in widths) + HEADER[2][i:]]
+
+def format_row(fmt, row, columns=None):
+    """
+    Format a single report row.
+
+    @param fmt      The output format: 'text' or 'csv'.
+    @param row      The Row record.
+    @param columns  The optional columns, see report_columns().
+    @returns the formatted line without the trailing newline.
+    """
+    (N,p,mttdl,mttdl_yrs,AFR,FT,DCp,DC,Min,C,BD,B,S,JDC,ptype) = row[:15]
+    if columns:
+        if fmt == 'text':
+            ptype = ''.join(c.text % (c.scale*row_value(row, c.field)) + ' ' for c in columns) + ptype
+        else:
+            ptype = ''.join(c.csv % (row_value(row, c.field)) + ',' for c in columns) + ptype
+    if isinstance(mttdl, decimal.Decimal):
+        if fmt == 'text':
+            return TEXT_ROW_BIG % (N,p,format_big(mttdl,3),format_big(mttdl_yrs,3), format_big(AFR,3), FT, DCp, DC, Min, C, BD, B, S, JDC, ptype)
+        elif fmt == 'csv':
+            return CSV_ROW_BIG % (N,p,format_big(mttdl,3),format_big(mttdl_yrs,3), format_big(DECIMAL.divide(AFR,100),5), FT, DCp/100., DC, Min, C, BD, B, S, JDC, ptype)
+    elif fmt == 'text':
+        return TEXT_ROW % (N,p,mttdl,mttdl_yrs, AFR, FT, DCp, DC, Min, C, BD, B, S, JDC, ptype)
+    elif fmt == 'csv':
+        return CSV_ROW % (N,p,mttdl,mttdl_yrs, AFR/100., FT, DCp/100., DC, Min, C, BD, B, S, JDC, ptype)
+    raise ValueError('unknown output format: %s' % (fmt))
+
+def write_title(out, width, title, disk, mtbf, mttr, size, C, lines=None):
+    """
+    Write the centered title of a text report.
+
+    @param out    The output stream.
+    @param width  The width of the report.
+    @param title  The report title.
+    @param disk   The disk name.
+    @param mtbf   The mean time between failures in hours.
+    @param mttr   The mean time to repair in hours.
+    @param size   The disk size in TB.
+    @param C      The JBOD capacity.
+    @param lines  Extra lines to add to the title.
+    """
+    out.write('\n')
+    center(width,title,out)
+    center(width,disk,out)
+    center(width,'MTBF: %s (%.3g)'%(commaize(mtbf),(float(mtbf)/(24.*365.))),out)
+    center(width,'MTTR: %s'%(num2str(mttr)),out)
+    if size>0:
+        center(width,'Disk Size: %.3fTB' % (size),out)
+    if C>0:
+        center(width,'JBOD Capacity: %d' % (C),out)
+    for line in lines or []:
+        center(width,line,out)
+
+def write_csv_params(out, disk, mtbf, mttr, size, rebuild=None, fleet=None, cost=None, sens=None):
+    """
+    Write the parameters at the top of a CSV report.
+
+    @param out      The output stream.
+    @param disk     The disk name.
+    @param mtbf     The mean time between failures in hours.
+    @param mttr     The mean time to repair in hours.
+    @param size     The disk size in TB.
+    @param rebuild  The rebuild model, if any.
+    @param fleet    The fleet model, if any.
+    @param cost     The cost model, if any.
+    @param sens     The sensitivity model, if any.
+    """
+    if disk != '':
+        out.write('Disk,%s\n' % (disk))
+    if size>0:
+        out.write('Size,%.3f\n' % (size))
+    out.write('MTBF,%d\n' % (mtbf))
+    out.write('MTTR,%s\n' % (num2str(mttr)))
+    if rebuild is not None and 'rate' in rebuild:
+        out.write('Rebuild Rate,%s\n' % (num2str(rebuild['rate'])))
+        out.write('Rebuild Load,%s\n' % (num2str(rebuild.get('load', 0.))))
+    if rebuild is not None and 'ure' in rebuild:
+        out.write('URE,%g\n' % (rebuild['ure']))
+    if rebuild is not None and 'spares' in rebuild:
+        out.write('Spares,%d\n' % (rebuild['spares']))
+    if rebuild is not None and 'lead' in rebuild:
+        out.write('Lead Time,%s\n' % (num2str(rebuild['lead'])))
+    if fleet is not None:
+        for (name, key) in [('Fleet JBODs', 'jbods'), ('Rack Size', 'rack'), ('Span', 'span'),
+                            ('JBOD MTBF', 'jbod_mtbf'), ('Rack MTBF', 'rack_mtbf'),
+                            ('Domain MTTR', 'domain_mttr')]:
+            out.write('%s,%s\n' % (name, num2str(fleet.get(key, 0))))
+    if cost is not None:
+        for (name, key) in COST_PARAMS:
+            out.write('%s,%s\n' % (name, num2str(cost.get(key, 0))))
+    if sens is not None and sens.get('draws'):
+        for (name, key) in SENSITIVITY_PARAMS:
+            out.write('%s,%s\n' % (name, num2str(sens.get(key, 0))))
+    out.write('\n')
+
+def rebuild_title(rebuild):
+    """
+    Get the title lines of a rebuild model.
+
+    @param rebuild  The rebuild model, if any.
+    @returns the list of title lines.
+    """
+    lines = []
+    if rebuild is not None and 'rate' in rebuild:
+        lines.append('Rebuild: %s MB/s, %s%% load' % (num2str(rebuild['rate']), num2str(rebuild.get('load', 0.))))
+    if rebuild is not None and 'ure' in rebuild:
+        lines.append('URE: %g per bit read' % (rebuild['ure']))
+    if rebuild is not None and ('spares' in rebuild or 'lead' in rebuild):
+        line = 'Spares: '
+        if 'spares' in rebuild:
+            line += 'at least %d per JBOD' % (rebuild['spares'])
+        else:
+            line += 'the unused disks'
+        if 'lead' in rebuild:
+            line += ', %s hours lead time' % (num2str(rebuild['lead']))
+        lines.append(line)
+    return lines
+
+def fleet_title(fleet):
+    """
+    Get the title lines of a fleet model.
+
+    @param fleet  The fleet model, if any.
+    @returns the list of title lines.
+    """
+    if fleet is None:
+        return []
+    line = 'Fleet: %s JBODs' % (commaize(fleet['jbods']))
+    if fleet.get('rack'):
+        line += ', %d per rack' % (fleet['rack'])
+    if fleet.get('span', 1) > 1:
+        line += ', arrays span %d' % (fleet['span'])
+    return [line]
+
+def cost_title(cost):
+    """
+    Get the title lines of a cost model.
+
+    @param cost  The cost model, if any.
+    @returns the list of title lines.
+    """
+    if cost is None:
+        return []
+    return ['Disk: $%s, %sW, Chassis: $%s' % (num2str(cost['disk_price']), num2str(cost['disk_watts']),
+                                             num2str(cost['chassis_price'])),
+            'Power: $%s/kWh, Data Loss: $%s/TB, %s years' % (num2str(cost['kwh_price']),
+                                                            num2str(cost['loss_cost']),
+                                                            num2str(cost['years']))]
+
+def write_report(rows, fmt='text', disk='', mtbf=750000, mttr=24, size=2.0, C=24,
+                 print_title=True, print_header=True, print_key=True, out=None, rebuild=None,
+                 fleet=None, cost=None, sens=None):
+    """
+    Write the report for a set of rows.
+
+    A blank line separates the array sizes that report more than one
+    RAID type.
+
+    @param rows          The Row records in report order, any
+                         iterable. The rows are written as they
+                         arrive.
+    @param fmt           The output format: 'text' or 'csv'.
+    @param disk          The disk name.
+    @param mtbf          The mean time between failures in hours.
+    @param mttr          The mean time to repair in hours.
+    @param size          The disk size in TB.
+    @param C             The JBOD capacity.
+    @param print_title   Print the title.
+    @param print_header  Print the column headers.
+    @param print_key     Print the key.
+    @param out           The output stream, the default is stdout.
+    @param rebuild       The rebuild model, if any. The columns of the
+                         model are reported with it, see
+                         report_columns().
+    @param fleet         The fleet model, if any. The rows must have
+                         the fleet fields, see fleet_rows().
+    @param cost          The cost model, if any. The rows must have the
+                         cost fields, see cost_rows().
+    @param sens          The sensitivity model, if any. The rows must
+                         have its fields, see sensitivity_rows().
+    """
+    out = ChunkWriter(out or sys.stdout)
+    columns = report_columns(rebuild, fleet, cost, sens)
+    header = report_header('text', columns)
+    hdr_width = max(len(h) for h in header)
+
+    if fmt == 'text':
+        if print_title:
+            write_title(out, hdr_width, 'MTTDL RAID Configuration Report',
+                        disk, mtbf, mttr, size, C,
+                        rebuild_title(rebuild) + fleet_title(fleet) + cost_title(cost) +
+                        sensitivity_title(sens))
+        if print_header:
+            out.write('\n')
+            for h in header:
+                out.write(h+'\n')
+    elif fmt == 'csv':
+        write_csv_params(out, disk, mtbf, mttr, size, rebuild, fleet, cost, sens)
+        out.write(report_header('csv', columns)+'\n')
+
+    num_lines_printed = 0
+    last = None
+    first = True
+    for row in rows:
+        if row.n != last:
+            if num_lines_printed>1:
+                out.write('\n')
+            num_lines_printed = 0
+            last = row.n
+        out.write(format_row(fmt, row, columns)+'\n')
+        num_lines_printed += 1
+        if first:
+            # Show the first row right away.
+            out.flush()
+            first = False
+    if num_lines_printed>1:
+        out.write('\n')
+
+    if fmt == 'text' and print_key:
+        key = KEY[:3] + sorted(KEY[3:] + [c.key for c in columns if c.key], key=str.upper)
+        key_width = max(len(k) for k in key)
+        ps = ' '*((hdr_width - key_width)//2)
+        out.write('\n')
+        for k in key:
+            out.write(ps+k+'\n')
+    out.write('\n')
+    out.flush()
+
+# The fields of the binary records, see row_records(). They are the
+# Row fields plus the parameters of the report and the natural log of
+# the MTTDL, which is finite when the MTTDL does not fit in a float.
+RECORD_DTYPE = [('disk', '<U64'), ('mtbf', '<f8'), ('mttr', '<f8'), ('size', '<f8'),
+                ('n', '<i8'), ('p', '<i8'), ('mttdl', '<f8'),
+                ('log_mttdl', '<f8'), ('mttdl_yrs', '<f8'), ('afr', '<f8'),
+                ('ft', '<i8'), ('dcp', '<f8'), ('dc', '<f8'), ('min', '<i8'),
+                ('c', '<i8'), ('bd', '<i8'), ('b', '<i8'), ('s', '<i8'),
+                ('jdc', '<f8'), ('type', '<U32'), ('array_mttr', '<f8'), ('rio', '<f8'), ('ure', '<f8'),
+                ('wait', '<f8'), ('exh', '<f8'),
+                ('fdc', '<f8'), ('fmttdl', '<f8'), ('fdle', '<f8'),
+                ('ctb', '<f8'), ('wtb', '<f8'), ('elc', '<f8'), ('tco', '<f8'),
+                ('eb', '<f8'), ('er', '<f8'), ('es', '<f8'),
+                ('q05', '<f8'), ('q50', '<f8'), ('q95', '<f8')]
+
+# The record fields of the Row fields that are named differently. The
+# mttr field is the MTTR of the report, the MTTR of each RAID type with
+# its rebuild time is array_mttr.
+RECORD_FIELDS = {'mttr': 'array_mttr'}
+
+# The output formats, the binary ones are written by RecordWriter.
+FORMATS = ['text', 'csv', 'npy', 'arrow', 'parquet']
+
+def record_dtype(disks=(), N=0):
+    """
+    Get the fields of the binary records for a run.
+
+    The disk and type strings of RECORD_DTYPE are widened to fit the
+    disk names and the RAID types of the largest array size.
+
+    @param disks  The disk names.
+    @param N      The largest array size, the types of the schemes with
+                  a param grow with it.
+    @returns the fields like RECORD_DTYPE.
+    """
+    width = {'disk': max([len(x) for x in disks] + [64]),
+             'type': max([len(scheme_name(x, max(N,1))) for x in SCHEMES] + [32])}
+    return [(k, '<U%d' % (width[k])) if k in width else (k, t) for (k, t) in RECORD_DTYPE]
+
+def row_records(rows, mtbf, mttr, size, disk='', dtype=RECORD_DTYPE):
+    """
+    Convert report rows to a NumPy structured array.
+
+    The values keep their full precision, the AFR and DC % are
+    percentages like in the rows.
+
+    @param rows   The list of Row records.
+    @param mtbf   The mean time between failures in hours.
+    @param mttr   The mean time to repair in hours.
+    @param size   The disk size in TB.
+    @param disk   The disk name.
+    @param dtype  The fields of the records, see record_dtype().
+    @returns the array of records.
+    @raises ValueError if the disk name or a RAID type does not fit in
+            its field.
+    """
+    a = numpy.zeros(len(rows), dtype)
+    for (k, name, x) in [('disk', 'disk name', disk),
+                         ('type', 'RAID type', max([x.type for x in rows] or [''], key=len))]:
+        # The characters of a unicode field take 4 bytes.
+        width = a.dtype[k].itemsize // 4
+        if len(x) > width:
+            raise ValueError('the %s is longer than the %d characters of the records: %s' %
+                             (name, width, x))
+    a['disk'] = disk
+    a['mtbf'] = mtbf
+    a['mttr'] = mttr
+    a['size'] = size
+    if not rows:
+        return a
+    for (k, col) in zip(Row._fields[:-1], zip(*rows)):
+        a[RECORD_FIELDS.get(k, k)] = col
+    # The fields of the modes are nan when the mode is off.
+    for k in set(a.dtype.names) - set(Row._fields) - set(RECORD_FIELDS.values()):
+        if k not in ['disk', 'mtbf', 'mttr', 'size', 'log_mttdl']:
+            a[k] = [row_value(x, k) for x in rows]
+    with numpy.errstate(divide='ignore'):
+        a['log_mttdl'] = numpy.log(a['mttdl'])
+    for (i, x) in enumerate(rows):
+        if isinstance(x.mttdl, decimal.Decimal):
+            a['log_mttdl'][i] = log_big(x.mttdl)
+    return a
+
+class RecordWriter(object):
+    """
+    Write the report rows of all the reports to a single file as
+    columnar binary records: a NumPy .npy file that can be memory
+    mapped with numpy.load(path, mmap_mode='r'), an Arrow IPC file or
+    a Parquet file. The Arrow formats require pyarrow.
+
+    The rows are converted and written in chunks as they arrive. The
+    .npy header is rewritten with the number of records when the file
+    is closed.
+    """
+    def __init__(self, fmt, path, chunk=1<<16, dtype=RECORD_DTYPE):
+        """
+        @param fmt    The format: 'npy', 'arrow' or 'parquet'.
+        @param path   The output file.
+        @param chunk  The number of rows converted at a time.
+        @param dtype  The fields of the records, see record_dtype().
+        @raises ImportError if pyarrow is needed but not available.
+        """
+        load_numpy('--format %s' % (fmt))
+        self.fmt = fmt
+        self.chunk = chunk
+        self.dtype = dtype
+        self.num = 0
+        self.writer = None
+        if fmt in ['arrow', 'parquet']:
+            import pyarrow
+            if fmt == 'parquet':
+                import pyarrow.parquet
+            self.pa = pyarrow
+            self.schema = pyarrow.schema(
+                [pyarrow.field(k, pyarrow.string() if t[1] == 'U' else pyarrow.from_numpy_dtype(numpy.dtype(t)))
+                 for (k,t) in dtype],
+                metadata={'version': VERSION})
+            self.fp = None
+            self.path = path
+        else:
+            self.fp = open(path, 'wb')
+            self.write_npy_header(1<<62)
+
+    def write_npy_header(self, num):
+        """
+        Write the .npy header for num records at the start of the file.
+
+        The header is padded to the length of the header written for
+        the largest count, so it can be rewritten once the number of
+        records is known.
+
+        @param num  The number of records.
+        """
+        header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % \
+                 (numpy.lib.format.dtype_to_descr(numpy.dtype(self.dtype)), num)
+        if num == 1<<62:
+            # Keep the data 64 byte aligned, after the 10 bytes of the
+            # magic and the length and the newline of the header.
+            self.header_len = (len(header) + 11 + 63) // 64 * 64 - 10
+        self.fp.seek(0)
+        self.fp.write(numpy.lib.format.magic(1, 0))
+        self.fp.write(struct.pack('<H', self.header_len))
+        self.fp.write((header.ljust(self.header_len-1) + '\n').encode('latin1'))
+
+    def write(self, rows, mtbf, mttr, size, C, disk=''):
+        """
+        Write the rows of one report.
+
+        @param rows  The Row records, any iterable.
+        @param mtbf  The mean time between failures in hours.
+        @param mttr  The mean time to repair in hours.
+        @param size  The disk size in TB.
+        @param C     The JBOD capacity, it is a column of the rows.
+        @param disk  The disk name.
+        """
+        rows = iter(rows)
+        while True:
+            block = list(itertools.islice(rows, self.chunk))
+            if not block:
+                break
+            a = row_records(block, mtbf, mttr, size, disk, self.dtype)
+            self.num += len(a)
+            if self.fp is not None:
+                a.tofile(self.fp)
+                continue
+            pa = self.pa
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(numpy.ascontiguousarray(a[k])) for (k,t) in self.dtype],
+                schema=self.schema)
+            if self.writer is None:
+                if self.fmt == 'arrow':
+                    self.writer = pa.ipc.new_file(self.path, self.schema)
+                else:
+                    self.writer = pa.parquet.ParquetWriter(self.path, self.schema)
+            if self.fmt == 'arrow':
+                self.writer.write_batch(batch)
+            else:
+                self.writer.write_table(pa.Table.from_batches([batch]))
+
+    def close(self):
+        """
+        Finish the file.
+        """
+        if self.fp is not None:
+            self.write_npy_header(self.num)
+            self.fp.close()
+            self.fp = None
+            return
+        if self.writer is None:
+            # No rows, write the schema only.
+            if self.fmt == 'arrow':
+                self.writer = self.pa.ipc.new_file(self.path, self.schema)
+            else:
+                self.writer = self.pa.parquet.ParquetWriter(self.path, self.schema)
+        self.writer.close()
+        self.writer = None
+
+def sweep_grid(Ns):
+    """
+    Build the (N, RAID type) grid of sweep(), the arrays of raid_types()
+    for all of the array sizes. Every value of a Scheme is evaluated
+    once for all of them.
+
+    @param Ns  The array sizes.
+    @returns the (N, scheme index, fault tolerance, minimum N, read
+             amplification, data efficiency, failure group width,
+             number of failure groups, rebuild spread) tuple of
+             arrays, ordered by N then RAID type. The unsupported
+             parity levels are included, the schemes that cannot be
+             built from N disks are not.
+    """
+    Ns = numpy.array(sorted(Ns), dtype=numpy.int64)
+    values = []
+    for x in SCHEMES:
+        (width, groups) = scheme_layout(x, Ns)
+        values.append([numpy.broadcast_to(scheme_value(v, Ns), Ns.shape)
+                       for v in (x.ft, x.min, x.amp, x.eff, width, groups, x.spread)])
+    N = numpy.repeat(Ns, len(SCHEMES))
+    t = numpy.tile(numpy.arange(len(SCHEMES)), len(Ns))
+    (p, pm, pa, pe, w, g, sp) = (numpy.column_stack([v[k] for v in values]).ravel() for k in range(7))
+    keep = w*g == N
+    return tuple(x[keep] for x in (N, t, p, pm, pa, pe, w, g, sp))
+
+def sweep_types(N, t):
+    """
+    Get the RAID type names of the sweep grid.
+
+    @param N  The array sizes.
+    @param t  The indexes in SCHEMES.
+    @returns the list of names.
+    """
+    types = [SCHEMES[x].name for x in t.tolist()]
+    for (i, x) in enumerate(SCHEMES):
+        if x.param is not None:
+            j = numpy.flatnonzero(t == i)
+            for (k, v) in zip(j.tolist(), scheme_value(x.param, N[j]).tolist()):
+                types[k] = x.name % (v)
+    return types
+
+def type_mask(filters, N, t):
+    """
+    Apply the RAID type filters to the sweep grid. The filters are
+    matched once per scheme, and once per N for the schemes whose
+    name depends on N.
+
+    @param filters  The TypeFilter.
+    @param N        The array sizes.
+    @param t        The indexes in SCHEMES.
+    @returns the boolean array of the rows to keep.
+    """
+    mask = numpy.array([x.param is None and filters(x.name) for x in SCHEMES], dtype=bool)[t]
+    for (i, x) in enumerate(SCHEMES):
+        if x.param is not None:
+            j = numpy.flatnonzero(t == i)
+            mask[j] = [filters(x.name % (v)) for v in scheme_value(x.param, N[j]).tolist()]
+    return mask
+
+def falling_factorial(N, p):
+    """
+    Compute N*(N-1)*...*(N-p) as floats, one term at a time, and its
+    log from the log factorial table.
+
+    @param N  The array sizes.
+    @param p  The fault tolerances.
+    @returns the (products, logs) tuple of arrays. The product is inf
+             after 171 terms, when it overflows.
+    """
+    Nf = N.astype(numpy.float64)
+    d2 = numpy.ones(len(N))
+    with numpy.errstate(over='ignore'):
+        for j in range(min(int(p.max())+1, 172) if len(p) else 0):
+            live = p >= j
+            d2[live] *= Nf[live] - j
+    d2[p >= 172] = numpy.inf
+    lf = log_factorial(int(N.max()) if len(N) else 0, True)
+    return (d2, lf[N] - lf[N-p-1])
+
+def power_table(x, n):
+    """
+    Compute x^k for k = 0..n. The grid has a few fault tolerances per
+    array size, so looking the powers up is cheaper than computing
+    one for every row.
+
+    @param x  The base.
+    @param n  The largest power.
+    @returns the array of powers. The ones that certainly overflow
+             are inf without being computed.
+    """
+    k = n+1
+    if x > 1:
+        k = min(k, int(LOG_FLOAT_MAX/math.log(x)) + 2)
+    t = numpy.full(n+1, numpy.inf)
+    t[:k] = numpy.power(x, numpy.arange(k, dtype=numpy.float64))
+    return t
+
+def sweep_mttdl(N, p, mtbf, mttr, ure, size, markov=None, rebuild=None, falling=None, groups=None, amp=None):
+    """
+    Compute the MTTDL columns of the sweep grid.
+
+    @param N        The array sizes, or the failure group widths.
+    @param p        The fault tolerances.
+    @param mtbf     The mean time between failures in hours.
+    @param mttr     The MTTR of rebuild_mttr(), a number or an array.
+    @param ure      The URE probabilities of rebuild_ure().
+    @param size     The disk size in TB.
+    @param markov   The Markov model parameters, see markov_mttdl().
+                    The default is the closed form formula.
+    @param rebuild  The rebuild model, see rebuild_mttr().
+    @param falling  The falling_factorial() of N and p, if it is
+                    known.
+    @param groups   The numbers of failure groups, see closed_mttdl().
+    @param amp      The read amplifications for the Markov model.
+    @returns the (MTTDL, log of the MTTDL, MTTDL in years, AFR) tuple of
+             arrays. An MTTDL out of the float range is inf or 0, its
+             log is finite.
+    """
+    exact = isinstance(mtbf,int) and isinstance(mttr,int)
+    # A single MTTR stays a number, its powers are looked up.
+    hrs = numpy.asarray(mttr, dtype=numpy.float64)
+    Nf = N.astype(numpy.float64)
+    if groups is not None and not (groups != 1).any():
+        groups = None
+    with numpy.errstate(over='ignore', divide='ignore', invalid='ignore'):
+        if markov is not None:
+            mttdl = markov_mttdl(N, p, mtbf, hrs, size, markov, ure, amp)
+            if groups is not None:
+                mttdl /= groups
+        else:
+            # MTTDL = mtbf^(p+1) / (mttr^p * N*(N-1)*...*(N-p)), see
+            # closed_mttdl().
+            top = int(p.max())+1 if len(p) else 0
+            n1 = power_table(float(mtbf), top)[p+1]
+            d1 = power_table(float(hrs), top)[p] if hrs.ndim == 0 else numpy.power(hrs, p)
+            # When the falling factorial overflows the rows are
+            # computed in log space below.
+            (d2, ld2) = falling if falling is not None else falling_factorial(N, p)
+            d = d1*d2
+            mttdl = n1 / d
+            if exact:
+                # Integer division, like the row by row computation.
+                mttdl = numpy.floor(mttdl)
+            lm = (p+1)*numpy.log(float(mtbf)) - p*numpy.log(hrs) - ld2
+            if rebuild is not None and rebuild.get('ure'):
+                # The URE term, see closed_mttdl(). Without parity
+                # there is no rebuild.
+                u = numpy.where(p > 0, ure*float(mtbf)/((Nf-p)*hrs), 0.)
+                mttdl /= 1. + u
+                lm -= numpy.log1p(u)
+            if groups is not None:
+                mttdl /= groups
+                lm -= numpy.log(groups)
+            big = ~(numpy.isfinite(n1) & numpy.isfinite(d))
+            mttdl[big] = numpy.exp(lm[big])
+        mttdl_yrs = mttdl / float(365*24)
+        AFR = 100.*(1./mttdl_yrs)
+        if markov is not None:
+            lm = numpy.log(mttdl)
+    return (mttdl, lm, mttdl_yrs, AFR)
+
+def sweep_jbod(N, C, spares=None):
+    """
+    Compute the JBOD layout columns of the sweep grid.
+
+    @param N       The array sizes.
+    @param C       The JBOD capacity.
+    @param spares  The minimum number of spares. The default is the
+                   disks left over by the arrays or, when there are
+                   none, one array of them.
+    @returns the (B, S, BD) tuple of arrays, see the KEY.
+    """
+    if spares is not None:
+        B = max(C-spares, 0)//N
+        return (B, C-N*B, N*B)
+    m = C % N
+    B = numpy.where(m>0, C//N, C//N - 1)
+    S = numpy.where(m>0, m, N)
+    return (B, S, N*B)
+
+def sweep(Ns, mtbf, mttr, size, C, filters=None, limits=None, markov=None, rebuild=None, search=False):
+    """
+    Compute the report for all of the array sizes in a single
+    vectorized pass.
+
+    The full (N, RAID type) grid is built as NumPy arrays and every
+    column is computed at once. The values are the same as the ones
+    computed by the row by row loop in main(). Rows whose intermediate
+    terms overflow a float get the MTTDL from its log, computed from
+    the log factorial table like closed_mttdl(), and sweep_rows()
+    turns the ones that do not fit in a float into Decimals.
+
+    @param Ns       The array sizes.
+    @param mtbf     The mean time between failures in hours.
+    @param mttr     The mean time to repair in hours.
+    @param size     The disk size in TB.
+    @param C        The JBOD capacity.
+    @param filters  The RAID type patterns to keep or a TypeFilter.
+    @param limits   The structured filters, see within_limits(). They
+                    are applied as a mask before any rows are built.
+    @param markov   The Markov model parameters, see markov_mttdl().
+                    The default is the closed form formula.
+    @param rebuild  The rebuild model, see rebuild_mttr(). The MTTR
+                    and the rebuild I/O are computed for the whole
+                    grid at once.
+    @param search   Drop the rows that are not Pareto optimal, see
+                    pareto_mask(). Some dominated rows may be left.
+    @returns a dictionary of column arrays, keyed by the Row field
+             names plus log_mttdl, the natural log of the MTTDL,
+             ordered by N then RAID type. An MTTDL out of the float
+             range is inf or 0, its log is finite.
+    """
+    load_numpy('the sweep engine')
+    (N, t, p, pm, pa, pe, w, g, sp) = sweep_grid(Ns)
+
+    # Skip the parity levels that are not supported.
+    keep = N >= pm
+    if STATS is not None:
+        STATS.count('candidates', int(keep.sum()))
+        STATS.push('filter')
+    if limits is None:
+        limits = {}
+    if 'min_ft' in limits:
+        keep &= p >= limits['min_ft']
+    filters = type_filter(filters)
+    if len(filters)>0:
+        keep &= type_mask(filters, N, t)
+    if STATS is not None:
+        STATS.pop()
+    (N, t, p, pm, pe, pa, w, g, sp) = (x[keep] for x in (N, t, p, pm, pe, pa, w, g, sp))
+
+    (B, S, BD) = sweep_jbod(N, C, rebuild and rebuild.get('spares'))
+    (W, X) = spare_wait(S, BD, mtbf, rebuild)
+    (hrs, RIO) = rebuild_mttr(mttr, size, pa, rebuild, sp)
+    if rebuild is not None and 'lead' in rebuild:
+        hrs = hrs + W
+    URE = rebuild_ure(size, pa, rebuild)
+    (mttdl, lm, mttdl_yrs, AFR) = sweep_mttdl(w, p, mtbf, hrs, URE, size, markov, rebuild, groups=g, amp=pa)
+    hrs = numpy.broadcast_to(numpy.asarray(hrs, dtype=numpy.float64), N.shape)
+
+    DCp = 100.*pe
+    DC = float(size)*N*pe
+    JDC = B.astype(numpy.float64)*DC
+
+    if limits:
+        with numpy.errstate(invalid='ignore'):
+            # The MTTDL of the rows that overflow is larger than any
+            # float limit, so inf compares correctly.
+            keep = within_limits(limits, p, mttdl_yrs, AFR, JDC)
+        (N, t, p, pm, mttdl, lm, mttdl_yrs, AFR, DCp, DC, B, S, BD, JDC, hrs, RIO, URE, W, X) = \
+            (x[keep] for x in (N, t, p, pm, mttdl, lm, mttdl_yrs, AFR, DCp, DC, B, S, BD, JDC, hrs, RIO, URE, W, X))
+
+    if search:
+        if STATS is not None:
+            STATS.push('search')
+        keep = pareto_mask(JDC, mttdl_yrs, S)
+        if STATS is not None:
+            STATS.count('rows', len(keep) - int(keep.sum()))
+        (N, t, p, pm, mttdl, lm, mttdl_yrs, AFR, DCp, DC, B, S, BD, JDC, hrs, RIO, URE, W, X) = \
+            (x[keep] for x in (N, t, p, pm, mttdl, lm, mttdl_yrs, AFR, DCp, DC, B, S, BD, JDC, hrs, RIO, URE, W, X))
+        if STATS is not None:
+            STATS.pop()
+
+    ptype = sweep_types(N, t)
+    return {'n': N, 'p': p, 'mttdl': mttdl, 'mttdl_yrs': mttdl_yrs,
+            'afr': AFR, 'ft': p, 'dcp': DCp, 'dc': DC, 'min': pm,
+            'c': numpy.repeat(C, len(N)), 'bd': BD, 'b': B, 's': S,
+            'jdc': JDC, 'type': ptype, 'mttr': hrs, 'rio': RIO, 'ure': URE, 'wait': W, 'exh': X,
+            'log_mttdl': lm}
+
+def sweep_rows(cols):
+    """
+    Convert the columns computed by sweep() to Row records.
+
+    @param cols  The column dictionary.
+    @returns the list of Row records.
+    """
+    data = [cols[k] if k == 'type' else cols[k].tolist() for k in Row._fields if k in cols]
+    rows = [Row(*x) for x in zip(*data)]
+    # Use Decimal numbers for the MTTDL that do not fit in a float.
+    lm = cols['log_mttdl']
+    for i in numpy.flatnonzero(numpy.isfinite(lm) & ~((lm > -LOG_FLOAT_MAX) & (lm < LOG_FLOAT_MAX))):
+        mttdl = exp_mttdl(float(cols['log_mttdl'][i]))
+        (mttdl_yrs, AFR) = mttdl_columns(mttdl)
+        rows[i] = rows[i]._replace(mttdl=mttdl, mttdl_yrs=mttdl_yrs, afr=AFR)
+    return rows
+
+def take_cols(cols, i):
+    """
+    Select rows of the columns computed by sweep().
+
+    @param cols  The column dictionary.
+    @param i     The array of the row indexes.
+    @returns the column dictionary of the rows.
+    """
+    result = dict((k, v[i]) for (k, v) in cols.items() if k != 'type')
+    result['type'] = [cols['type'][x] for x in i.tolist()]
+    return result
+
+def iter_rows(Ns, mtbf=750000, mttr=24, size=2.0, C=24, filters=None, limits=None, markov=None, rebuild=None, engine='loop', cache=None, search=False, chunk=4096):
+    """
+    Generate the report rows for all of the array sizes.
+
+    The rows are computed as they are consumed. The sweep engine
+    works on blocks of array sizes so memory use stays bounded.
+
+    @param Ns       The array sizes: numbers and ascending ranges,
+                    see iter_sorted().
+    @param mtbf     The mean time between failures in hours.
+    @param mttr     The mean time to repair in hours.
+    @param size     The disk size in TB.
+    @param C        The JBOD capacity.
+    @param filters  The patterns of the RAID types to keep.
+    @param limits   The structured filters, see within_limits().
+    @param markov   The Markov model parameters, see markov_mttdl().
+    @param rebuild  The rebuild model, see rebuild_mttr().
+    @param engine   The computation engine: 'loop' or 'sweep'.
+    @param cache    The RowCache for the loop engine, if any. The sweep
+                    engine is faster than a cache lookup.
+    @param search   Only generate the Pareto optimal rows, see
+                    pareto(). The sweep engine prunes each block on its
+                    columns first.
+    @param chunk    The number of array sizes in each sweep block.
+    @returns a generator of Row records ordered by N.
+    """
+    it = iter_sorted(Ns)
+    filters = type_filter(filters)
+    if engine == 'sweep':
+        def blocks():
+            while True:
+                block = list(itertools.islice(it, chunk))
+                if not block:
+                    break
+                for row in sweep_rows(sweep(block, mtbf, mttr, size, C, filters, limits, markov, rebuild, search)):
+                    yield row
+        rows = blocks()
+    else:
+        rows = (row for N in it
+                for row in raid_rows(N, mtbf, mttr, size, C, filters=filters, limits=limits, markov=markov, cache=cache, rebuild=rebuild))
+    if search:
+        # The rows are counted before the search, the ones it drops
+        # are not filtered.
+        if STATS is not None:
+            rows = STATS.timed(rows)
+        with phase('search'):
+            rows = pareto(rows)
+    for row in rows:
+        yield row
+
+def serial_repairs(s, e, hours, spare=None):
+    """
+    Delay the repairs of simulated arrays that repair one disk at a
+    time, like the closed form and Markov models.
+
+    The failed disks of an array are repaired in the order they fail,
+    the kth repair is done at max(s[k] + w[k], done[k-1]) + x[k] where
+    x[k] is its own repair time and w[k] its wait for a spare, 0
+    without a spare pool. A repair that waits delays the later failures
+    of its slot by as much, which can delay other repairs in turn, so
+    the delays are found again until they no longer change. Each pass
+    settles at least the next failure in time order. The failures
+    that are pushed past the mission are dropped.
+
+    @param s      The failure times, an (array, slot, failure) array
+                  with inf after the mission.
+    @param e      The times the repairs would be done if they all
+                  started right away, an array like s.
+    @param hours  The mission time in hours.
+    @param spare  The waits for a spare, an array like s, see
+                  spare_delays(). None for no waits.
+    @returns the (failure times, repair done times) tuple of arrays
+             like s.
+    """
+    (A, N, R) = s.shape
+    if spare is None:
+        spare = numpy.zeros(s.shape)
+    with numpy.errstate(invalid='ignore'):
+        x = e - s
+    x[~numpy.isfinite(s)] = 0.
+    shift = numpy.zeros(s.shape)
+    t = numpy.empty(s.shape)
+    done = numpy.empty(s.shape)
+    # The arrays are independent, only the ones whose delays changed
+    # are done again.
+    rows = numpy.arange(A)
+    while len(rows):
+        tr = s[rows] + shift[rows]
+        tr[tr >= hours] = numpy.inf
+        order = numpy.argsort(tr.reshape(len(rows), -1), axis=1, kind='mergesort')
+        ts = numpy.take_along_axis(tr.reshape(len(rows), -1), order, axis=1)
+        xs = numpy.take_along_axis(x[rows].reshape(len(rows), -1), order, axis=1)
+        ws = numpy.take_along_axis(spare[rows].reshape(len(rows), -1), order, axis=1)
+        ends = numpy.empty(ts.shape)
+        ends.fill(numpy.inf)
+        last = numpy.zeros(len(rows))
+        for k in range(int(numpy.isfinite(ts).sum(axis=1).max())):
+            last = numpy.maximum(ts[:, k] + ws[:, k], last) + xs[:, k]
+            ends[:, k] = last
+        dr = numpy.empty(ts.shape)
+        numpy.put_along_axis(dr, order, ends, axis=1)
+        dr = dr.reshape(tr.shape)
+        with numpy.errstate(invalid='ignore'):
+            wait = dr - tr - x[rows]
+        wait[~numpy.isfinite(tr)] = 0.
+        later = numpy.zeros(tr.shape)
+        later[:, :, 1:] = numpy.cumsum(wait, axis=2)[:, :, :-1]
+        t[rows] = tr
+        done[rows] = dr
+        moved = (later != shift[rows]).any(axis=(1,2))
+        shift[rows] = later
+        rows = rows[moved]
+    return (t, done)
+
+def spare_delays(t, S, lead):
+    """
+    Get the waits of the failed disks of simulated JBODs for a hot
+    spare, see spare_wait().
+
+    The failures of a JBOD take the spares of its pool in time order
+    and each one orders a replacement that arrives lead hours later.
+    The kth failure takes one of the S spares or the replacement
+    ordered by the (k-S)th failure, so it waits
+    max(0, t[k-S] + lead - t[k]). Only the JBODs with more than S
+    failures can wait.
+
+    @param t     The failure times, a row for each JBOD, inf for the
+                 failures after the mission.
+    @param S     The number of spares.
+    @param lead  The replacement lead time in hours.
+    @returns the waits in hours, an array like t.
+    """
+    finite = numpy.isfinite(t)
+    if S == 0:
+        return numpy.where(finite, float(lead), 0.)
+    w = numpy.zeros(t.shape)
+    jbods = numpy.flatnonzero(finite.sum(axis=1) > S)
+    if len(jbods) == 0:
+        return w
+    order = numpy.argsort(t[jbods], axis=1, kind='mergesort')
+    ts = numpy.take_along_axis(t[jbods], order, axis=1)
+    ws = numpy.zeros(ts.shape)
+    with numpy.errstate(invalid='ignore'):
+        ws[:, S:] = numpy.maximum(ts[:, :-S] + lead - ts[:, S:], 0.)
+    ws[~numpy.isfinite(ts)] = 0.
+    wj = numpy.zeros(ts.shape)
+    numpy.put_along_axis(wj, order, ws, axis=1)
+    w[jbods] = wj
+    return w
+
+def simulate_batch(job):
+    """
+    Simulate one batch of JBOD missions.
+
+    Every disk slot of the B arrays alternates between working and
+    being repaired, a failed disk is replaced by a new one. The
+    failure and repair intervals are drawn for all of the slots at
+    once until every slot has passed the end of the mission. An array
+    repairs one disk at a time, see serial_repairs(). It loses data
+    when more than p of its disks are down at the same time, which is
+    found by sorting the start (+1) and end (-1) events of the repairs
+    of each array and taking the running sum.
+
+    With a lead time the S spares of each JBOD are a pool shared by
+    its arrays, see spare_delays(), and a repair cannot start before
+    the spare of the failed disk is there. The waits are found from
+    the failure times before the repairs delay them.
+
+    This is a module level function so that it can be sent to the
+    worker processes. The random numbers only depend on the seed and
+    the batch index so the results do not depend on the number of
+    processes.
+
+    @param job  The (N, p, B, mtbf, mttr, hours, trials, shape, seed,
+                index, S, lead) tuple. The failures are exponential
+                when the Weibull shape is 1. The lead time is None
+                without a spare pool.
+    @returns the number of trials that lost data.
+    """
+    (N, p, B, mtbf, mttr, hours, trials, shape, seed, index, S, lead) = job
+    load_numpy('the simulator')
+    rs = numpy.random.RandomState([seed, index])
+    M = trials*B
+    slots = M*N
+    if shape == 1:
+        scale = float(mtbf)
+    else:
+        # Keep the mean time between failures.
+        scale = mtbf/math.gamma(1.+1./shape)
+
+    t = numpy.zeros(slots)
+    starts = []
+    ends = []
+    live = numpy.arange(slots)
+    while len(live):
+        if shape == 1:
+            t[live] += rs.exponential(scale, len(live))
+        else:
+            t[live] += scale*rs.weibull(shape, len(live))
+        live = live[t[live] < hours]
+        if len(live) == 0:
+            break
+        s = numpy.empty(slots)
+        s.fill(numpy.inf)
+        s[live] = t[live]
+        t[live] += rs.exponential(mttr, len(live))
+        e = numpy.empty(slots)
+        e.fill(numpy.inf)
+        e[live] = t[live]
+        starts.append(s)
+        ends.append(e)
+    if not starts:
+        return 0
+
+    # The slots are ordered by array so each row is one array. Only
+    # the arrays with more than p failures can lose data, usually very
+    # few, so only they are sorted.
+    s = numpy.column_stack(starts)
+    spare = None
+    if lead is not None:
+        # The arrays of a trial are the rows of one JBOD.
+        spare = spare_delays(s.reshape(trials, -1), S, lead).reshape(M, N, -1)
+    s = s.reshape(M, N, -1)
+    arrays = numpy.flatnonzero(numpy.isfinite(s).sum(axis=(1,2)) > p)
+    if len(arrays) == 0:
+        return 0
+    e = numpy.column_stack(ends).reshape(M, N, -1)[arrays]
+    (s, e) = serial_repairs(s[arrays], e, hours, None if spare is None else spare[arrays])
+    s = s.reshape(len(arrays), -1)
+    e = e.reshape(len(arrays), -1)
+    times = numpy.hstack([s, e])
+    delta = numpy.hstack([numpy.ones(s.shape), -numpy.ones(e.shape)])
+    delta[~numpy.isfinite(times)] = 0
+    order = numpy.argsort(times, axis=1, kind='mergesort')
+    down = numpy.cumsum(numpy.take_along_axis(delta, order, axis=1), axis=1)
+    lost = numpy.zeros(M, dtype=bool)
+    lost[arrays] = down.max(axis=1) > p
+    return int(lost.reshape(trials, B).any(axis=1).sum())
+
+def wilson(k, n, z=1.96):
+    """
+    The Wilson score confidence interval of a proportion.
+
+    @param k  The number of successes.
+    @param n  The number of trials.
+    @param z  The normal quantile, 1.96 for 95%.
+    @returns the (low, high) interval.
+    """
+    if n == 0:
+        return (0., 1.)
+    f = float(k)/n
+    d = 1. + z*z/n
+    c = (f + z*z/(2.*n))/d
+    h = z*math.sqrt(f*(1.-f)/n + z*z/(4.*n*n))/d
+    return (max(0., c-h), min(1., c+h))
+
+def simulate(row, mtbf, mttr, mission, trials=100000, shape=1., seed=0, pool=None, batch=10000, lead=None):
+    """
+    Estimate the probability that a JBOD loses data during the
+    mission by Monte Carlo simulation.
+
+    @param row      The Row record that describes the JBOD layout.
+    @param mtbf     The mean time between failures in hours.
+    @param mttr     The mean time to repair in hours.
+    @param mission  The mission time in years.
+    @param trials   The number of simulated JBODs.
+    @param shape    The Weibull shape of the failure times, 1 for
+                    exponential failures.
+    @param seed     The random seed.
+    @param pool     The process pool for the batches, if any.
+    @param batch    The number of trials in each batch.
+    @param lead     The replacement lead time in hours of the pool of
+                    the S spares of the row, None for no pool. The
+                    MTTR does not include the wait for a spare then,
+                    it is simulated.
+    @returns the (probability, low, high) tuple with the 95%
+             confidence interval.
+    """
+    load_numpy('the simulator')
+    if row.b <= 0:
+        return (0., 0., 0.)
+    hours = mission*365.*24.
+    # Each failure group is simulated as an array.
+    (width, groups) = find_scheme(row.n, row.type)
+    jobs = []
+    for i in range((trials+batch-1)//batch):
+        n = min(batch, trials-i*batch)
+        jobs.append((width, row.p, row.b*groups, mtbf, mttr, hours, n, shape, seed, i, row.s, lead))
+    if pool is not None:
+        k = sum(pool.map(simulate_batch, jobs))
+    else:
+        k = sum(simulate_batch(x) for x in jobs)
+    lo,hi = wilson(k, trials)
+    return (float(k)/trials, lo, hi)
+
+SIM_HEADER = ['                  Data Loss Probability',
+              'N  P  B  S  MTTDL (yrs) Analytic  Simulated 95% CI                Types',
+              '== == == == =========== ========= ========= ===================== ============']
+
+SIM_CSV_HEADER = ',,N,Parity,B,S,MTTDL (yrs),Analytic,Simulated,CI Low,CI High,Types'
+
+def write_simulation(rows, fmt='text', disk='', mtbf=750000, mttr=24, size=2.0, C=24,
+                     mission=5., trials=100000, shape=1., seed=0, pool=None,
+                     print_title=True, print_header=True, out=None, rebuild=None):
+    """
+    Simulate the rows and write the report that compares the analytic
+    and the simulated probability of data loss during the mission.
+
+    The analytic probability is 1-exp(-B*T/MTTDL) for B arrays and a
+    mission time T. The repairs are simulated with the MTTR of each
+    row, which depends on the RAID type with a rebuild model. With a
+    lead time the spare pool is simulated instead of adding the
+    expected wait to the MTTR.
+
+    @param rows     The Row records.
+    @param mission  The mission time in years.
+    @param trials   The number of simulated JBODs for each row.
+    @param shape    The Weibull shape of the failure times.
+    @param seed     The random seed.
+    @param pool     The process pool, if any.
+    The other parameters are the same as write_report().
+    """
+    out = ChunkWriter(out or sys.stdout)
+    hdr_width = max(len(h) for h in SIM_HEADER)
+    if shape == 1:
+        dist = 'exponential'
+    else:
+        dist = 'Weibull (shape %g)' % (shape)
+    if fmt == 'text':
+        if print_title:
+            write_title(out, hdr_width, 'Monte Carlo Data Loss Report',
+                        disk, mtbf, mttr, size, C,
+                        rebuild_title(rebuild) +
+                        ['Mission: %g years' % (mission),
+                         'Trials: %s, %s failures' % (commaize(trials), dist)])
+        if print_header:
+            out.write('\n')
+            for h in SIM_HEADER:
+                out.write(h+'\n')
+    elif fmt == 'csv':
+        write_csv_params(out, disk, mtbf, mttr, size, rebuild)
+        out.write(SIM_CSV_HEADER+'\n')
+
+    hours = mission*365.*24.
+    lead = rebuild.get('lead') if rebuild is not None else None
+    for row in rows:
+        if row.b > 0:
+            analytic = -math.expm1(-row.b*hours/float(row.mttdl))
+        else:
+            analytic = 0.
+        with phase('simulate'):
+            if lead is None:
+                (prob, lo, hi) = simulate(row, mtbf, row.mttr, mission, trials, shape, seed, pool)
+            else:
+                (prob, lo, hi) = simulate(row, mtbf, row.mttr-row.wait, mission, trials, shape, seed, pool,
+                                          lead=lead)
+        if fmt == 'text':
+            out.write('%2d %2d %2d %2d %11.3g %9.3g %9.3g [%9.3g,%9.3g] %s\n' % (row.n, row.p, row.b, row.s, row.mttdl_yrs, analytic, prob, lo, hi, row.type))
+        else:
+            out.write(',,%d,%d,%d,%d,%.6g,%.6g,%.6g,%.6g,%.6g,%s\n' % (row.n, row.p, row.b, row.s, row.mttdl_yrs, analytic, prob, lo, hi, row.type))
+        out.flush()
+    out.write('\n')
+    out.flush()
+
+def dominates(a, b):
+    """
+    Check whether one row dominates another: it is at least as good
+    in JBOD data capacity, MTTDL and spares and better in one of them.
+
+    @param a  The first Row.
+    @param b  The second Row.
+    @returns True if a dominates b.
+    """
+    return (a.jdc >= b.jdc and a.mttdl_yrs >= b.mttdl_yrs and a.s >= b.s and
+            (a.jdc > b.jdc or a.mttdl_yrs > b.mttdl_yrs or a.s > b.s))
+
+def pareto_mask(jdc, mttdl_yrs, s):
+    """
+    Find the rows of the sweep() columns that another row dominates
+    with a longer MTTDL.
+
+    This is the vectorized first pass of the Pareto search, it drops
+    most of the grid before any Row is built. It is conservative: the
+    rows that are only dominated by a row with the same MTTDL, and the
+    rows whose MTTDL is out of the float range, are left to pareto().
+    For each spare count, the rows with at least as many spares are
+    sorted by JDC and a running maximum of their MTTDL is searched.
+
+    @param jdc        The JBOD data capacities.
+    @param mttdl_yrs  The MTTDL in years, inf or 0 out of the float
+                      range.
+    @param s          The spare counts.
+    @returns the boolean array of the rows to keep.
+    """
+    keep = numpy.ones(len(jdc), dtype=bool)
+    for v in numpy.unique(s):
+        q = s >= v
+        order = numpy.argsort(-jdc[q], kind='stable')
+        cjdc = -jdc[q][order]
+        best = numpy.fmax.accumulate(mttdl_yrs[q][order])
+        r = s == v
+        # The number of rows with at least the same JDC.
+        k = numpy.searchsorted(cjdc, -jdc[r], side='right')
+        keep[r] = ~((k > 0) & (best[numpy.maximum(k-1, 0)] > mttdl_yrs[r]))
+    return keep
+
+def pareto(rows, key=None):
+    """
+    Find the Pareto optimal rows for capacity (JDC), reliability
+    (MTTDL) and spare count (S).
+
+    The rows are consumed in a single pass. Each row is checked against
+    the current frontier and dropped as soon as a frontier row
+    dominates it so only the frontier is kept in memory, and rows that
+    it dominates are removed when it is added. Use the structured
+    filters, for example a minimum MTTDL, to constrain the search.
+
+    @param rows  The Row records, any iterable.
+    @param key   The function that gets the Row of an item, when the
+                 items are not Row records.
+    @returns the list of Pareto optimal Row records, or items, in their
+             original order.
+    """
+    if key is None:
+        key = lambda x: x
+    frontier = []
+    for i,row in enumerate(rows):
+        dominated = False
+        for (j,f) in frontier:
+            if dominates(key(f), key(row)):
+                dominated = True
+                break
+        if dominated:
+            continue
+        frontier = [(j,f) for (j,f) in frontier if not dominates(key(row), key(f))]
+        frontier.append((i,row))
+    return [f for (j,f) in frontier]
+
+def pareto_cases(results):
+    """
+    Find the Pareto optimal rows across the parameter combinations,
+    for example the JBOD capacities and the disk models of a catalog.
+
+    @param results  The (i, (params, rows)) tuples of the enumerated
+                    evaluate_cases().
+    @returns the list of the (i, (params, rows)) tuples of the
+             combinations that have rows on the frontier, with only
+             those rows. When none have, the last combination without
+             rows.
+    """
+    results = [(i, (x, list(rows))) for (i, (x, rows)) in results]
+    tagged = [(i, row) for (i, (x, rows)) in results for row in rows]
+    frontier = pareto(tagged, key=lambda x: x[1])
+    found = [(i, (x, [row for (j, row) in frontier if j == i])) for (i, (x, rows)) in results]
+    found = [x for x in found if x[1][1]]
+    if not found and results:
+        (i, (x, rows)) = results[-1]
+        found = [(i, (x, []))]
+    return found
+
+def domain_loss(N, p, d, mtbf, hours):
+    """
+    Get the probability that an array loses data when a failure
+    domain, a JBOD or a rack, that holds d of its disks fails.
+
+    The array loses data right away when d is more than its fault
+    tolerance p. Otherwise it loses data when p-d+1 of its other N-d
+    disks fail before the domain is repaired. That is the first term
+    of the binomial tail, computed in log space.
+
+    @param N      The number of disks in the array.
+    @param p      The fault tolerance.
+    @param d      The number of disks of the array in the domain.
+    @param mtbf   The mean time between failures of the disks in hours.
+    @param hours  The time to repair the domain in hours.
+    @returns the probability.
+    """
+    if d > p:
+        return 1.
+    m = p-d+1
+    lf = log_factorial(N-d)
+    lq = lf[N-d] - lf[m] - lf[N-d-m] + m*math.log(-math.expm1(-float(hours)/mtbf))
+    return math.exp(min(lq, 0.))
+
+def fleet_rows(rows, mtbf, fleet):
+    """
+    Aggregate the rows of one JBOD to a fleet of JBODs.
+
+    The fleet is a hierarchy of disks, arrays, JBODs, racks and the
+    fleet. Each JBOD holds disks of B*span arrays because every array
+    spans span JBODs with an even share of its disks in each one. The
+    racks are filled in order, so an array spans the racks of its
+    JBODs. A JBOD or a rack failure is a correlated failure of all of
+    the disks in it, see domain_loss().
+
+    The data loss events of the fleet are the independent losses of
+    its jbods*B arrays, plus the JBOD and rack failures that lose the
+    data of at least one of their arrays. A domain failure that loses
+    several arrays is a single event.
+
+    Only the values of the rows are used, so the rows can come from
+    the cache or the sweep engine and the cost does not depend on the
+    size of the fleet.
+
+    @param rows   The Row records.
+    @param mtbf   The mean time between failures of the disks in hours.
+    @param fleet  The fleet model: jbods, the number of JBODs, rack,
+                  the JBODs per rack, span, the JBODs spanned by each
+                  array, jbod_mtbf and rack_mtbf, the MTBF of a JBOD
+                  and of a rack in hours (0 for none), and
+                  domain_mttr, the time to repair them.
+    @returns a generator of the rows with the fleet fields: fdc, the
+             fleet data capacity in TB, fmttdl, the fleet MTTDL in
+             years, and fdle, the data loss events per year.
+    """
+    J = fleet['jbods']
+    R = fleet.get('rack', 0)
+    hours = fleet.get('domain_mttr', 24.)
+    for row in rows:
+        A = J*row.b
+        rate = A/float(row.mttdl) if A > 0 else 0.   # per hour
+        k = min(fleet.get('span', 1), row.n)
+        # The (domains, MTBF, domains spanned by an array, arrays in a
+        # domain) of the JBODs and the racks.
+        levels = [(J, fleet.get('jbod_mtbf', 0), k, row.b*k)]
+        if R > 0:
+            kr = -(-k//R)
+            levels.append((-(-J//R), fleet.get('rack_mtbf', 0), kr, R*row.b*kr))
+        for (domains, dmtbf, spans, arrays) in levels:
+            if dmtbf > 0 and A > 0:
+                q = domain_loss(row.n, row.p, -(-row.n//spans), mtbf, hours)
+                if q < 1:
+                    # At least one of the arrays of the domain is lost.
+                    q = -math.expm1(min(arrays, A)*math.log1p(-q))
+                rate += domains*q/float(dmtbf)
+        rate *= 365*24
+        yield add_fields(row, fdc=J*row.jdc, fdle=rate,
+                         fmttdl=1./rate if rate > 0 else float('inf'))
+
+def init_worker(schemes, stats):
+    """
+    Set up a worker process of the pool.
+
+    The worker only inherits the scheme registry and the --stats
+    instrumentation of the parent with the fork start method, with
+    spawn and forkserver the module is imported again, so the schemes
+    of --scheme are registered and --stats is set up again.
+
+    @param schemes  The specifications of the schemes that were
+                    registered after the built-in ones.
+    @param stats    True if --stats is on.
+    """
+    global STATS
+    del SCHEMES[BUILTIN_SCHEMES:]
+    RAID_TYPES.clear()
+    for x in schemes:
+        register_scheme(parse_scheme(x))
+    STATS = Stats(time.time()) if stats else None
+
+def worker_pool(jobs):
+    """
+    @param jobs  The number of worker processes.
+    @returns a process pool whose workers are set up by init_worker().
+    """
+    import multiprocessing
+    schemes = [x.name for x in SCHEMES[BUILTIN_SCHEMES:]]
+    return multiprocessing.Pool(jobs, initializer=init_worker, initargs=(schemes, STATS is not None))
+
+# The CSV parameters of an uncertainty model: (name, key).
+SENSITIVITY_PARAMS = [('Draws', 'draws'), ('MTBF SD', 'mtbf_sd'), ('MTTR SD', 'mttr_sd'),
+                      ('Size SD', 'size_sd')]
+
+def sensitivity_rows(rows, mtbf, mttr, size, rebuild=None, sens=None, chunk=1<<22):
+    """
+    Add the sensitivity fields to the rows of a JBOD.
+
+    The closed form MTTDL is a product of powers, so its elasticities,
+    the percent changes of the MTTDL for a 1% change of an input, are
+    analytic. They are p+1 for the MTBF and -p for the effective MTTR,
+    the MTTR plus the rebuild time, less the share u/(1+u) of the URE
+    term. The URE term grows with the MTBF and with the disk size and
+    shrinks with the effective MTTR. The rebuild time grows with the
+    disk size. The JDC is proportional to the disk size and does not
+    depend on the MTBF or the MTTR.
+
+    The uncertainty draws the MTBF, the MTTR and the disk size from
+    lognormal distributions whose medians are the values of the
+    report. The same draws are used for all of the rows. The log of
+    the MTTDL of a draw is the log of the MTTDL of the row plus the
+    changes of its terms, so a block of rows is computed for all of
+    the draws at once as NumPy arrays.
+
+    @param rows     The Row records.
+    @param mtbf     The mean time between failures in hours.
+    @param mttr     The mean time to repair in hours.
+    @param size     The disk size in TB.
+    @param rebuild  The rebuild model, see rebuild_mttr().
+    @param sens     The sensitivity model: elasticity, True to compute
+                    the elasticities, draws, the number of draws of
+                    the uncertainty (0 for none), mtbf_sd, mttr_sd and
+                    size_sd, the standard deviations of the logs of
+                    the inputs, and seed, the random seed.
+    @param chunk    The maximum number of rows times draws in a block.
+    @returns a generator of the rows with the sensitivity fields: eb,
+             er and es, the elasticities of the MTTDL to the MTBF, the
+             MTTR and the disk size, and q05, q50 and q95, the 5th,
+             50th and 95th percentiles of the MTTDL in years.
+    """
+    draws = sens.get('draws', 0)
+    if draws:
+        rng = numpy.random.default_rng(sens.get('seed', 0))
+        Z = rng.standard_normal((3, draws))
+        (lb, lr, ls) = (Z[0]*sens.get('mtbf_sd', 0.), Z[1]*sens.get('mttr_sd', 0.),
+                        Z[2]*sens.get('size_sd', 0.))
+    rows = iter(rows)
+    while True:
+        block = list(itertools.islice(rows, max(1, chunk//max(draws, 1))))
+        if not block:
+            break
+        # The (failure group width, effective MTTR, rebuild time, URE
+        # term) of each row.
+        terms = []
+        for row in block:
+            (w, g) = find_scheme(row.n, row.type)
+            hrs = float(row.mttr)
+            r = max(hrs - mttr, 0.)
+            # Without parity there is no URE term, see closed_mttdl().
+            u = row.ure*float(mtbf)/(float(w-row.p)*hrs) if row.p and row.ure > 0 else 0.
+            terms.append((w, hrs, r, u))
+        if draws:
+            P = numpy.array([row.p for row in block], dtype=numpy.float64)[:,None]
+            LM = numpy.array([log_big(row.mttdl) if isinstance(row.mttdl, decimal.Decimal) else
+                              math.log(row.mttdl) if row.mttdl > 0 else -float('inf')
+                              for row in block])[:,None]
+            URE = numpy.array([row.ure for row in block])[:,None]
+            (W, HRS, R, U) = (numpy.array(x, dtype=numpy.float64)[:,None] for x in zip(*terms))
+            with numpy.errstate(divide='ignore', over='ignore', invalid='ignore'):
+                hrs = mttr*numpy.exp(lr) + R*numpy.exp(ls)
+                u = numpy.where(P > 0, -numpy.expm1(numpy.exp(ls)*numpy.log1p(-URE))*float(mtbf)*numpy.exp(lb)/((W-P)*hrs), 0.)
+                lm = LM + (P+1)*lb - P*(numpy.log(hrs) - numpy.log(HRS)) - numpy.log1p(u) + numpy.log1p(U)
+                Q = numpy.exp(numpy.percentile(lm, [5, 50, 95], axis=1) - math.log(365*24)).T.tolist()
+        for (i, row) in enumerate(block):
+            fields = {}
+            if sens.get('elasticity'):
+                (w, hrs, r, u) = terms[i]
+                A = u/(1.+u)
+                # The elasticity of the URE to the disk size.
+                eu = -math.log1p(-row.ure)*(1.-row.ure)/row.ure if row.ure > 0 else 0.
+                eh = A - row.p
+                fields.update(eb=row.p+1-A, er=eh*mttr/hrs,
+                              es=eh*r/hrs - A*eu if r > 0 or eu > 0 else 0.)
+            if draws:
+                (fields['q05'], fields['q50'], fields['q95']) = Q[i]
+            yield add_fields(row, **fields)
+
+def sensitivity_title(sens):
+    """
+    Get the title lines of a sensitivity model.
+
+    @param sens  The sensitivity model, if any.
+    @returns the list of title lines.
+    """
+    if sens is None or not sens.get('draws'):
+        return []
+    return ['Uncertainty: %s draws, SD of the logs: MTBF %s, MTTR %s, Size %s' %
+            (commaize(sens['draws']), num2str(sens['mtbf_sd']), num2str(sens['mttr_sd']),
+             num2str(sens['size_sd']))]
+
+# The CSV parameters of a cost model: (name, key).
+COST_PARAMS = [('Disk Price', 'disk_price'), ('Disk Watts', 'disk_watts'),
+               ('Chassis Price', 'chassis_price'), ('kWh Price', 'kwh_price'),
+               ('Loss Cost', 'loss_cost'), ('Years', 'years')]
+
+def divide(a, b):
+    """
+    Divide numbers like NumPy divides arrays.
+
+    @param a  The dividend.
+    @param b  The divisor.
+    @returns a/b, inf when a number is divided by zero and nan for
+             zero divided by zero.
+    """
+    if isinstance(b, (int, float)) and b == 0:
+        return float('nan') if a == 0 else float('inf')
+    return a/b
+
+def cost_values(C, jdc, mttdl_yrs, cost):
+    """
+    Compute the cost columns of a JBOD.
+
+    A JBOD is a chassis and C disks, the spares included. Its energy
+    is the power of the disks over the years of the model, and its
+    expected cost of data loss is the data that it loses per year,
+    JDC/MTTDL, at the cost of a lost TB.
+
+    It works on numbers and on NumPy arrays, so the rows and the
+    optimizer get the same values.
+
+    @param C          The JBOD capacity.
+    @param jdc        The JBOD data capacity in TB.
+    @param mttdl_yrs  The MTTDL in years, a float.
+    @param cost       The cost model: disk_price and chassis_price in
+                      $, disk_watts, kwh_price in $, loss_cost, the
+                      cost of a lost TB in $, and years, the time
+                      the JBOD is used.
+    @returns the (cost per usable TB, watts per usable TB, expected
+             cost of data loss per year, TCO per usable TB) tuple.
+    """
+    capex = cost['chassis_price'] + C*cost['disk_price']
+    watts = C*cost['disk_watts']
+    elc = divide(jdc*cost['loss_cost'], mttdl_yrs)
+    tco = capex + cost['years']*(watts*(365*24/1000.)*cost['kwh_price'] + elc)
+    return (divide(capex, jdc), divide(watts, jdc), elc, divide(tco, jdc))
+
+def cost_rows(rows, cost):
+    """
+    Add the cost fields to the rows of a JBOD.
+
+    @param rows  The Row records.
+    @param cost  The cost model, see cost_values().
+    @returns a generator of the rows with the cost fields: ctb, the
+             cost per usable TB, wtb, the watts per usable TB, elc,
+             the expected cost of data loss per year and tco, the
+             total cost of ownership per usable TB.
+    """
+    for row in rows:
+        (ctb, wtb, elc, tco) = cost_values(row.c, row.jdc, float(row.mttdl_yrs), cost)
+        yield add_fields(row, ctb=ctb, wtb=wtb, elc=elc, tco=tco)
+
+def optimize(Ns, cases, filters=None, limits=None, markov=None, rebuild=None, top=10, chunk=4096):
+    """
+    Find the configurations with the lowest TCO per usable TB that meet
+    the limits, over the grid of array sizes, RAID schemes, disk
+    models and JBOD capacities.
+
+    The cases, one for each disk model and JBOD capacity, are searched
+    in the order of a lower bound of their TCO: all of the disks hold
+    data and no data is lost. The search ends when the bound of the
+    next case is not below the top-th best TCO found, so the cases
+    that cannot win are never computed. Each case is swept in blocks
+    of array sizes: the filters, the limits and the TCO are applied to
+    the column arrays and only the rows that can win become Row
+    records.
+
+    @param Ns       The array sizes: numbers and ascending ranges.
+    @param cases    The list of (disk, mtbf, mttr, size, C, cost)
+                    tuples where cost is the cost model of the case,
+                    see cost_values().
+    @param filters  The patterns of the RAID types to keep.
+    @param limits   The structured filters, see within_limits().
+    @param markov   The Markov model parameters, see markov_mttdl().
+    @param rebuild  The rebuild model, see rebuild_mttr().
+    @param top      The number of configurations to find.
+    @param chunk    The number of array sizes in each sweep block.
+    @returns the (results, searched) tuple: the list of (disk, mtbf,
+             mttr, size, Row) tuples by ascending TCO, the rows with
+             the cost fields, and the number of cases computed.
+    """
+    load_numpy('--optimize')
+    filters = type_filter(filters)
+
+    def bound(case):
+        (disk, mtbf, mttr, size, C, cost) = case
+        return cost_values(C, float(C)*size, float('inf'), cost)[3]
+
+    # The top best, a heap whose first entry is the worst of them: the
+    # highest TCO and, for a tie, the last one found.
+    best = []
+    searched = 0
+    seq = 0
+    for (b, case) in sorted(((bound(x), x) for x in cases), key=lambda x: x[0]):
+        if len(best) >= top and not b < -best[0][0]:
+            break
+        searched += 1
+        (disk, mtbf, mttr, size, C, cost) = case
+        it = iter_sorted(Ns)
+        while True:
+            block = list(itertools.islice(it, chunk))
+            if not block:
+                break
+            cols = sweep(block, mtbf, mttr, size, C, filters, limits, markov, rebuild)
+            with numpy.errstate(divide='ignore', invalid='ignore'):
+                tco = cost_values(cols['c'], cols['jdc'], cols['mttdl_yrs'], cost)[3]
+                # A JBOD without usable capacity has no TCO.
+                keep = numpy.isfinite(tco)
+                if len(best) >= top:
+                    keep &= tco < -best[0][0]
+            i = numpy.flatnonzero(keep)
+            if len(i) > top:
+                i = i[numpy.argsort(tco[i], kind='stable')[:top]]
+            for row in cost_rows(sweep_rows(take_cols(cols, i)), cost):
+                entry = (-row.extra['tco'], -seq, disk, mtbf, mttr, size, row)
+                seq += 1
+                if len(best) < top:
+                    heapq.heappush(best, entry)
+                elif entry[:2] > best[0][:2]:
+                    heapq.heapreplace(best, entry)
+    best.sort(key=lambda x: (-x[0], -x[1]))
+    return ([x[2:] for x in best], searched)
+
+def write_optimum(results, searched, total, fmt='text', print_title=True, print_header=True,
+                  out=None, cost=None):
+    """
+    Write the report of --optimize.
+
+    @param results       The results of optimize().
+    @param searched      The number of cases computed.
+    @param total         The number of cases.
+    @param fmt           The output format: 'text' or 'csv'.
+    @param print_title   Print the title.
+    @param print_header  Print the column headers.
+    @param out           The output stream, the default is stdout.
+    @param cost          The cost model of the command line.
+    """
+    out = ChunkWriter(out or sys.stdout)
+    if fmt == 'csv':
+        if cost is not None:
+            for (name, key) in COST_PARAMS[3:]:
+                out.write('%s,%s\n' % (name, num2str(cost.get(key, 0))))
+        out.write('Searched,%d\nCases,%d\n\n' % (searched, total))
+        out.write(',,Rank,N,Parity,C,B,MTTDL (yrs),JDC,Cost ($/TB),Power (W/TB),ELC ($/yr),TCO ($/TB),Types,Disk,MTBF,MTTR,Size\n')
+        for (i, (disk, mtbf, mttr, size, row)) in enumerate(results):
+            x = row.extra
+            out.write(',,%d,%d,%d,%d,%d,%.6g,%.1f,%.2f,%.3f,%.5g,%.2f,%s,"%s",%d,%s,%.3f\n' %
+                      (i+1, row.n, row.p, row.c, row.b, row.mttdl_yrs, row.jdc, x['ctb'], x['wtb'],
+                       x['elc'], x['tco'], row.type, disk.replace('"', '""'), mtbf, num2str(mttr), size))
+        out.write('\n')
+        out.flush()
+        return
+
+    # The columns: (first header line, second header line, width).
+    tw = max([len(x[-1].type) for x in results] + [5])
+    heads = [('', 'Rank', 4), ('', 'N', 4), ('', 'P', 2), ('', 'C', 3), ('', 'B', 3),
+             ('MTTDL', '(yrs)', 8), ('', 'JDC', 7), ('', '$/TB', 7), ('', 'W/TB', 5),
+             ('ELC', '($/yr)', 8), ('TCO', '($/TB)', 7), ('', 'Types', tw), ('', 'Disk', 12)]
+    header = [' '.join(h[k].ljust(h[2]) for h in heads).rstrip() for k in range(2)]
+    header.append(' '.join('='*h[2] for h in heads))
+    width = max(len(h) for h in header)
+    if print_title:
+        out.write('\n')
+        center(width, 'Minimum TCO Configurations', out)
+        if cost is not None:
+            center(width, cost_title(cost)[1], out)
+        center(width, 'Searched %s of %s disk models and JBOD capacities' % (commaize(searched), commaize(total)), out)
+    if print_header:
+        out.write('\n')
+        for h in header:
+            out.write(h+'\n')
+    for (i, (disk, mtbf, mttr, size, row)) in enumerate(results):
+        x = row.extra
+        out.write(('%4d %4d %2d %3d %3d %8.3g %7.1f %7.1f %5.2f %8.3g %7.1f %-*s %s' %
+                   (i+1, row.n, row.p, row.c, row.b, float(row.mttdl_yrs), row.jdc, x['ctb'],
+                    x['wtb'], x['elc'], x['tco'], tw, row.type,
+                    disk or 'MTBF %s, MTTR %s, %.3fTB' % (commaize(mtbf), num2str(mttr), size))).rstrip()+'\n')
+    out.write('\n')
+    out.flush()
+
+def parse_big(x):
+    """
+    Parse a number of a CSV report, a Decimal if it does not fit in a
+    float.
+
+    @param x  The number.
+    @returns the number.
+    """
+    f = float(x)
+    if math.isinf(f) or (f == 0 and decimal.Decimal(x) != 0):
+        return decimal.Decimal(x)
+    return f
+
+def read_report_rows(path, chunk=1<<16):
+    """
+    Read the rows of a saved report for --compare.
+
+    The rows are read as they are consumed, so the file can be larger
+    than the memory. A CSV report written by --csv has the values
+    rounded like the report, the npy, arrow and parquet records
+    written by --format have their full precision.
+
+    @param path   The report file: .csv, .npy, .arrow or .parquet.
+    @param chunk  The number of records read at a time.
+    @returns a generator of (n, p, type, mttdl_yrs, afr, dc, jdc)
+             tuples, the AFR in percent.
+    @raises ValueError if the file is not a report.
+    @raises ImportError if an arrow or parquet file is read without
+            pyarrow.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        with open(path) as fp:
+            index = None
+            for line in fp:
+                line = line.rstrip('\n')
+                if line.startswith(',,N,'):
+                    cols = line.split(',')
+                    try:
+                        index = [cols.index(x) for x in ['N', 'Parity', 'MTTDL (yrs)', 'AFR', 'DC', 'JDC']]
+                    except ValueError:
+                        raise ValueError('unknown CSV header: %s' % (line))
+                elif index is not None and line.startswith(',,'):
+                    # The types are the last column, they can have commas.
+                    f = line.split(',', len(cols)-1)
+                    (n, p, yrs, afr, dc, jdc) = (f[i] for i in index)
+                    yield (int(n), int(p), f[-1], parse_big(yrs), 100*parse_big(afr), float(dc), float(jdc))
+            if index is None:
+                raise ValueError('no CSV report header found')
+        return
+    if ext not in ['.npy', '.arrow', '.parquet']:
+        raise ValueError('unknown report format, expected .csv, .npy, .arrow or .parquet')
+    load_numpy('--compare')
+    names = ['n', 'p', 'type', 'mttdl_yrs', 'afr', 'dc', 'jdc', 'log_mttdl']
+    if ext == '.npy':
+        a = numpy.load(path, mmap_mode='r')
+        if a.dtype.names is None or set(names) - set(a.dtype.names):
+            raise ValueError('not a report record file')
+        batches = ((a[k][i:i+chunk].tolist() for k in names) for i in range(0, len(a), chunk))
+    else:
+        import pyarrow
+        if ext == '.parquet':
+            import pyarrow.parquet
+            batches = (b.to_pydict() for b in pyarrow.parquet.ParquetFile(path).iter_batches(chunk, columns=names))
+        else:
+            f = pyarrow.ipc.open_file(path)
+            batches = (f.get_batch(i).to_pydict() for i in range(f.num_record_batches))
+        batches = ((b[k] for k in names) for b in batches)
+    for b in batches:
+        for (n, p, ptype, yrs, afr, dc, jdc, lm) in zip(*b):
+            if math.isinf(yrs) or (yrs == 0 and math.isfinite(lm) and lm > -LOG_FLOAT_MAX):
+                (yrs, afr) = mttdl_columns(exp_mttdl(lm))
+            yield (n, p, ptype, yrs, afr, dc, jdc)
+
+def compare_source(spec, defaults, Ns, markov=None, rebuild=None, engine='loop', cache=None):
+    """
+    Get the rows of one side of --compare.
+
+    @param spec      A report file, see read_report_rows(), or the
+                     edits of the command line parameters as URL
+                     parameters, see parse_query(). An empty spec is
+                     the command line parameters.
+    @param defaults  The query of the command line parameters.
+    @param Ns        The array sizes of the command line, numbers and
+                     ranges, used when the spec does not edit n.
+    @param markov    The Markov model parameters, see markov_mttdl().
+    @param rebuild   The rebuild model, see rebuild_mttr().
+    @param engine    The engine: 'loop' or 'sweep'.
+    @param cache     The RowCache, if any.
+    @returns a generator of (n, p, type, mttdl_yrs, afr, dc, jdc)
+             tuples in report order.
+    @raises ValueError if the spec is not valid.
+    """
+    if os.path.exists(spec) or re.search(r'\.(csv|npy|arrow|parquet)$', spec, re.I):
+        return read_report_rows(spec)
+    import urllib.parse
+    query = dict((k, v if k == 'filter' else v[-1])
+                 for (k, v) in urllib.parse.parse_qs(spec, keep_blank_values=True).items())
+    if 'n' in query:
+        q = parse_query(query, defaults)
+    else:
+        # The ranges of the command line are not expanded.
+        q = parse_query(dict(query, n=[1]), defaults)
+        q['n'] = Ns
+    rows = iter_rows(q['n'], q['mtbf'], q['mttr'], q['size'], q['capacity'], q['filter'],
+                     q['limits'], markov, rebuild, engine, cache)
+    return ((x.n, x.p, x.type, x.mttdl_yrs, x.afr, x.dc, x.jdc) for x in rows)
+
+def n_groups(rows, name):
+    """
+    Group the rows of a report by N.
+
+    @param rows  The (n, p, type, ...) tuples of compare_source().
+    @param name  The name of the report for the error message.
+    @returns a generator of (n, list of rows) tuples.
+    @raises ValueError if the rows are not in ascending N.
+    """
+    last = None
+    for (n, group) in itertools.groupby(rows, operator.itemgetter(0)):
+        if last is not None and n <= last:
+            raise ValueError('%s is not in ascending N, compare single reports' % (name))
+        last = n
+        yield (n, list(group))
+
+def compare_rows(a, b, names=('A', 'B')):
+    """
+    Join the rows of two reports on (N, P, type).
+
+    The reports are in ascending N, so they are joined one N at a time
+    like a merge join: the rows of A for the next N are put in a hash
+    index keyed by (P, type) and the rows of B for the same N are
+    looked up in it. Only the rows of one N are in memory, so the
+    reports are streamed in one pass whatever their sizes.
+
+    @param a      The rows of A, see compare_source().
+    @param b      The rows of B.
+    @param names  The names of the reports for the error messages.
+    @returns a generator of (x, y) tuples in the order of B, then the
+             rows of A that B does not have, where x is the row of A
+             and y the row of B, None for a row that is only in one.
+    """
+    (ga, gb) = (n_groups(a, names[0]), n_groups(b, names[1]))
+    (na, ra) = next(ga, (None, None))
+    (nb, rb) = next(gb, (None, None))
+    while na is not None or nb is not None:
+        if nb is None or (na is not None and na < nb):
+            for x in ra:
+                yield (x, None)
+            (na, ra) = next(ga, (None, None))
+        elif na is None or nb < na:
+            for y in rb:
+                yield (None, y)
+            (nb, rb) = next(gb, (None, None))
+        else:
+            index = {}
+            for x in ra:
+                index.setdefault(x[1:3], []).append(x)
+            for y in rb:
+                found = index.get(y[1:3])
+                yield (found.pop(0) if found else None, y)
+            # The rows of A that are left are in the order of A.
+            for x in ra:
+                rest = index[x[1:3]]
+                if rest and rest[0] is x:
+                    yield (rest.pop(0), None)
+            (na, ra) = next(ga, (None, None))
+            (nb, rb) = next(gb, (None, None))
+
+def compare_delta(x, y):
+    """
+    Get the difference and the ratio of two values of --compare.
+
+    @param x  The value of A, a number or a Decimal.
+    @param y  The value of B.
+    @returns the (y-x, y/x) tuple, the ratio is inf or nan when x is 0.
+    """
+    if not isinstance(x, decimal.Decimal) and not isinstance(y, decimal.Decimal):
+        return (y - x, divide(y, x))
+    d = DECIMAL.subtract(decimal.Decimal(y), decimal.Decimal(x))
+    lx = log_big(x) if isinstance(x, decimal.Decimal) else math.log(x) if x > 0 else -float('inf')
+    ly = log_big(y) if isinstance(y, decimal.Decimal) else math.log(y) if y > 0 else -float('inf')
+    lq = ly - lx
+    if not math.isfinite(lq):
+        # A zero value, like divide() does.
+        return (d, float('nan') if math.isnan(lq) else float('inf') if lq > 0 else 0.)
+    return (d, exp_mttdl(lq))
+
+# The compared values of --compare: (name, index in the rows, text
+# format of the values, of the differences), the CSV AFR is a
+# fraction like in the reports.
+COMPARE_VALUES = [('MTTDL', 3, '%8.3g', '%+9.3g'), ('AFR', 4, '%8.3g%%', '%+8.3g%%'),
+                  ('DC', 5, '%6.1f', '%+7.1f'), ('JDC', 6, '%6.1f', '%+7.1f')]
+
+def format_compare(fmt, x):
+    """
+    Format a value of --compare.
+
+    @param fmt  The format of a float, like %8.3g.
+    @param x    The value, a number, a Decimal or None.
+    @returns the formatted value, blank for None.
+    """
+    if x is None:
+        return ' '*len(fmt % 0)
+    if isinstance(x, decimal.Decimal):
+        w = len(fmt % 0)
+        s = format_big(x, 3)
+        if fmt.startswith('%+') and x >= 0:
+            s = '+' + s
+        return (s + fmt[fmt.index('g')+1:].replace('%%', '%')).rjust(w)
+    return fmt % (x)
+
+def write_comparison(pairs, fmt='text', names=('A', 'B'), print_title=True, print_header=True,
+                     out=None):
+    """
+    Write the report of --compare as its rows are joined.
+
+    @param pairs         The (x, y) tuples of compare_rows().
+    @param fmt           The output format: 'text' or 'csv'.
+    @param names         The descriptions of the reports A and B.
+    @param print_title   Print the title.
+    @param print_header  Print the column headers.
+    @param out           The output stream, the default is stdout.
+    @returns the (matched, only in A, only in B) row counts.
+    """
+    out = ChunkWriter(out or sys.stdout)
+    counts = [0, 0, 0]
+    if fmt == 'csv':
+        out.write('A,%s\nB,%s\n\n' % names)
+        if print_header:
+            out.write(',,N,Parity,' + ','.join('%s A,%s B,%s Delta,%s Ratio' % ((v[0],)*4)
+                                               for v in COMPARE_VALUES) + ',Types\n')
+    else:
+        heads = [('', 'N', 2), ('', 'P', 2)]
+        for (name, i, vfmt, dfmt) in COMPARE_VALUES:
+            unit = '(yrs)' if name == 'MTTDL' else '(TB)' if i > 4 else ''
+            heads += [(name+' A', unit, len(vfmt % 0)), (name+' B', unit, len(vfmt % 0)),
+                      ('Delta', unit, len(dfmt % 0)), ('Ratio', 'B/A', 8)]
+        heads.append(('', 'Types', 12))
+        header = [' '.join(h[k].ljust(h[2]) for h in heads).rstrip() for k in range(2)]
+        header.append(' '.join('='*h[2] for h in heads))
+        if print_title:
+            width = len(header[2])
+            out.write('\n')
+            center(width, 'MTTDL RAID Comparison Report', out)
+            for (side, name) in zip('AB', names):
+                center(width, '%s: %s' % (side, name), out)
+        if print_header:
+            out.write('\n')
+            for h in header:
+                out.write(h+'\n')
+    last = None
+    for (x, y) in pairs:
+        counts[0 if x and y else 1 if x else 2] += 1
+        r = x or y
+        if fmt == 'text' and last is not None and r[0] != last:
+            out.write('\n')
+        last = r[0]
+        f = ['%d' % (r[0]), '%d' % (r[1])] if fmt == 'csv' else ['%2d' % (r[0]), '%2d' % (r[1])]
+        for (name, i, vfmt, dfmt) in COMPARE_VALUES:
+            (a, b) = (x and x[i], y and y[i])
+            (d, q) = compare_delta(a, b) if x and y else (None, None)
+            if fmt == 'csv':
+                scale = 100 if name == 'AFR' else 1
+                f += ['' if v is None else
+                      format_big(v/scale, 5) if isinstance(v, decimal.Decimal) else '%.5g' % (v/scale)
+                      for v in (a, b, d)]
+                f.append('' if q is None else format_big(q, 5) if isinstance(q, decimal.Decimal) else '%.5g' % (q))
+            else:
+                f += [format_compare(vfmt, a), format_compare(vfmt, b), format_compare(dfmt, d),
+                      format_compare('%8.3g', q)]
+        f.append(r[2])
+        out.write((',,' + ','.join(f) if fmt == 'csv' else ' '.join(f)) + '\n')
+    if fmt == 'csv':
+        out.write('\nMatched,%d\nOnly A,%d\nOnly B,%d\n' % tuple(counts))
+    else:
+        out.write('\nMatched %s rows, %s only in A, %s only in B\n' % tuple(commaize(x) for x in counts))
+    out.flush()
+    return tuple(counts)
+
+def evaluate(case):
+    """
+    Compute the report rows for one combination of parameters.
+
+    This is a module level function so that it can be sent to the
+    worker processes.
+
+    @param case  The (Ns, mtbf, mttr, size, C, filters, limits, markov,
+                 rebuild, engine, cache, search) tuple.
+    @returns the (rows, stats) tuple of the list of Row records and
+             the Stats.take() of the worker, None when --stats is off.
+    """
+    with phase('compute'):
+        rows = list(iter_rows(*case))
+    cache = case[10]
+    if cache is not None:
+        cache.flush()
+    # Send the times and counts of the worker back with the rows.
+    return (rows, None if STATS is None else STATS.take())
+
+def evaluate_all(Ns, mtbfs, mttrs, sizes, Cs, filters=None, limits=None, markov=None, engine='loop', jobs=1, cache=None, rebuild=None):
+    """
+    Compute the report rows for the cartesian product of the
+    parameter values.
+
+    The combinations are ordered by MTBF, MTTR, size and capacity in
+    the order of the values, see evaluate_cases().
+
+    @param Ns       The array sizes.
+    @param mtbfs    The mean time between failures values.
+    @param mttrs    The mean time to repair values.
+    @param sizes    The disk size values.
+    @param Cs       The JBOD capacity values.
+    @param filters  The patterns of the RAID types to keep.
+    @param limits   The structured filters, see within_limits().
+    @param markov   The Markov model parameters, see markov_mttdl().
+    @param engine   The computation engine: 'loop' or 'sweep'.
+    @param jobs     The maximum number of worker processes.
+    @param cache    The RowCache, if any.
+    @param rebuild  The rebuild model, see rebuild_mttr().
+    @returns a generator of ((mtbf, mttr, size, C), rows) tuples.
+    """
+    params = list(itertools.product(mtbfs, mttrs, sizes, Cs))
+    return evaluate_cases(Ns, params, filters, limits, markov, engine, jobs, cache, rebuild)
+
+def evaluate_cases(Ns, params, filters=None, limits=None, markov=None, engine='loop', jobs=1, cache=None, rebuild=None, search=False):
+    """
+    Compute the report rows for a list of parameter combinations.
+
+    When there is more than one combination and more than one job they
+    are evaluated by a process pool. The results are always returned
+    in the order of the combinations.
+
+    @param Ns       The array sizes.
+    @param params   The list of (mtbf, mttr, size, C) tuples.
+    @param search   Only compute the Pareto optimal rows of each
+                    combination, see iter_rows().
+    The other parameters are the same as evaluate_all().
+    @returns a generator of ((mtbf, mttr, size, C), rows) tuples. With
+             a single process the rows are generated lazily.
+    """
+    cases = [(Ns,)+x+(filters,limits,markov,rebuild,engine,cache,search) for x in params]
+    if jobs>1 and len(cases)>1:
+        pool = worker_pool(min(jobs,len(cases)))
+        try:
+            for x,(rows,stats) in zip(params, pool.imap(evaluate, cases)):
+                if stats is not None:
+                    STATS.merge(stats)
+                yield x,rows
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for case in cases:
+            yield case[1:5],iter_rows(*case)
+
+class Stats(object):
+    """
+    The --stats instrumentation: the wall time of the phases of a run
+    and the row counts.
+
+    The phases nest, the time is charged to the innermost one. For
+    example the rows are computed while the report is written, so the
+    output phase only gets the formatting and writing time.
+    """
+    PHASES = ['parse', 'compute', 'filter', 'search', 'simulate', 'output', 'other']
+
+    def __init__(self, start):
+        """
+        @param start  The time the run started, the time until now is
+                      charged to the parse phase.
+        """
+        self.start = start
+        self.last = time.time()
+        self.times = dict((p, 0.) for p in self.PHASES)
+        self.times['parse'] = self.last - start
+        self.counts = collections.Counter()
+        self.stack = ['other']
+
+    def push(self, name):
+        """
+        Enter a phase.
+
+        @param name  The phase.
+        """
+        now = time.time()
+        self.times[self.stack[-1]] += now - self.last
+        self.last = now
+        self.stack.append(name)
+
+    def pop(self):
+        """
+        Leave the current phase.
+        """
+        now = time.time()
+        self.times[self.stack.pop()] += now - self.last
+        self.last = now
+
+    def count(self, name, n=1):
+        """
+        Add to a counter.
+
+        @param name  The counter.
+        @param n     The amount.
+        """
+        self.counts[name] += n
+
+    def timed(self, rows):
+        """
+        Charge the time spent generating rows to the compute phase and
+        count them.
+
+        @param rows  The rows, any iterable.
+        @returns a generator of the rows.
+        """
+        it = iter(rows)
+        while True:
+            self.push('compute')
+            try:
+                row = next(it)
+            except StopIteration:
+                return
+            finally:
+                self.pop()
+            self.counts['rows'] += 1
+            yield row
+
+    def take(self):
+        """
+        Take the compute and filter times and the counters of a worker
+        process, they are reset.
+
+        @returns the (times, counts) tuple for merge().
+        """
+        result = (dict((p, self.times[p]) for p in ['compute', 'filter']), dict(self.counts))
+        for p in ['compute', 'filter']:
+            self.times[p] = 0.
+        self.counts.clear()
+        return result
+
+    def merge(self, worker):
+        """
+        Add the times and counters of a worker process.
+
+        @param worker  The take() of the worker.
+        """
+        (times, counts) = worker
+        for (p, t) in times.items():
+            self.times[p] += t
+        self.counts.update(counts)
+
+    def report(self):
+        """
+        Get the instrumentation. The rows are the rows computed that
+        passed the filters, the reported rows are the ones left after
+        the Pareto search.
+
+        @returns the dictionary of the instrumentation, it can be
+                 written as JSON.
+        """
+        total = time.time() - self.start
+        rows = self.counts['rows']
+        result = {'argv': sys.argv[1:],
+                  'phases': dict(self.times),
+                  'total': total,
+                  'candidates': self.counts['candidates'],
+                  'filtered': self.counts['candidates'] - rows,
+                  'rows': rows,
+                  'reported': self.counts['reported'] if 'reported' in self.counts else rows,
+                  'rows_per_sec': rows/total if total > 0 else 0.}
+        try:
+            import resource
+        except ImportError:
+            # Not on Windows.
+            return result
+        # ru_maxrss is in KB on Linux.
+        result['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        result['children_max_rss_kb'] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        return result
+
+    def write(self, out, report=None):
+        """
+        Write the instrumentation as text.
+
+        @param out     The output stream.
+        @param report  The report(), the default is now.
+        """
+        r = report or self.report()
+        out.write('\n')
+        out.write('Phase    Seconds  Share\n')
+        out.write('======== ======== ======\n')
+        for p in self.PHASES:
+            t = r['phases'][p]
+            out.write('%-8s %8.3f %5.1f%%\n' % (p, t, 100.*t/r['total'] if r['total'] > 0 else 0.))
+        out.write('%-8s %8.3f\n' % ('total', r['total']))
+        out.write('\n')
+        out.write('Rows computed: %s, filtered out: %s, reported: %s\n' %
+                  (commaize(r['candidates']), commaize(r['filtered']), commaize(r['reported'])))
+        out.write('Rows per second: %s\n' % (commaize(r['rows_per_sec'])))
+        if 'max_rss_kb' in r:
+            out.write('Peak RSS: %sKB, workers: %sKB\n' % (commaize(r['max_rss_kb']), commaize(r['children_max_rss_kb'])))
+
+class NullPhase(object):
+    """
+    The phase() of a run without --stats.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+class Phase(NullPhase):
+    """
+    A phase of the --stats instrumentation, see Stats.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        STATS.push(self.name)
+        return self
+
+    def __exit__(self, *args):
+        STATS.pop()
+        return False
+
+def phase(name):
+    """
+    Get a context that charges its time to a phase of the --stats
+    instrumentation.
+
+    @param name  The phase, see Stats.PHASES.
+    @returns the context.
+    """
+    if STATS is None:
+        return NullPhase()
+    return Phase(name)
+
+def catalog_number(entry, key, default=None):
+    """
+    Get a number from a catalog entry.
+
+    A number without a decimal point is an integer, like for the
+    command line options.
+
+    @param entry    The catalog entry.
+    @param key      The key of the number.
+    @param default  The default value when the entry does not have it.
+    @returns the number.
+    @raises ValueError if the number is missing or not valid.
+    """
+    x = entry.get(key)
+    if x is None or x == '':
+        if default is None:
+            raise ValueError('%s does not have a %s' % (entry.get('name') or 'entry', key))
+        return default
+    if isinstance(x, (int, float)):
+        return x
+    x = x.strip()
+    try:
+        if re.search(r'^\d+$', x):
+            return int(x)
+        return float(x)
+    except ValueError:
+        raise ValueError('syntax error for %s of %s, expected a number but found: %s' % (key, entry.get('name') or 'entry', x))
+
+def read_catalog(path, Cs=(24,)):
+    """
+    Read a catalog of disk models and JBOD chassis.
+
+    The format is chosen by the extension: .csv, .json, .yaml or
+    .yml. See the --catalog option for the layout.
+
+    @param path  The catalog file.
+    @param Cs    The JBOD capacities used when there are no chassis.
+    @returns the list of (name, mtbf, mttr, size, C, cost) tuples, one
+             for each disk model in each chassis. The name is the disk
+             name followed by the chassis name, if any. cost is the
+             dictionary of the cost model parameters of the entries:
+             disk_price and disk_watts from the price and watts of the
+             disk and chassis_price from the price of the chassis.
+    @raises ValueError if the catalog is not valid.
+    @raises ImportError if a YAML catalog is read without PyYAML.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    with open(path) as fp:
+        if ext == '.csv':
+            import csv
+            entries = list(csv.DictReader(fp))
+        elif ext == '.json':
+            import json
+            entries = json.load(fp)
+        elif ext in ['.yaml', '.yml']:
+            import yaml
+            entries = yaml.safe_load(fp)
+        else:
+            raise ValueError('unknown catalog format, expected .csv, .json, .yaml or .yml')
+    if isinstance(entries, dict):
+        disks = entries.get('disks') or []
+        chassis = entries.get('chassis') or []
+        if not isinstance(disks, list) or not isinstance(chassis, list):
+            raise ValueError('expected lists of disks and chassis')
+        entries = disks + chassis
+    elif isinstance(entries, list):
+        disks = None
+    else:
+        raise ValueError('expected a list of disk models or an object with disks and chassis')
+    for x in entries:
+        if not isinstance(x, dict):
+            raise ValueError('expected a disk model or a chassis but found: %s' % (json.dumps(x)))
+    if disks is None:
+        # A chassis has a capacity but no MTBF.
+        disks = [x for x in entries if x.get('mtbf') not in [None, '']]
+        chassis = [x for x in entries if x.get('mtbf') in [None, ''] and x.get('capacity') not in [None, '']]
+    if not disks:
+        raise ValueError('no disk models found')
+
+    if chassis:
+        Cs = [(str(x.get('name') or ''), catalog_number(x, 'capacity'),
+               catalog_number(x, 'price', 0) if x.get('price') not in [None, ''] else None)
+              for x in chassis]
+    else:
+        Cs = [('', C, None) for C in Cs]
+    models = []
+    for x in disks:
+        name = str(x.get('name') or '')
+        mtbf = catalog_number(x, 'mtbf')
+        mttr = catalog_number(x, 'mttr', 24)
+        size = float(catalog_number(x, 'size', 2.0))
+        cost = {}
+        for (key, field) in [('disk_price', 'price'), ('disk_watts', 'watts')]:
+            if x.get(field) not in [None, '']:
+                cost[key] = float(catalog_number(x, field))
+        for (cname, C, price) in Cs:
+            ccost = dict(cost)
+            if price is not None:
+                ccost['chassis_price'] = float(price)
+            if cname:
+                models.append(('%s, %s' % (name, cname), mtbf, mttr, size, C, ccost))
+            else:
+                models.append((name, mtbf, mttr, size, C, ccost))
+    return models
+
+# The maximum number of array sizes in a server query.
+MAX_QUERY_NS = 100000
+
+def parse_query(query, defaults):
+    """
+    Parse an MTTDL query of the server.
+
+    @param query     The query dictionary, from JSON or URL parameters.
+    @param defaults  The default values of the query keys.
+    @returns the dictionary of the query with the sorted array sizes
+             (n), mtbf, mttr, size, capacity, filter (a TypeFilter)
+             and limits.
+    @raises ValueError if the query is not valid.
+    """
+    unknown = set(query) - set(['n', 'mtbf', 'mttr', 'size', 'capacity', 'filter',
+                                'min_ft', 'min_mttdl', 'max_afr', 'min_jdc'])
+    if unknown:
+        raise ValueError('unknown query parameters: %s' % (', '.join(sorted(unknown))))
+    q = dict(defaults)
+    q.update(query)
+    try:
+        Ns = q['n']
+        if isinstance(Ns, str):
+            Ns = parse_nums(Ns)
+        elif isinstance(Ns, int):
+            Ns = [Ns]
+        Ns = sorted(set(int(n) for n in Ns))
+    except Exception:
+        raise ValueError('syntax error for n, expected numbers or ranges but found: %s' % (q['n']))
+    if len(Ns) > MAX_QUERY_NS or (Ns and Ns[0] < 1):
+        raise ValueError('n must have between 1 and %d array sizes of at least 1 disk' % (MAX_QUERY_NS))
+    result = {'n': Ns}
+    for (key, conv) in [('mtbf', int), ('mttr', int), ('size', float), ('capacity', int)]:
+        x = q[key]
+        try:
+            if isinstance(x, str):
+                x = float(x) if '.' in x or conv is float else int(x)
+            elif not isinstance(x, (int, float)):
+                raise ValueError
+        except ValueError:
+            raise ValueError('syntax error for %s, expected a number but found: %s' % (key, x))
+        result[key] = x
+    filters = q.get('filter') or []
+    if isinstance(filters, str):
+        filters = [filters]
+    try:
+        result['filter'] = TypeFilter(filters)
+    except re.error as err:
+        raise ValueError('bad filter: %s' % (err))
+    result['limits'] = {}
+    for key in ['min_ft', 'min_mttdl', 'max_afr', 'min_jdc']:
+        if key in q:
+            try:
+                result['limits'][key] = int(q[key]) if key == 'min_ft' else float(q[key])
+            except ValueError:
+                raise ValueError('syntax error for %s, expected a number but found: %s' % (key, q[key]))
+    return result
+
+class Batcher(object):
+    """
+    Evaluate the queries of concurrent server requests in batches.
+
+    The request threads submit their queries and wait. A single worker
+    thread collects the queries that arrive within a short window,
+    evaluates the union of the array sizes of the queries with the
+    same parameters in one pass, and splits the rows between them.
+    The worker owns the row cache, so it needs no locking.
+    """
+    def __init__(self, markov=None, engine='loop', cache=None, window=0.002, rebuild=None):
+        """
+        @param markov   The Markov model parameters, see markov_mttdl().
+        @param engine   The computation engine: 'loop' or 'sweep'.
+        @param cache    The RowCache, if any.
+        @param window   The time in seconds to wait for more queries.
+        @param rebuild  The rebuild model, see rebuild_mttr().
+        """
+        self.markov = markov
+        self.rebuild = rebuild
+        self.engine = engine
+        self.cache = cache
+        import threading
+        self.window = window
+        self.cond = threading.Condition()
+        self.pending = []
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def evaluate(self, query):
+        """
+        Evaluate a query, see parse_query(). It blocks until the batch
+        of the query is done.
+
+        @param query  The parsed query.
+        @returns the (rows, batch size) tuple.
+        """
+        import threading
+        item = {'query': query, 'done': threading.Event(), 'rows': None, 'batch': 0, 'error': None}
+        with self.cond:
+            self.pending.append(item)
+            self.cond.notify()
+        item['done'].wait()
+        if item['error'] is not None:
+            raise item['error']
+        return (item['rows'], item['batch'])
+
+    def run(self):
+        """
+        The worker thread.
+        """
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+            time.sleep(self.window)
+            with self.cond:
+                (batch, self.pending) = (self.pending, [])
+            groups = collections.OrderedDict()
+            for item in batch:
+                q = item['query']
+                key = (q['mtbf'], q['mttr'], q['size'], q['capacity'])
+                groups.setdefault(key, []).append(item)
+            for ((mtbf, mttr, size, C), items) in groups.items():
+                try:
+                    Ns = sorted(set(n for item in items for n in item['query']['n']))
+                    byN = collections.defaultdict(list)
+                    for row in iter_rows([Ns], mtbf, mttr, size, C, markov=self.markov,
+                                         rebuild=self.rebuild, engine=self.engine,
+                                         cache=self.cache):
+                        byN[row.n].append(row)
+                    for item in items:
+                        q = item['query']
+                        item['rows'] = [row for n in q['n'] for row in byN.get(n, [])
+                                        if q['filter'](row.type)
+                                        and (not q['limits'] or within_limits(q['limits'], row.ft, row.mttdl_yrs, row.afr, row.jdc))]
+                        item['batch'] = len(batch)
+                except Exception as err:
+                    for item in items:
+                        item['error'] = err
+                for item in items:
+                    item['done'].set()
+
+class MTTDLHandler(object):
+    """
+    Answer the MTTDL queries of the server, see the --serve option.
+    The server has the batcher and the query defaults.
+
+    serve() mixes it with the request handler of http.server, which is
+    only imported by --serve.
+    """
+    server_version = 'raid.py/' + VERSION
+
+    def do_GET(self):
+        import urllib.parse
+        url = urllib.parse.urlparse(self.path)
+        query = dict((k, v if k == 'filter' else v[-1])
+                     for (k, v) in urllib.parse.parse_qs(url.query).items())
+        self.answer(url.path, query)
+
+    def do_POST(self):
+        import json
+        import urllib.parse
+        try:
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            query = json.loads(body or '{}')
+            if not isinstance(query, dict):
+                raise ValueError('expected a JSON object')
+        except ValueError as err:
+            self.send_json(400, {'error': 'bad request: %s' % (err)}, time.time())
+            return
+        self.answer(urllib.parse.urlparse(self.path).path, query)
+
+    def answer(self, path, query):
+        """
+        Evaluate a query and send the response.
+
+        @param path   The path of the URL.
+        @param query  The query dictionary.
+        """
+        start = time.time()
+        if path != '/mttdl':
+            self.send_json(404, {'error': 'not found: %s' % (path)}, start)
+            return
+        try:
+            q = parse_query(query, self.server.defaults)
+        except ValueError as err:
+            self.send_json(400, {'error': str(err)}, start)
+            return
+        try:
+            (rows, batch) = self.server.batcher.evaluate(q)
+        except Exception as err:
+            self.send_json(500, {'error': str(err)}, start)
+            return
+        self.send_json(200, {'rows': [row_dict(row) for row in rows], 'batch': batch}, start)
+
+    def send_json(self, code, result, start):
+        """
+        Send a JSON response with the latency since start.
+
+        @param code    The HTTP status.
+        @param result  The JSON object, the latency is added to it.
+        @param start   The time the request was received.
+        """
+        import json
+        self.latency = 1000.*(time.time() - start)
+        result['latency_ms'] = self.latency
+        # The MTTDL values that do not fit in a float are Decimals.
+        body = json.dumps(result, default=str).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Server-Timing', 'total;dur=%.3f' % (self.latency))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_request(self, code='-', size='-'):
+        self.log_message('"%s" %s %.3fms', self.requestline, str(code), getattr(self, 'latency', 0.))
+
+def serve(address, defaults, markov=None, engine='loop', cache=None, rebuild=None):
+    """
+    Run the HTTP server of --serve until it is interrupted.
+
+    @param address   The (host, port) tuple.
+    @param defaults  The default values of the query keys, see
+                     parse_query().
+    @param markov    The Markov model parameters, see markov_mttdl().
+    @param engine    The computation engine: 'loop' or 'sweep'.
+    @param cache     The RowCache, if any.
+    @param rebuild   The rebuild model, see rebuild_mttr().
+    """
+    import http.server
+
+    class Handler(MTTDLHandler, http.server.BaseHTTPRequestHandler):
+        pass
+
+    # A thread per request.
+    server = http.server.ThreadingHTTPServer(address, Handler)
+    server.defaults = defaults
+    server.batcher = Batcher(markov, engine, cache, rebuild=rebuild)
+    sys.stderr.write('serving on http://%s:%d/mttdl\n' % server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+# The column groups of a what-if session in the order they are
+# computed: (group, the columns, the query keys and the groups that
+# they depend on). Session.depends() adds the dependencies of the
+# model on the disk size.
+SESSION_GROUPS = [
+    ('grid', ['n', 'p', 'ft', 'min', 'dcp', 'type'], ['n']),
+    ('rio', ['rio'], ['grid', 'size']),
+    ('layout', ['c', 'b', 's', 'bd'], ['grid', 'capacity']),
+    ('spare', ['wait', 'exh'], ['layout', 'mtbf']),
+    ('repair', ['mttr'], ['grid', 'mttr']),
+    ('ure', ['ure'], ['grid']),
+    ('mttdl', ['mttdl', 'mttdl_yrs', 'afr'], ['grid', 'mtbf', 'repair', 'ure']),
+    ('dc', ['dc'], ['grid', 'size']),
+    ('jdc', ['jdc'], ['dc', 'layout']),
+    ('types', [], ['grid', 'filter']),
+    ('select', [], ['types', 'limits', 'mttdl', 'jdc']),
+    ]
+
+class Session(object):
+    """
+    Keep the report grid of --interactive in memory and recompute only
+    the columns that an edit affects.
+
+    The grid is the sweep() of all of the RAID types, the filters and
+    the limits select its rows with a mask. An edit of the MTTR only
+    recomputes the MTTR and MTTDL columns, an edit of the disk size
+    only DC and JDC unless the model depends on it, and an edit of the
+    filters or the limits only the mask.
+    """
+    def __init__(self, query, markov=None, rebuild=None):
+        """
+        @param query    The query of the first report, see
+                        parse_query().
+        @param markov   The Markov model parameters, see
+                        markov_mttdl().
+        @param rebuild  The rebuild model, see rebuild_mttr().
+        """
+        load_numpy('--interactive')
+        self.markov = markov
+        self.rebuild = rebuild
+        self.query = {}
+        self.q = {}
+        self.cols = {}
+        self.set(query)
+
+    def depends(self):
+        """
+        Get the dependencies of the column groups for the model.
+
+        @returns the SESSION_GROUPS list.
+        """
+        rebuild = self.rebuild or {}
+        extra = {'repair': (['rio'] if 'rate' in rebuild else []) + (['spare'] if 'lead' in rebuild else []),
+                 'ure': ['size'] if rebuild.get('ure') else [],
+                 'mttdl': ['size'] if self.markov is not None and self.markov.get('lse') else []}
+        return [(g, cols, inputs + extra.get(g, [])) for (g, cols, inputs) in SESSION_GROUPS]
+
+    def set(self, query):
+        """
+        Edit the query and recompute the column groups that depend on
+        the keys that changed.
+
+        @param query  The changed keys of the query, see parse_query().
+                      None removes a filter or a limit.
+        @returns the list of the recomputed groups.
+        @raises ValueError if the query is not valid.
+        """
+        new = dict(self.query)
+        new.update(query)
+        for key in [k for k in new if new[k] is None]:
+            if key in ['n', 'mtbf', 'mttr', 'size', 'capacity']:
+                raise ValueError('%s needs a value' % (key))
+            del new[key]
+        if 'n' in query or not self.q:
+            q = parse_query(new, {})
+        else:
+            # Only parse the array sizes when they are edited.
+            q = parse_query(dict(new, n=[1]), {})
+            q['n'] = self.q['n']
+        # A float MTTR or MTBF is not divided like an integer, so the
+        # type of a number is a change too.
+        dirty = set(k for k in ['n', 'mtbf', 'mttr', 'size', 'capacity']
+                    if k not in self.q or (q[k], type(q[k])) != (self.q[k], type(self.q[k])))
+        if 'filter' not in self.q or q['filter'].patterns != self.q['filter'].patterns:
+            dirty.add('filter')
+        if 'limits' not in self.q or q['limits'] != self.q['limits']:
+            dirty.add('limits')
+        (self.query, self.q) = (new, q)
+        done = []
+        for (group, cols, inputs) in self.depends():
+            if dirty.intersection(inputs):
+                getattr(self, 'compute_' + group)()
+                dirty.add(group)
+                done.append(group)
+        return done
+
+    def compute_grid(self):
+        (N, t, p, pm, pa, pe, w, g, sp) = sweep_grid(self.q['n'])
+        keep = N >= pm
+        (N, t, p, pm, pa, pe, w, g, sp) = (x[keep] for x in (N, t, p, pm, pa, pe, w, g, sp))
+        (self.t, self.pa, self.width, self.groups, self.spread) = (t, pa, w, g, sp)
+        self.falling = falling_factorial(w, p) if self.markov is None else None
+        self.cols.update({'n': N, 'p': p, 'ft': p, 'min': pm, 'dcp': 100.*pe,
+                          'type': sweep_types(N, t)})
+        self.pe = pe
+
+    def compute_rio(self):
+        self.cols['rio'] = rebuild_mttr(0, self.q['size'], self.pa)[1]
+
+    def compute_repair(self):
+        rate = None
+        if self.rebuild is not None and 'rate' in self.rebuild:
+            rate = self.rebuild['rate'] * (1. - self.rebuild.get('load', 0.)/100.)
+        # The same sum as rebuild_mttr(), with the rebuild I/O of the
+        # rio group.
+        self.hrs = self.q['mttr'] if rate is None else self.q['mttr'] + self.cols['rio']*1e6/(rate*self.spread)/3600.
+        if self.rebuild is not None and 'lead' in self.rebuild:
+            self.hrs = self.hrs + self.cols['wait']
+        self.cols['mttr'] = numpy.broadcast_to(numpy.asarray(self.hrs, dtype=numpy.float64), self.pa.shape)
+
+    def compute_ure(self):
+        self.cols['ure'] = rebuild_ure(self.q['size'], self.pa, self.rebuild)
+
+    def compute_mttdl(self):
+        c = self.cols
+        (c['mttdl'], c['log_mttdl'], c['mttdl_yrs'], c['afr']) = \
+            sweep_mttdl(self.width, c['p'], self.q['mtbf'], self.hrs, c['ure'], self.q['size'],
+                        self.markov, self.rebuild, self.falling, self.groups, self.pa)
+
+    def compute_dc(self):
+        self.cols['dc'] = float(self.q['size'])*self.cols['n']*self.pe
+
+    def compute_layout(self):
+        C = self.q['capacity']
+        (self.cols['b'], self.cols['s'], self.cols['bd']) = \
+            sweep_jbod(self.cols['n'], C, self.rebuild and self.rebuild.get('spares'))
+        self.cols['c'] = numpy.repeat(C, len(self.pa))
+
+    def compute_spare(self):
+        (self.cols['wait'], self.cols['exh']) = \
+            spare_wait(self.cols['s'], self.cols['bd'], self.q['mtbf'], self.rebuild)
+
+    def compute_jdc(self):
+        self.cols['jdc'] = self.cols['b'].astype(numpy.float64)*self.cols['dc']
+
+    def compute_types(self):
+        filters = self.q['filter']
+        self.types = type_mask(filters, self.cols['n'], self.t) if len(filters)>0 else None
+
+    def compute_select(self):
+        c = self.cols
+        keep = numpy.ones(len(self.pa), dtype=bool) if self.types is None else self.types.copy()
+        limits = self.q['limits']
+        if limits:
+            with numpy.errstate(invalid='ignore'):
+                keep &= within_limits(limits, c['p'], c['mttdl_yrs'], c['afr'], c['jdc'])
+        self.select = numpy.flatnonzero(keep)
+
+    def __len__(self):
+        return len(self.select)
+
+    def rows(self, limit=None):
+        """
+        Get the selected rows, the same as the ones of sweep().
+
+        @param limit  The maximum number of rows.
+        @returns the list of Row records in report order.
+        """
+        return sweep_rows(take_cols(self.cols, self.select[:limit]))
+
+SESSION_HELP = '''\
+commands:
+    <key> <value>...  edit a key of the query: n, mtbf, mttr, size,
+                      capacity, filter, min_ft, min_mttdl, max_afr
+                      and min_jdc, the same keys as the --serve
+                      queries. Without a value the filter or the limit
+                      is removed.
+    show [rows]       write the report, or only its first rows
+    depends           list the column groups and what they depend on
+    help              this message
+    quit              end the session
+'''
+
+def interact(session, report, inp=None, err=None):
+    """
+    Run the read, edit, report loop of --interactive until the end of
+    the input.
+
+    Each edit reports the column groups that it recomputed, the time
+    it took and the number of selected rows.
+
+    @param session  The Session.
+    @param report   The function that writes the report of a list of
+                    rows and the parsed query, see parse_query().
+    @param inp      The input stream, the default is stdin.
+    @param err      The stream of the prompts and the messages, the
+                    default is stderr.
+    """
+    inp = inp or sys.stdin
+    err = err or sys.stderr
+    prompt = inp.isatty()
+    if prompt:
+        try:
+            import readline
+        except ImportError:
+            pass
+        err.write('%d rows, type help for the commands\n' % (len(session)))
+    while True:
+        if prompt:
+            err.write('raid> ')
+            err.flush()
+        line = inp.readline()
+        if not line:
+            break
+        words = line.split()
+        if not words or words[0].startswith('#'):
+            continue
+        (cmd, args) = (words[0], words[1:])
+        if cmd in ['quit', 'exit']:
+            break
+        elif cmd == 'help':
+            err.write(SESSION_HELP)
+        elif cmd == 'depends':
+            for (group, cols, inputs) in session.depends():
+                err.write('%-8s %-24s <- %s\n' % (group, ' '.join(cols), ' '.join(inputs)))
+        elif cmd == 'show':
+            if args and not re.search(r'^\d+$', args[0]):
+                err.write('syntax error for show, expected a number but found: %s\n' % (args[0]))
+                continue
+            report(session.rows(int(args[0]) if args else None), session.q)
+        else:
+            if cmd == 'filter':
+                value = args or None
+            elif len(args) == 1:
+                value = args[0]
+            elif not args:
+                value = None
+            else:
+                err.write('syntax error for %s, expected one value but found: %s\n' % (cmd, ' '.join(args)))
+                continue
+            start = time.time()
+            try:
+                groups = session.set({cmd: value})
+            except ValueError as msg:
+                err.write('%s\n' % (msg))
+                continue
+            err.write('recomputed %s for %d rows in %.3f ms, %d rows selected\n' %
+                      (', '.join(groups) or 'nothing', len(session.pa), 1e3*(time.time()-start), len(session)))
+
+def need_numpy(opt):
+    """
+    Import NumPy for an option that needs it or exit.
+
+    @param opt  The option.
+    """
+    try:
+        load_numpy(opt)
+    except ImportError as err:
+        sys.exit(str(err))
+
+def main():
+    """
+    main
+    """
+    global STATS
+    start = time.time()
+    try:
+        opts, args = getopt.gnu_getopt(sys.argv[1:],
+                                       'c:d:f:hj:n:o:s:vV',
+                                       ['jbod-capacity=',
+                                        'cache=',
+                                        'cache-size=',
+                                        'compare=',
+                                        'catalog=',
+                                        'chassis-price=',
+                                        'corr=',
+                                        'csv',
+                                        'disk-name=',
+                                        'disk-price=',
+                                        'disk-size=',
+                                        'disk-watts=',
+                                        'domain-mttr=',
+                                        'filters=',
+                                        'fleet=',
+                                        'format=',
+                                        'help',
+                                        'interactive',
+                                        'jbod-mtbf=',
+                                        'jobs=',
+                                        'lead-time=',
+                                        'kwh-price=',
+                                        'loss-cost=',
+                                        'lse=',
+                                        'markov',
+                                        'mission=',
+                                        'max-afr=',
+                                        'min-ft=',
+                                        'min-jdc=',
+                                        'min-mttdl=',
+                                        'mtbf=',
+                                        'mtbf-sd=',
+                                        'mttr=',
+                                        'mttr-sd=',
+                                        'no-key',
+                                        'no-header',
+                                        'no-title',
+                                        'optimize=',
+                                        'output=',
+                                        'pareto',
+                                        'profile=',
+                                        'rack-mtbf=',
+                                        'rack-size=',
+                                        'rebuild-load=',
+                                        'rebuild-rate=',
+                                        'scheme=',
+                                        'seed=',
+                                        'sensitivity',
+                                        'serve=',
+                                        'simulate',
+                                        'size-sd=',
+                                        'spares=',
+                                        'span=',
+                                        'stats',
+                                        'stats-json=',
+                                        'sweep',
+                                        'trials=',
+                                        'uncertainty=',
+                                        'ure=',
+                                        'verbose',
+                                        'version',
+                                        'weibull='])
+    except getopt.GetoptError as err:
+        print(str(err))
+        print('exiting ...')
+        sys.exit(1)
+        
+    disk = ''
+    first=True
+    Ns = [6]
+    Cs = [24]         # JBOD capacity
+    mtbfs = [750000]  # mean time between failures in hours
+    mttrs = [24]      # mean time to recovery in hours
+    disk = ''
+    sizes = [2.0] # TB
+    jobs = os.cpu_count() or 1
+    filters = []
+    limits = {}
+    markov = None
+    markov_params = {}
+    rebuild = None
+    rebuild_params = {'load': 0.}
+    fleet = None
+    fleet_params = {'rack': 0, 'span': 1, 'jbod_mtbf': 0., 'rack_mtbf': 0., 'domain_mttr': 24.}
+    cost = None
+    cost_params = {'disk_price': 0., 'disk_watts': 0., 'chassis_price': 0., 'kwh_price': 0.10,
+                   'loss_cost': 0.}
+    top = None
+    sens = None
+    compare = []
+    sens_params = {'elasticity': False, 'draws': 0, 'mtbf_sd': 0.3, 'mttr_sd': 0.3, 'size_sd': 0.}
+    cache_file = None
+    catalog = None
+    cache_size = None
+    verbose = 0
+    print_key = True
+    print_header = True
+    print_title = True
+    fmt = 'text'
+    output = None
+    engine = 'loop'
+    search = False
+    sim = None
+    mission = 5.
+    trials = 100000
+    shape = 1.
+    seed = 0
+    address = None
+    interactive = False
+    profile = None
+    stats = False
+    stats_json = None
+    for opt,arg in opts:
+        if opt in ['-h','--help'] :
+            usage()
+        elif opt in ['-c', '--jbod-capacity']:
+            try:
+                Cs = parse_range(arg)
+            except ValueError:
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+        elif opt in ['--cache']:
+            cache_file = arg
+        elif opt in ['--catalog']:
+            catalog = arg
+        elif opt in ['--compare']:
+            if len(compare) == 2:
+                sys.exit('syntax error for %s, expected at most two reports' % (opt))
+            compare.append(arg)
+        elif opt in ['--cache-size']:
+            if not re.search(r'^\d+$',arg):
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            cache_size = int(arg)
+        elif opt in ['--corr', '--lse']:
+            try:
+                markov_params[opt[2:]] = float(arg)
+            except ValueError:
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+        elif opt in ['--rebuild-load', '--rebuild-rate']:
+            try:
+                x = float(arg)
+            except ValueError:
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            if opt == '--rebuild-rate':
+                if x <= 0:
+                    sys.exit('syntax error for %s, expected a positive number but found: %s' % (opt,arg))
+                rebuild = rebuild_params
+                rebuild['rate'] = x
+            elif not 0 <= x < 100:
+                sys.exit('syntax error for %s, expected a percent less than 100 but found: %s' % (opt,arg))
+            else:
+                rebuild_params['load'] = x
+        elif opt in ['--fleet', '--rack-size', '--span']:
+            if not re.search(r'^\d+$',arg) or int(arg) < 1:
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            if opt == '--fleet':
+                fleet = fleet_params
+                fleet['jbods'] = int(arg)
+            else:
+                fleet_params[opt[2:].split('-')[0]] = int(arg)
+        elif opt in ['--domain-mttr', '--jbod-mtbf', '--rack-mtbf']:
+            try:
+                x = float(arg)
+            except ValueError:
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            if x <= 0:
+                sys.exit('syntax error for %s, expected a positive number but found: %s' % (opt,arg))
+            fleet_params[opt[2:].replace('-','_')] = x
+        elif opt in ['--chassis-price', '--disk-price', '--disk-watts', '--kwh-price', '--loss-cost']:
+            try:
+                x = float(arg)
+            except ValueError:
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            if x < 0:
+                sys.exit('syntax error for %s, expected a non-negative number but found: %s' % (opt,arg))
+            cost = cost_params
+            cost[opt[2:].replace('-','_')] = x
+        elif opt in ['--optimize']:
+            if not re.search(r'^\d+$',arg) or int(arg) < 1:
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            need_numpy(opt)
+            cost = cost_params
+            top = int(arg)
+        elif opt in ['--lead-time']:
+            try:
+                x = float(arg)
+            except ValueError:
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            if x <= 0:
+                sys.exit('syntax error for %s, expected a positive number but found: %s' % (opt,arg))
+            rebuild = rebuild_params
+            rebuild['lead'] = x
+        elif opt in ['--spares']:
+            if not re.search(r'^\d+$',arg):
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            rebuild = rebuild_params
+            rebuild['spares'] = int(arg)
+        elif opt in ['--sensitivity']:
+            sens = sens_params
+            sens['elasticity'] = True
+        elif opt in ['--uncertainty']:
+            if not re.search(r'^\d+$',arg) or int(arg) < 1:
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            need_numpy(opt)
+            sens = sens_params
+            sens['draws'] = int(arg)
+        elif opt in ['--mtbf-sd', '--mttr-sd', '--size-sd']:
+            try:
+                x = float(arg)
+            except ValueError:
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            if x < 0:
+                sys.exit('syntax error for %s, expected a non-negative number but found: %s' % (opt,arg))
+            sens_params[opt[2:].replace('-','_')] = x/100.
+        elif opt in ['--ure']:
+            try:
+                x = float(arg)
+            except ValueError:
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            if not 0 <= x < 1:
+                sys.exit('syntax error for %s, expected a probability less than 1 but found: %s' % (opt,arg))
+            rebuild = rebuild_params
+            rebuild['ure'] = x
+        elif opt in ['--scheme']:
+            try:
+                register_scheme(parse_scheme(arg))
+            except ValueError as msg:
+                sys.exit('syntax error for %s, %s' % (opt,msg))
+        elif opt in ['--csv']:
+            fmt = 'csv'
+        elif opt in ['-d', '--disk-name']:
+            disk = arg
+        elif opt in ['-f', '--filter']:
+            try:
+                re.compile(arg)
+            except re.error as msg:
+                sys.exit('syntax error for %s, bad pattern %s: %s' % (opt,arg,msg))
+            filters.append(arg)
+        elif opt in ['--format']:
+            if arg not in FORMATS:
+                sys.exit('syntax error for %s, expected one of %s but found: %s' % (opt,', '.join(FORMATS),arg))
+            fmt = arg
+        elif opt in ['-j', '--jobs']:
+            if not re.search(r'^\d+$',arg):
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            jobs = int(arg)
+        elif opt in ['--markov']:
+            need_numpy(opt)
+            markov = markov_params
+        elif opt in ['--max-afr', '--min-jdc', '--min-mttdl']:
+            try:
+                limits[opt[2:].replace('-','_')] = float(arg)
+            except ValueError:
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+        elif opt in ['--min-ft']:
+            if not re.search(r'^\d+$',arg):
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            limits['min_ft'] = int(arg)
+        elif opt in ['--mission', '--weibull']:
+            try:
+                x = float(arg)
+            except ValueError:
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            if opt == '--mission':
+                mission = x
+            else:
+                shape = x
+        elif opt in ['--seed', '--trials']:
+            if not re.search(r'^\d+$',arg):
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            if opt == '--seed':
+                seed = int(arg)
+            else:
+                trials = int(arg)
+        elif opt in ['--serve']:
+            m = re.search(r'^(?:(.*):)?(\d+)$', arg)
+            if not m:
+                sys.exit('syntax error for %s, expected [host:]port but found: %s' % (opt,arg))
+            address = (m.group(1) or '127.0.0.1', int(m.group(2)))
+        elif opt in ['--simulate']:
+            need_numpy(opt)
+            sim = True
+        elif opt in ['--interactive']:
+            need_numpy(opt)
+            interactive = True
+        elif opt in ['--mtbf'] :
+            try:
+                mtbfs = parse_range(arg)
+            except ValueError:
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            if min(mtbfs or [1]) <= 0:
+                sys.exit('syntax error for %s, expected a number greater than 0 but found: %s' % (opt,arg))
+        elif opt in ['--mttr'] :
+            try:
+                if '.' in arg:
+                    mttrs = parse_range(arg, float)
+                else:
+                    mttrs = parse_range(arg)
+            except ValueError:
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+            if min(mttrs or [1]) <= 0:
+                sys.exit('syntax error for %s, expected a number greater than 0 but found: %s' % (opt,arg))
+        elif opt in ['--no-key'] :
+            print_key = False
+        elif opt in ['--no-header'] :
+            print_header = False
+        elif opt in ['--no-title'] :
+            print_title = False
+        elif opt in ['-o', '--output'] :
+            output = arg
+        elif opt in ['--profile'] :
+            profile = arg
+        elif opt in ['--stats'] :
+            stats = True
+        elif opt in ['--stats-json'] :
+            stats_json = arg
+        elif opt in ['--pareto'] :
+            search = True
+        elif opt in ['-n'] :
+            if first:
+                first = False
+                Ns = []
+            try:
+                Ns.extend(parse_num_ranges(arg))
+            except Exception as msg:
+                sys.exit(msg)
+            if any(len(x) and x[0] < 1 for x in Ns):
+                sys.exit('syntax error for %s, expected a number greater than 0 but found: %s' % (opt,arg))
+        elif opt in ["-s", "--disk-size"] :
+            try:
+                sizes = parse_range(arg, float)
+            except ValueError:
+                sys.exit('syntax error for %s, expected a number but found: %s' % (opt,arg))
+        elif opt in ['--sweep'] :
+            need_numpy(opt)
+            engine = 'sweep'
+        elif opt in ['-v','--verbose'] :
+            verbose += 1
+        elif opt in ['-V','--version'] :
+            print('Version: '+VERSION)
+            sys.exit(0)
+        else:
+            sys.exit('Unrecognized option '+opt)
+
+    if fleet is None and [x for x,y in opts if x in ['--domain-mttr', '--jbod-mtbf', '--rack-mtbf', '--rack-size', '--span']]:
+        sys.exit('the failure domain options require --fleet')
+    if fleet is not None and fleet['rack_mtbf'] > 0 and fleet['rack'] == 0:
+        sys.exit('--rack-mtbf requires --rack-size')
+
+    if compare:
+        for (x, name) in [(sim, '--simulate'), (interactive, '--interactive'), (address, '--serve'),
+                          (top, '--optimize'), (catalog, '--catalog')]:
+            if x:
+                sys.exit('--compare cannot be used with %s' % (name))
+        if fmt not in ['text', 'csv']:
+            sys.exit('--compare only supports the text and csv formats')
+    if sens is not None:
+        for (x, name) in [(markov is not None, '--markov'), (rebuild and 'lead' in rebuild, '--lead-time'),
+                          (sim, '--simulate')]:
+            if x:
+                sys.exit('--sensitivity and --uncertainty use the closed form MTTDL, they cannot be used with %s' % (name))
+        sens['seed'] = seed
+    if top is not None:
+        for (x, name) in [(sim, '--simulate'), (interactive, '--interactive'), (address, '--serve'),
+                          (search, '--pareto'), (fleet, '--fleet'), (sens, '--sensitivity')]:
+            if x:
+                sys.exit('--optimize cannot be used with %s' % (name))
+        if fmt not in ['text', 'csv']:
+            sys.exit('--optimize only supports the text and csv formats')
+    # The TCO horizon is the mission time.
+    cost_params['years'] = mission
+
+    if stats or stats_json is not None:
+        STATS = Stats(start)
+    profiler = None
+    if profile is not None:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        records = None
+        if fmt not in ['text', 'csv']:
+            if sim:
+                sys.exit('--simulate only supports the text and csv formats')
+            if interactive:
+                sys.exit('--interactive only supports the text and csv formats')
+            if output is None:
+                sys.exit('--format %s requires --output' % (fmt))
+            need_numpy('--format %s' % (fmt))
+            out = None
+        elif output is not None:
+            out = open(output, 'w')
+        else:
+            out = sys.stdout
+
+        if address is not None or interactive or compare:
+            defaults = {'n': [n for r in Ns for n in ([r] if isinstance(r,int) else r)],
+                        'mtbf': mtbfs[0], 'mttr': mttrs[0], 'size': sizes[0],
+                        'capacity': Cs[0], 'filter': filters}
+            defaults.update(limits)
+        if interactive:
+            try:
+                session = Session(defaults, markov, rebuild)
+            except ValueError as msg:
+                sys.exit(msg)
+
+            def report(rows, q):
+                if search:
+                    rows = pareto(rows)
+                if fleet is not None:
+                    rows = fleet_rows(rows, q['mtbf'], fleet)
+                if cost is not None:
+                    rows = cost_rows(rows, cost)
+                if sens is not None:
+                    rows = sensitivity_rows(rows, q['mtbf'], q['mttr'], q['size'], rebuild, sens)
+                write_report(rows, fmt, disk, q['mtbf'], q['mttr'], q['size'], q['capacity'],
+                             print_title, print_header, print_key, out, rebuild, fleet, cost, sens)
+                out.flush()
+
+            interact(session, report)
+            return
+
+        # The rows are only cached on request and by the server, whose
+        # queries repeat. A cache computes all of the RAID types of an
+        # array size, the filtered ones too.
+        cache = None
+        if cache_file is not None or cache_size is not None or address is not None:
+            cache = RowCache(4096 if cache_size is None else cache_size, cache_file)
+
+        if compare:
+            if len(compare) == 1:
+                compare.insert(0, '')
+            names = tuple(x or 'the command line' for x in compare)
+            try:
+                (a, b) = (compare_source(x, defaults, Ns, markov, rebuild, engine, cache) for x in compare)
+                write_comparison(compare_rows(a, b, names), fmt, names, print_title, print_header, out)
+            except ImportError:
+                sys.exit('--compare of an arrow or parquet file requires pyarrow')
+            except (IOError, ValueError) as err:
+                sys.exit(err)
+            finally:
+                if cache is not None:
+                    cache.close()
+            return
+
+        if address is not None:
+            try:
+                serve(address, defaults, markov, engine, cache, rebuild)
+            finally:
+                cache.close()
+            return
+
+        if catalog is not None:
+            try:
+                models = read_catalog(catalog, Cs)
+            except ImportError:
+                sys.exit('a YAML catalog requires PyYAML')
+            except (IOError, ValueError) as err:
+                sys.exit('%s: %s' % (catalog, err))
+            disks = [x[0] for x in models]
+            params = [x[1:5] for x in models]
+            costs = [x[5] for x in models]
+            # The prices of a catalog turn on the cost model.
+            if [x for x in costs if x]:
+                cost = cost_params
+        else:
+            params = list(itertools.product(mtbfs, mttrs, sizes, Cs))
+            disks = [disk]*len(params)
+            costs = [{}]*len(params)
+        if cost is not None:
+            costs = [dict(cost, **x) for x in costs]
+        else:
+            costs = [None]*len(params)
+        if fmt not in ['text', 'csv']:
+            # The ranges are ascending, their last size is the largest.
+            N = max([r if isinstance(r,int) else r[-1] for r in Ns if isinstance(r,int) or len(r)] or [0])
+            try:
+                records = RecordWriter(fmt, output, dtype=record_dtype(disks, N))
+            except ImportError:
+                sys.exit('--format %s requires pyarrow' % (fmt))
+
+        if top is not None:
+            cases = [(disks[i],) + params[i] + (costs[i],) for i in range(len(params))]
+            (results, searched) = optimize(Ns, cases, filters, limits, markov, rebuild, top)
+            write_optimum(results, searched, len(cases), fmt, print_title, print_header, out, cost)
+            return
+
+        try:
+            if sim:
+                # The processes are used for the simulation batches.
+                results = enumerate(evaluate_cases(Ns, params, filters, limits, markov, engine, 1, cache, rebuild, search))
+                if search:
+                    with phase('search'):
+                        results = pareto_cases(results)
+                pool = None
+                if jobs>1:
+                    pool = worker_pool(jobs)
+                try:
+                    for i,((mtbf,mttr,size,C),rows) in results:
+                        if search:
+                            if STATS is not None:
+                                STATS.count('reported', len(rows))
+                        elif STATS is not None:
+                            rows = STATS.timed(rows)
+                        with phase('output'):
+                            write_simulation(rows, fmt, disks[i], mtbf, mttr, size, C,
+                                             mission, trials, shape, seed, pool,
+                                             print_title, print_header, out, rebuild)
+                finally:
+                    if pool is not None:
+                        pool.close()
+                        pool.join()
+                return
+
+            # The Pareto search keeps the frontier of each combination
+            # and then the one across all of them.
+            results = enumerate(evaluate_cases(Ns, params, filters, limits, markov, engine, jobs, cache, rebuild, search))
+            last = len(params)-1
+            if search:
+                with phase('search'):
+                    results = pareto_cases(results)
+                last = results[-1][0]
+            for i,((mtbf,mttr,size,C),rows) in results:
+                if search:
+                    if STATS is not None:
+                        STATS.count('reported', len(rows))
+                elif STATS is not None:
+                    rows = STATS.timed(rows)
+                if fleet is not None:
+                    rows = fleet_rows(rows, mtbf, fleet)
+                if cost is not None:
+                    rows = cost_rows(rows, costs[i])
+                if sens is not None:
+                    rows = sensitivity_rows(rows, mtbf, mttr, size, rebuild, sens)
+                with phase('output'):
+                    if records is not None:
+                        records.write(rows, mtbf, mttr, size, C, disks[i])
+                        continue
+                    # Only print the key once, after the last report.
+                    write_report(rows, fmt, disks[i], mtbf, mttr, size, C,
+                                 print_title, print_header,
+                                 print_key and i == last, out, rebuild, fleet, costs[i], sens)
+        finally:
+            if cache is not None:
+                cache.close()
+            if records is not None:
+                records.close()
+            elif out is not sys.stdout:
+                out.close()
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile)
+        if STATS is not None:
+            import json
+            report = STATS.report()
+            if stats:
+                STATS.write(sys.stderr, report)
+            if stats_json == '-':
+                sys.stderr.write(json.dumps(report, sort_keys=True)+'\n')
+            elif stats_json is not None:
+                with open(stats_json, 'w') as fp:
+                    json.dump(report, fp, indent=2, sort_keys=True)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,1148 @@
+"""
+Behavioral checks of raid.py, run with: python -m unittest discover tests
+"""
+import contextlib
+import csv
+import http.server
+import io
+import json
+import math
+import multiprocessing
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+import unittest.mock
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import raid
+
+# NumPy is imported when it is first used.
+try:
+    raid.load_numpy()
+except ImportError:
+    pass
+
+def command(start=None):
+    """
+    @param start  The multiprocessing start method, if any.
+    @returns the command that runs raid.py.
+    """
+    if start is None:
+        return [sys.executable, os.path.join(ROOT, 'raid.py')]
+    return [sys.executable, '-c',
+            'import multiprocessing, sys; sys.path.insert(0, %r); import raid; '
+            'multiprocessing.set_start_method(%r); '
+            'sys.argv[0] = "raid.py"; raid.main()' % (ROOT, start)]
+
+def run(*args, start=None, input=None):
+    """
+    Run raid.py.
+
+    @param args   The command line arguments.
+    @param start  The multiprocessing start method, if any.
+    @param input  The standard input, if any.
+    @returns the (stdout, stderr) tuple.
+    """
+    proc = subprocess.Popen(command(start) + list(args), cwd=ROOT,
+                            stdin=subprocess.PIPE if input is not None else None,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    (out, err) = proc.communicate(input)
+    if proc.returncode != 0:
+        raise AssertionError(err)
+    return (out, err)
+
+def fail(*args):
+    """
+    Run raid.py with arguments that are rejected.
+
+    @param args  The command line arguments.
+    @returns the error message.
+    """
+    proc = subprocess.Popen(command() + list(args), cwd=ROOT,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    (out, err) = proc.communicate()
+    if proc.returncode == 0:
+        raise AssertionError('%s was accepted' % (' '.join(args)))
+    return err.strip()
+
+def csv_rows(out):
+    """
+    @param out  The CSV report.
+    @returns the (N, parity, type) of each row.
+    """
+    rows = [x.split(',') for x in out.splitlines() if x.startswith(',,')]
+    return [(int(x[2]), int(x[3]), x[-1]) for x in rows if x[2] != 'N']
+
+def row_keys(rows):
+    """
+    @param rows  The Row records.
+    @returns the (N, parity, type) of each row.
+    """
+    return [(x.n, x.p, x.type) for x in rows]
+
+class LibraryTest(unittest.TestCase):
+
+    def test_closed_form(self):
+        # mtbf^(p+1) / (mttr^p * N*(N-1)*...*(N-p))
+        rows = raid.raid_rows(4, scheme='RAID-5/Z1')
+        self.assertEqual([(x.type, x.mttdl) for x in rows], [('RAID-5/Z1', 1953125000)])
+        (row,) = raid.raid_rows(6, scheme='RAID-6/Z2')
+        self.assertEqual(row.mttdl, 6103515625000)
+        self.assertEqual(row.mttdl_yrs, 6103515625000/(365.*24))
+        self.assertEqual((row.b, row.s, row.bd, row.dc), (3, 6, 18, 8.0))
+
+    def test_filters(self):
+        rows = raid.raid_rows(6, filters=['Z2', 'RAID-10'])
+        self.assertEqual([x.type for x in rows], ['RAID-6/Z2', 'RAID-10(M=5)'])
+        self.assertEqual(raid.raid_rows(1, scheme='RAID-6/Z2'), [])
+
+    def test_write_report(self):
+        out = io.StringIO()
+        raid.write_report(raid.raid_rows(6, mttr=48), 'csv', disk='x', mttr=48, out=out)
+        self.assertEqual(out.getvalue(), run('-n', '6', '-d', 'x', '--mttr', '48', '--csv')[0])
+
+class LogSpaceTest(unittest.TestCase):
+
+    def test_closed_form(self):
+        self.assertEqual(raid.closed_mttdl(4, 1, 750000, 24), 1953125000)
+        self.assertEqual(raid.closed_mttdl(6, 2, 750000, 24), 6103515625000)
+        # Without parity the MTTR does not matter, even when it is 0.
+        self.assertEqual(raid.closed_mttdl(4, 0, 750000, 0), 187500)
+
+    def test_overflow(self):
+        # RAID-10 of a large N does not fit in a float, the log space
+        # MTTDL is a Decimal.
+        mttdl = raid.closed_mttdl(400, 399, 750000, 24)
+        self.assertFalse(isinstance(mttdl, float))
+        lf = raid.log_factorial(400)
+        expect = 400*math.log(750000) - 399*math.log(24) - lf[400]
+        self.assertAlmostEqual(float(mttdl.ln()), expect, 9)
+        (row,) = raid.raid_rows(400, scheme='RAID-10')
+        self.assertEqual(row.mttdl, mttdl)
+
+    def test_bad_values(self):
+        for (opt, arg) in [('--mtbf', '0'), ('--mttr', '0-24'), ('--mttr', '0.0'), ('-n', '0-4')]:
+            self.assertEqual(fail(opt, arg),
+                             'syntax error for %s, expected a number greater than 0 but found: %s' % (opt, arg))
+
+class RangeTest(unittest.TestCase):
+
+    def test_parse_range(self):
+        self.assertEqual(raid.parse_range('24'), [24])
+        self.assertEqual(raid.parse_range('12,24,48'), [12, 24, 48])
+        self.assertEqual(raid.parse_range('500000-1000000:250000'), [500000, 750000, 1000000])
+        self.assertEqual(raid.parse_range('1-3,8,10-11'), [1, 2, 3, 8, 10, 11])
+        self.assertEqual(raid.parse_range('5-3'), [])
+
+    def test_parse_float_range(self):
+        self.assertEqual(raid.parse_range('.5-2:.5', float), [0.5, 1.0, 1.5, 2.0])
+        # The steps are counted, 0.1 does not accumulate rounding errors.
+        self.assertEqual(raid.parse_range('0-1:0.1', float), [x/10. for x in range(11)])
+        self.assertEqual(raid.parse_range('1.5,4-6:0.75', float), [1.5, 4.0, 4.75, 5.5])
+
+    def test_parse_bad_range(self):
+        for x in ['', 'x', '1-', '-1', '1-2:', '1-4:0', '1.5', '1,,2', '1-2-3']:
+            self.assertRaises(ValueError, raid.parse_range, x)
+        self.assertRaises(ValueError, raid.parse_range, '1-2:0.0', float)
+        self.assertRaises(ValueError, raid.parse_range, '1e3', float)
+        self.assertEqual(fail('--mtbf', '1-2:0'),
+                         'syntax error for --mtbf, expected a number but found: 1-2:0')
+
+    def test_jobs_order(self):
+        # The combinations are reported in the order of the values,
+        # whatever the number of jobs.
+        args = ['-n', '3-8', '--mtbf', '900000,500000,700000', '--mttr', '48,12', '--csv']
+        (serial, _) = run(*args)
+        self.assertEqual(run(*(args + ['-j', '3']))[0], serial)
+        mtbfs = [x for x in serial.splitlines() if x.startswith('MTBF,')]
+        mttrs = [x for x in serial.splitlines() if x.startswith('MTTR,')]
+        self.assertEqual(mtbfs, ['MTBF,900000']*2 + ['MTBF,500000']*2 + ['MTBF,700000']*2)
+        self.assertEqual(mttrs, ['MTTR,48', 'MTTR,12']*3)
+
+class StreamTest(unittest.TestCase):
+
+    def test_parse_num_ranges(self):
+        self.assertEqual([list(x) for x in raid.parse_num_ranges('3-5,9,7-8')], [[3, 4, 5], [9], [7, 8]])
+        self.assertEqual(list(raid.iter_sorted(raid.parse_num_ranges('3-5,9,4-6'))), [3, 4, 4, 5, 5, 6, 9])
+        self.assertEqual(list(raid.iter_sorted([2, 7, range(3, 5)])), [2, 3, 4, 7])
+        self.assertTrue(fail('-n', '3-x'))
+
+    def test_iter_rows(self):
+        rows = [x for n in range(1, 41) for x in raid.raid_rows(n)]
+        self.assertEqual(list(raid.iter_rows(raid.parse_num_ranges('21-40,1-20'))), rows)
+        if raid.numpy is not None:
+            # The sweep blocks do not change the rows.
+            for chunk in [1, 7, 4096]:
+                sweep = list(raid.iter_rows([range(1, 41)], engine='sweep', chunk=chunk))
+                self.assertEqual([(x.n, x.type) for x in sweep], [(x.n, x.type) for x in rows])
+
+    def test_chunk_writer(self):
+        out = io.StringIO()
+        w = raid.ChunkWriter(out, 10)
+        w.write('abcd')
+        w.write('efgh')
+        self.assertEqual(out.getvalue(), '')
+        w.write('ijkl')
+        self.assertEqual(out.getvalue(), 'abcdefghijkl')
+        w.write('m')
+        w.flush()
+        self.assertEqual(out.getvalue(), 'abcdefghijklm')
+
+class FilterTest(unittest.TestCase):
+
+    def test_type_filter(self):
+        f = raid.TypeFilter(['RAID-5', 'Z3'])
+        self.assertEqual([x for x in ['RAID-0', 'RAID-5/Z1', 'RAID-Z3'] if f(x)], ['RAID-5/Z1', 'RAID-Z3'])
+        self.assertTrue(raid.TypeFilter([])('RAID-0'))
+        # Each pattern keeps its own flags and groups.
+        f = raid.TypeFilter(['(?i)z2', r'(\d)0\(M=\1\)'])
+        self.assertEqual([x for x in ['RAID-6/Z2', 'RAID-10(M=1)', 'RAID-10(M=3)'] if f(x)],
+                         ['RAID-6/Z2', 'RAID-10(M=1)'])
+        self.assertEqual([x.type for x in raid.raid_rows(6, filters=['(?i)raid-z'])], ['RAID-Z3'])
+
+    def test_bad_pattern(self):
+        self.assertRaises(re.error, raid.TypeFilter, ['RAID-(5'])
+        self.assertTrue(fail('-f', 'RAID-(5').startswith('syntax error for -f, bad pattern RAID-(5: '))
+
+    def test_within_limits(self):
+        limits = {'min_ft': 2, 'min_mttdl': 1000., 'max_afr': 0.1, 'min_jdc': 10.}
+        self.assertTrue(raid.within_limits({}, 0, 0., 100., 0.))
+        self.assertTrue(raid.within_limits(limits, 2, 1000., 0.1, 10.))
+        for x in [(1, 1e6, 0., 1e3), (3, 999., 0., 1e3), (3, 1e6, 0.2, 1e3), (3, 1e6, 0., 9.)]:
+            self.assertFalse(raid.within_limits(limits, *x))
+        if raid.numpy is not None:
+            a = raid.numpy.array
+            mask = raid.within_limits(limits, a([2, 1, 3]), a([2e3, 2e3, 2e3]), a([0., 0., 0.5]), a([20., 20., 20.]))
+            self.assertEqual(mask.tolist(), [True, False, False])
+
+    def test_limit_options(self):
+        for (opt, arg, keep) in [('--min-ft', '2', lambda x: x.ft >= 2),
+                                 ('--min-mttdl', '1e5', lambda x: x.mttdl_yrs >= 1e5),
+                                 ('--max-afr', '0.01', lambda x: x.afr <= 0.01),
+                                 ('--min-jdc', '30', lambda x: x.jdc >= 30)]:
+            args = ['-n', '2-20', '-s', '4', '--csv', opt, arg]
+            (out, _) = run(*args)
+            rows = [x for n in range(2, 21) for x in raid.raid_rows(n, size=4.) if keep(x)]
+            self.assertTrue(0 < len(rows) < 19*6)
+            self.assertEqual(csv_rows(out), row_keys(rows))
+            self.assertEqual(raid.raid_rows(8, size=4., limits={opt[2:].replace('-', '_'): float(arg)}),
+                             [x for x in rows if x.n == 8])
+            if raid.numpy is not None:
+                self.assertEqual(run(*(args + ['--sweep']))[0], out)
+        self.assertEqual(fail('--min-ft', 'x'), 'syntax error for --min-ft, expected a number but found: x')
+
+def brute_pareto(rows):
+    """
+    @param rows  The Row records.
+    @returns the rows that no other row dominates, in order.
+    """
+    return [x for x in rows if not any(raid.dominates(y, x) for y in rows)]
+
+class ParetoTest(unittest.TestCase):
+
+    def test_random(self):
+        rand = random.Random(1)
+        for i in range(50):
+            row = raid.Row(*((0,)*(len(raid.Row._fields)-1)))
+            rows = [row._replace(jdc=rand.randint(0, 5), mttdl_yrs=rand.randint(0, 5), s=rand.randint(0, 3),
+                                 type='x%d' % (j)) for j in range(40)]
+            self.assertEqual(raid.pareto(rows), brute_pareto(rows))
+
+    def test_report(self):
+        rows = [x for n in range(2, 25) for x in raid.raid_rows(n, C=48, limits={'min_mttdl': 1e6})]
+        frontier = brute_pareto(rows)
+        self.assertEqual(raid.pareto(rows), frontier)
+        (out, _) = run('-n', '2-24', '-c', '48', '--min-mttdl', '1e6', '--pareto', '--csv')
+        self.assertEqual(csv_rows(out), row_keys(frontier))
+
+    @unittest.skipIf(raid.numpy is None, 'the sweep engine requires numpy')
+    def test_mask(self):
+        numpy = raid.numpy
+        rand = random.Random(2)
+        row = raid.Row(*((0,)*(len(raid.Row._fields)-1)))
+        for i in range(50):
+            jdc = numpy.array([float(rand.randint(0, 5)) for j in range(60)])
+            mttdl_yrs = numpy.array([rand.choice([0., 1., 2., 3., float('inf')]) for j in range(60)])
+            s = numpy.array([rand.randint(0, 3) for j in range(60)])
+            keep = raid.pareto_mask(jdc, mttdl_yrs, s)
+            rows = [row._replace(jdc=jdc[j], mttdl_yrs=mttdl_yrs[j], s=s[j], type=j) for j in range(60)]
+            # The frontier is kept and the rows dropped are dominated.
+            self.assertTrue(all(keep[x.type] for x in brute_pareto(rows)))
+            for j in numpy.flatnonzero(~keep):
+                self.assertTrue(any(raid.dominates(x, rows[j]) for x in rows))
+
+    @unittest.skipIf(raid.numpy is None, 'the sweep engine requires numpy')
+    def test_sweep(self):
+        # Some of the MTTDL are out of the float range.
+        for (C, spares) in [(60, None), (36, 4)]:
+            rebuild = None if spares is None else {'spares': spares}
+            rows = list(raid.iter_rows([range(2, 61)], C=C, rebuild=rebuild))
+            frontier = brute_pareto(rows)
+            self.assertEqual(list(raid.iter_rows([range(2, 61)], C=C, rebuild=rebuild, search=True)), frontier)
+            for chunk in [7, 4096]:
+                rows = raid.iter_rows([range(2, 61)], C=C, rebuild=rebuild, engine='sweep', search=True, chunk=chunk)
+                self.assertEqual(row_keys(rows), row_keys(frontier))
+
+    def test_cases(self):
+        # The frontier is across the JBOD capacities.
+        rows = [x for C in [12, 24, 48] for n in range(2, 25)
+                for x in raid.raid_rows(n, C=C, limits={'min_mttdl': 1e6})]
+        frontier = brute_pareto(rows)
+        self.assertEqual(set(x.c for x in frontier), set([48]))
+        for engine in ([] if raid.numpy is None else ['--sweep']) + [[]]:
+            (out, _) = run('-n', '2-24', '-c', '12,24,48', '--min-mttdl', '1e6', '--pareto', '--csv', *engine)
+            self.assertEqual(csv_rows(out), row_keys(frontier))
+        # And across the disk models of a catalog.
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        try:
+            with os.fdopen(fd, 'w') as fp:
+                fp.write('name,mtbf,mttr,size\nbig,750000,24,8\nsafe,2000000,12,2\n')
+            rows = [(name, x) for (name, mtbf, mttr, size) in [('big', 750000, 24, 8.0), ('safe', 2000000, 12, 2.0)]
+                    for n in range(2, 25) for x in raid.raid_rows(n, mtbf, mttr, size)]
+            frontier = brute_pareto([x for (name, x) in rows])
+            names = [name for (name, x) in rows if x in frontier]
+            self.assertEqual(set(names), set(['big', 'safe']))
+            (out, _) = run('--catalog', path, '-n', '2-24', '--pareto', '--csv', '-j', '2')
+            self.assertEqual(csv_rows(out), row_keys(frontier))
+            self.assertEqual([x.split(',')[1] for x in out.splitlines() if x.startswith('Disk,')],
+                             sorted(set(names), key=names.index))
+        finally:
+            os.remove(path)
+
+def chain_mttdl(N, p, mtbf, mttr, h, corr):
+    """
+    Solve the Markov chain of an array with its full generator.
+
+    @param N     The number of disks.
+    @param p     The fault tolerance.
+    @param mtbf  The mean time between failures in hours.
+    @param mttr  The mean time to repair in hours.
+    @param h     The chance that the last rebuild loses the data.
+    @param corr  The correlated failure factor.
+    @returns the mean time to absorption from state 0.
+    """
+    numpy = raid.numpy
+    Q = numpy.zeros((p+1, p+1))
+    for k in range(p+1):
+        up = (N-k)/mtbf * (corr if k else 1.)
+        Q[k, k] -= up
+        if k < p:
+            Q[k, k+1] += up
+        if k:
+            Q[k, k] -= 1./mttr
+            Q[k, k-1] += (1.-h if k == p else 1.)/mttr
+    return numpy.linalg.solve(-Q, numpy.ones(p+1))[0]
+
+@unittest.skipIf(raid.numpy is None, 'the Markov model requires numpy')
+class MarkovTest(unittest.TestCase):
+
+    def test_hand_solved(self):
+        # With no LSE and no correlation the chain of a parity 1 array
+        # is solved by hand: ((2N-1)*l + m) / (N*(N-1)*l^2).
+        (N, mtbf, mttr) = (6, 750000., 24.)
+        (l, m) = (1/mtbf, 1/mttr)
+        mttdl = raid.markov_mttdl(N, 1, mtbf, mttr, 2.0, {})[0]
+        self.assertAlmostEqual(mttdl / (((2*N-1)*l + m) / (N*(N-1)*l*l)), 1, 12)
+        # It is close to the closed form.
+        self.assertAlmostEqual(mttdl / (mtbf**2/(mttr*N*(N-1))), 1, 2)
+        # With both, the last rebuild reads the N-1 disks left and
+        # fails with the chance h: (up/(N*l) + 1) / ((N-1)*l*c + m*h)
+        # where up = (N-1)*l*c + m.
+        (lse, corr) = (0.01, 3.)
+        h = -math.expm1(-lse*2.0*(N-1))
+        up = (N-1)*l*corr + m
+        expect = (up/(N*l) + 1) / ((N-1)*l*corr + m*h)
+        mttdl = raid.markov_mttdl(N, 1, mtbf, mttr, 2.0, {'lse': lse, 'corr': corr})[0]
+        self.assertAlmostEqual(mttdl / expect, 1, 12)
+        self.assertAlmostEqual(mttdl / chain_mttdl(N, 1, mtbf, mttr, h, corr), 1, 9)
+
+    def test_three_states(self):
+        # Parity 2, the transient states 0, 1 and 2, with LSE and
+        # correlated failures.
+        (N, mtbf, mttr, lse, corr) = (8, 100000., 48., 0.02, 5.)
+        h = -math.expm1(-lse*4.0*(N-2))
+        mttdl = raid.markov_mttdl(N, 2, mtbf, mttr, 4.0, {'lse': lse, 'corr': corr})[0]
+        self.assertAlmostEqual(mttdl / chain_mttdl(N, 2, mtbf, mttr, h, corr), 1, 9)
+        self.assertLess(mttdl, raid.markov_mttdl(N, 2, mtbf, mttr, 4.0, {})[0])
+
+    def test_mirror(self):
+        # The rebuild of a mirror reads one disk.
+        (N, lse) = (6, 0.1)
+        (row,) = raid.raid_rows(N, markov={'lse': lse}, scheme='RAID-1/10/01')
+        h = -math.expm1(-lse*2.0)
+        self.assertAlmostEqual(row.mttdl / chain_mttdl(N, 1, 750000., 24., h, 1.), 1, 9)
+        (row,) = raid.raid_rows(N, markov={'lse': lse}, scheme='RAID-5/Z1')
+        h = -math.expm1(-lse*2.0*(N-1))
+        self.assertAlmostEqual(row.mttdl / chain_mttdl(N, 1, 750000., 24., h, 1.), 1, 9)
+
+    def test_loop_sweep(self):
+        args = ['-n', '1-60', '--csv', '--markov', '--lse', '0.01', '--corr', '2', '--rebuild-rate', '100']
+        self.assertEqual(run(*args)[0], run(*(args + ['--sweep']))[0])
+
+@unittest.skipIf(raid.numpy is None, 'the simulator requires numpy')
+class SimulateTest(unittest.TestCase):
+
+    def test_serial_repairs(self):
+        # Two disks of one array fail at 10 and 12 and take 5 and 2
+        # hours to repair. The second repair waits for the first one,
+        # so the next failure of its slot is 3 hours later.
+        inf = float('inf')
+        numpy = raid.numpy
+        s = numpy.array([[[10., inf], [12., 20.]]])
+        e = numpy.array([[[15., inf], [14., 21.]]])
+        (t, done) = raid.serial_repairs(s, e, 100.)
+        self.assertEqual(t.tolist(), [[[10., inf], [12., 23.]]])
+        self.assertEqual(done.tolist(), [[[15., inf], [17., 24.]]])
+        (t, done) = raid.serial_repairs(s, e, 22.)
+        self.assertEqual(t.tolist(), [[[10., inf], [12., inf]]])
+        self.assertEqual(done.tolist(), [[[15., inf], [17., inf]]])
+
+    def test_parity_1(self):
+        (row,) = raid.raid_rows(4, mtbf=100000, mttr=100, C=5, scheme='RAID-5/Z1')
+        (prob, lo, hi) = raid.simulate(row, 100000, 100, 50, trials=20000, seed=1)
+        self.assertTrue(lo <= -math.expm1(-50*365*24./row.mttdl) <= hi)
+        # The batches only depend on the seed, not on the processes.
+        pool = multiprocessing.Pool(2)
+        try:
+            self.assertEqual(raid.simulate(row, 100000, 100, 50, trials=20000, seed=1, pool=pool),
+                             (prob, lo, hi))
+        finally:
+            pool.close()
+            pool.join()
+
+    def test_parity_2(self):
+        # The arrays repair one disk at a time like the Markov chain,
+        # whose loss probability over 25 years is 4.8%. With parallel
+        # repairs it would be about half of that.
+        (row,) = raid.raid_rows(4, mtbf=10000, mttr=100, C=5, scheme='RAID-6/Z2')
+        mttdl = raid.markov_mttdl(4, 2, 10000., 100., 2.0, {})[0]
+        (prob, lo, hi) = raid.simulate(row, 10000, 100, 25, trials=20000, seed=1)
+        self.assertTrue(lo <= -math.expm1(-25*365*24./mttdl) <= hi)
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_lru(self):
+        cache = raid.RowCache(size=2)
+        for n in [4, 5, 4, 6, 5]:
+            raid.raid_rows(n, cache=cache)
+        # 5 was evicted by 6, the least recently used was 5 not 4.
+        self.assertEqual((cache.hits, cache.misses), (1, 4))
+        self.assertEqual(list(cache.lru), [(6, 750000, 24, 2.0, 24, None, None), (5, 750000, 24, 2.0, 24, None, None)])
+
+    def test_file(self):
+        path = os.path.join(self.dir, 'rows.db')
+        cache = raid.RowCache(path=path)
+        rows = raid.raid_rows(8, cache=cache)
+        self.assertEqual(raid.raid_rows(8, filters=['Z'], cache=cache), [x for x in rows if 'Z' in x.type])
+        cache.close()
+        cache = raid.RowCache(path=path)
+        self.assertEqual(raid.raid_rows(8, cache=cache), rows)
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+        cache.close()
+
+        args = ['-n', '1-50', '--mttr', '24,48', '--csv']
+        (plain, _) = run(*args)
+        self.assertEqual(run(*(args + ['--cache', path]))[0], plain)
+        self.assertEqual(run(*(args + ['--cache', path, '-j', '2']))[0], plain)
+
+    def test_filtered(self):
+        # Without a cache only the rows that pass the filters are
+        # computed, a cache computes all of them.
+        for (extra, computed) in [([], 5), (['--cache-size', '64'], 30)]:
+            out = io.StringIO()
+            argv = ['raid.py', '-n', '4-8', '-f', 'RAID-6', '--csv'] + extra
+            with unittest.mock.patch.object(raid, 'closed_mttdl', wraps=raid.closed_mttdl) as f, \
+                 unittest.mock.patch.object(sys, 'argv', argv), contextlib.redirect_stdout(out):
+                raid.main()
+            self.assertEqual(len(csv_rows(out.getvalue())), 5)
+            self.assertEqual(f.call_count, computed)
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+@unittest.skipIf(raid.numpy is None, 'the binary formats require numpy')
+class RecordTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check(self, a):
+        # The reports are in the order of the MTTR values.
+        rows = [(mttr, x) for mttr in [24, 48] for n in range(3, 6) for x in raid.raid_rows(n, mttr=mttr)]
+        self.assertEqual([(float(m), int(n), int(p), t) for (m, n, p, t) in zip(a['mttr'], a['n'], a['p'], a['mttdl'])],
+                         [(float(m), x.n, x.p, x.mttdl) for (m, x) in rows])
+
+    def test_npy(self):
+        path = os.path.join(self.dir, 'rows.npy')
+        run('-n', '3-5', '--mttr', '24,48', '--format', 'npy', '-o', path)
+        self.check(raid.numpy.load(path, mmap_mode='r'))
+
+    def test_array_mttr(self):
+        # The MTTR of the report and the MTTR of each RAID type with
+        # its rebuild time are separate fields.
+        path = os.path.join(self.dir, 'rows.npy')
+        run('-n', '3-5', '--mttr', '24', '--rebuild-rate', '100', '--format', 'npy', '-o', path)
+        a = raid.numpy.load(path)
+        rows = [x for n in range(3, 6) for x in raid.raid_rows(n, rebuild={'rate': 100.})]
+        self.assertEqual(a['mttr'].tolist(), [24.]*len(rows))
+        self.assertEqual(a['array_mttr'].tolist(), [x.mttr for x in rows])
+        self.assertEqual(a['rio'].tolist(), [x.rio for x in rows])
+        self.assertTrue(a['array_mttr'].max() > 24)
+
+    @unittest.skipIf(pyarrow is None, 'the Arrow formats require pyarrow')
+    def test_arrow(self):
+        path = os.path.join(self.dir, 'rows.arrow')
+        run('-n', '3-5', '--mttr', '24,48', '--format', 'arrow', '-o', path)
+        table = pyarrow.ipc.open_file(path).read_all()
+        self.check(dict((k, table.column(k).to_pylist()) for k in ['n', 'p', 'mttr', 'mttdl']))
+
+    @unittest.skipIf(pyarrow is None, 'the Arrow formats require pyarrow')
+    def test_parquet(self):
+        import pyarrow.parquet
+        path = os.path.join(self.dir, 'rows.parquet')
+        run('-n', '3-5', '--mttr', '24,48', '--format', 'parquet', '-o', path)
+        table = pyarrow.parquet.read_table(path)
+        self.check(dict((k, table.column(k).to_pylist()) for k in ['n', 'p', 'mttr', 'mttdl']))
+
+    def test_width(self):
+        # The type field fits the RAID-10 type of the largest array.
+        dtype = raid.numpy.dtype(raid.record_dtype(N=10**40))
+        self.assertEqual(dtype['type'].itemsize // 4, len('RAID-10(M=%d)' % (10**40-1)))
+        self.assertRaises(ValueError, raid.row_records, raid.raid_rows(4), 750000, 24, 2.0,
+                          [(k, 'S4') if k == 'type' else (k, t) for (k, t) in raid.RECORD_DTYPE])
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+class CatalogTest(unittest.TestCase):
+
+    CSV = ['name,mtbf,mttr,size,capacity',
+           'ST2000DM001,750000,24,2,',
+           'WD40EFRX,1000000,36,4,',
+           'Supermicro 847,,,,36',
+           'Small,,,,12']
+
+    MODELS = [('ST2000DM001, Supermicro 847', 750000, 24, 2.0, 36, {}),
+              ('ST2000DM001, Small', 750000, 24, 2.0, 12, {}),
+              ('WD40EFRX, Supermicro 847', 1000000, 36, 4.0, 36, {}),
+              ('WD40EFRX, Small', 1000000, 36, 4.0, 12, {})]
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, text):
+        path = os.path.join(self.dir, name)
+        fp = open(path, 'w')
+        fp.write(text)
+        fp.close()
+        return path
+
+    def test_csv(self):
+        path = self.write('c.csv', '\n'.join(self.CSV) + '\n')
+        self.assertEqual(raid.read_catalog(path), self.MODELS)
+        # Without chassis the names are the disk names and the
+        # capacities are the -c values.
+        path = self.write('d.csv', '\n'.join(self.CSV[:3]) + '\n')
+        self.assertEqual(raid.read_catalog(path, [24, 48]),
+                         [('ST2000DM001', 750000, 24, 2.0, 24, {}), ('ST2000DM001', 750000, 24, 2.0, 48, {}),
+                          ('WD40EFRX', 1000000, 36, 4.0, 24, {}), ('WD40EFRX', 1000000, 36, 4.0, 48, {})])
+
+    def test_json(self):
+        catalog = {'disks': [{'name': 'ST2000DM001', 'mtbf': 750000},
+                             {'name': 'WD40EFRX', 'mtbf': 1000000, 'mttr': 36, 'size': 4}],
+                   'chassis': [{'name': 'Supermicro 847', 'capacity': 36}, {'name': 'Small', 'capacity': 12}]}
+        path = self.write('c.json', json.dumps(catalog))
+        self.assertEqual(raid.read_catalog(path), self.MODELS)
+        path = self.write('d.json', json.dumps(catalog['disks']))
+        self.assertEqual([x[0] for x in raid.read_catalog(path)], ['ST2000DM001', 'WD40EFRX'])
+
+    @unittest.skipIf(yaml is None, 'a YAML catalog requires PyYAML')
+    def test_yaml(self):
+        path = self.write('c.yaml', '\n'.join(['disks:',
+                                                '  - {name: ST2000DM001, mtbf: 750000}',
+                                                '  - {name: WD40EFRX, mtbf: 1000000, mttr: 36, size: 4}',
+                                                'chassis:',
+                                                '  - {name: Supermicro 847, capacity: 36}',
+                                                '  - {name: Small, capacity: 12}']))
+        self.assertEqual(raid.read_catalog(path), self.MODELS)
+
+    def test_bad(self):
+        for (name, text, err) in [('a.json', '["x"]', 'expected a disk model or a chassis but found: "x"'),
+                                  ('b.json', '{"disks": [{"mtbf": 1}, 2]}', 'expected a disk model or a chassis but found: 2'),
+                                  ('c.json', '{"disks": {"mtbf": 1}}', 'expected lists of disks and chassis'),
+                                  ('d.json', '3', 'expected a list of disk models or an object with disks and chassis'),
+                                  ('e.json', '[{"name": "x"}]', 'no disk models found'),
+                                  ('f.csv', 'name,mtbf\nx,fast\n', 'syntax error for mtbf of x, expected a number but found: fast'),
+                                  ('g.txt', '', 'unknown catalog format, expected .csv, .json, .yaml or .yml')]:
+            path = self.write(name, text)
+            try:
+                raid.read_catalog(path)
+            except ValueError as e:
+                self.assertEqual(str(e), err)
+            else:
+                self.fail('%s was accepted' % (text))
+            self.assertEqual(fail('--catalog', path), '%s: %s' % (path, err))
+
+    def test_report(self):
+        path = self.write('c.csv', '\n'.join(self.CSV) + '\n')
+        (out, _) = run('--catalog', path, '-n', '4-6', '--csv')
+        expect = ''
+        for (name, mtbf, mttr, size, C, cost) in self.MODELS:
+            (text, _) = run('-d', name, '--mtbf', str(mtbf), '--mttr', str(mttr), '-s', str(size), '-c', str(C),
+                            '-n', '4-6', '--csv')
+            expect += text
+        self.assertEqual(out, expect)
+        self.assertEqual(run('--catalog', path, '-n', '4-6', '--csv', '-j', '3')[0], out)
+
+    @unittest.skipIf(raid.numpy is None, 'the binary formats require numpy')
+    def test_records(self):
+        # The disk field fits the longest disk name.
+        disk = 'Seagate Barracuda ST2000DM001 ' * 4
+        path = self.write('c.csv', 'name,mtbf\n%s,750000\nx,1000000\n' % (disk))
+        out = os.path.join(self.dir, 'rows.npy')
+        run('--catalog', path, '-n', '3-5', '--format', 'npy', '-o', out)
+        a = raid.numpy.load(out)
+        self.assertEqual(len(a), 34)
+        self.assertEqual(sorted(set(a['disk'])), [disk, 'x'])
+        self.assertRaises(ValueError, raid.row_records, raid.raid_rows(4), 750000, 24, 2.0, 'x'*65)
+
+    def test_raid_types(self):
+        # The tables of the recent array sizes are kept.
+        for n in range(1, raid.RAID_TYPES_SIZE + 100):
+            raid.raid_types(n)
+        raid.raid_types(100)
+        self.assertEqual(len(raid.RAID_TYPES), raid.RAID_TYPES_SIZE)
+        self.assertEqual(list(raid.RAID_TYPES)[-2:], [raid.RAID_TYPES_SIZE + 99, 100])
+        self.assertTrue(raid.raid_types(100) is raid.raid_types(100))
+
+class QuietHandler(raid.MTTDLHandler, http.server.BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+class ServeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), QuietHandler)
+        self.server.defaults = {'n': [4, 5], 'mtbf': 750000, 'mttr': 24, 'size': 2.0, 'capacity': 24, 'filter': []}
+        self.server.batcher = raid.Batcher()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%d/mttdl' % (self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def get(self, query='', body=None):
+        try:
+            fp = urllib.request.urlopen(self.url + query, body)
+            (code, text) = (fp.getcode(), fp.read())
+        except urllib.error.HTTPError as err:
+            (code, text) = (err.code, err.read())
+        return (code, json.loads(text.decode('utf-8')))
+
+    def rows(self, rows):
+        return json.loads(json.dumps([raid.row_dict(row) for row in rows], default=str))
+
+    def test_query(self):
+        (code, result) = self.get()
+        self.assertEqual(code, 200)
+        self.assertEqual(result['rows'], self.rows(raid.raid_rows(4, 750000, 24, 2.0, 24) +
+                                                   raid.raid_rows(5, 750000, 24, 2.0, 24)))
+        (code, result) = self.get('?n=6-7&mtbf=1000000&filter=RAID-6&filter=RAID-10&min_ft=2')
+        self.assertEqual(code, 200)
+        self.assertEqual(result['rows'], self.rows(raid.raid_rows(6, 1000000, 24, 2.0, 24, filters=['RAID-6', 'RAID-10'],
+                                                                  limits={'min_ft': 2}) +
+                                                   raid.raid_rows(7, 1000000, 24, 2.0, 24, filters=['RAID-6', 'RAID-10'],
+                                                                  limits={'min_ft': 2})))
+        (code, post) = self.get('', json.dumps({'n': [7, 6], 'mtbf': 1000000, 'filter': ['RAID-6', 'RAID-10'],
+                                                'min_ft': 2}).encode('utf-8'))
+        self.assertEqual(post['rows'], result['rows'])
+
+    def test_errors(self):
+        for (query, body, code, err) in [('?filter=(', None, 400, 'bad filter: '),
+                                         ('?n=0', None, 400, 'n must have between 1 and '),
+                                         ('?mtbf=fast', None, 400, 'syntax error for mtbf, '),
+                                         ('?speed=1', None, 400, 'unknown query parameters: speed'),
+                                         ('', b'[1]', 400, 'bad request: expected a JSON object'),
+                                         ('/x', None, 404, 'not found: /mttdl/x')]:
+            (status, result) = self.get(query, body)
+            self.assertEqual(status, code)
+            self.assertTrue(result['error'].startswith(err), result['error'])
+
+class StatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_counts(self):
+        args = ['-n', '1-40', '--mtbf', '500000,750000', '--csv', '-f', 'RAID-[56]', '--stats-json', '-']
+        (out, err) = run(*args)
+        stats = json.loads(err)
+        self.assertEqual(stats['reported'], len(csv_rows(out)))
+        self.assertEqual(stats['candidates'], 466)
+        self.assertEqual(stats['filtered'] + stats['reported'], stats['candidates'])
+        self.assertEqual(sorted(stats['phases']), sorted(raid.Stats.PHASES))
+
+    def test_jobs(self):
+        # The workers send their counts back with the rows.
+        args = ['-n', '1-40', '--mtbf', '500000,750000', '--csv', '--stats-json', '-']
+        (serial, stats) = run(*args)
+        (out, err) = run(*(args + ['-j', '2']))
+        self.assertEqual(out, serial)
+        for key in ['candidates', 'filtered', 'reported', 'rows']:
+            self.assertEqual(json.loads(err)[key], json.loads(stats)[key])
+        self.assertTrue(json.loads(err)['children_max_rss_kb'] > 0)
+        # Only fork inherits the instrumentation of the parent.
+        for start in ['spawn', 'forkserver']:
+            (out, err) = run(*(args + ['-j', '2']), start=start)
+            self.assertEqual(out, serial)
+            self.assertEqual(json.loads(err)['rows'], json.loads(stats)['rows'])
+
+    def test_files(self):
+        (stats, profile) = (os.path.join(self.dir, 'stats.json'), os.path.join(self.dir, 'run.prof'))
+        (out, err) = run('-n', '4-8', '--stats', '--stats-json', stats, '--profile', profile)
+        self.assertTrue('compute' in err)
+        with open(stats) as fp:
+            self.assertEqual(json.load(fp)['reported'], len(csv_rows(run('-n', '4-8', '--csv')[0])))
+        self.assertTrue(os.path.getsize(profile) > 0)
+
+class RebuildTest(unittest.TestCase):
+
+    def test_mttr(self):
+        # A RAID-6 rebuild of 8 disks reads 6 and writes 1, at half of
+        # 100 MB/s.
+        (mttr, rio) = raid.rebuild_mttr(24, 2.0, 6, {'rate': 100., 'load': 50.})
+        self.assertEqual(rio, 14.)
+        self.assertAlmostEqual(mttr, 24 + 14e6/50./3600.)
+        self.assertEqual(raid.rebuild_mttr(24, 2.0, 6), (24, 14.))
+        (row,) = raid.raid_rows(8, rebuild={'rate': 100., 'load': 50.}, filters=['RAID-6'])
+        self.assertEqual((row.mttr, row.rio), (mttr, rio))
+        self.assertEqual(row.mttdl, raid.closed_mttdl(8, 2, 750000, mttr))
+
+    def test_ure(self):
+        # Reading 6 disks of 2 TB is 9.6e13 bits.
+        ure = -math.expm1(9.6e13*math.log1p(-1e-14))
+        self.assertAlmostEqual(raid.rebuild_ure(2.0, [0, 1, 6], {'ure': 1e-14})[2], ure)
+        self.assertEqual(raid.rebuild_ure(2.0, [0, 1, 6], {'ure': 1e-14})[0], 0.)
+        # The URE rate of the last rebuild is added to the rate of
+        # another failure, (N-p)*mttr/mtbf.
+        mttdl = raid.closed_mttdl(8, 2, 750000, 24)
+        u = ure*750000./(6*24)
+        self.assertAlmostEqual(raid.closed_mttdl(8, 2, 750000, 24, ure)/(mttdl/(1+u)), 1., 12)
+        (row,) = raid.raid_rows(8, rebuild={'ure': 1e-14}, filters=['RAID-6'])
+        self.assertAlmostEqual(row.ure, ure)
+        self.assertAlmostEqual(row.mttdl/raid.closed_mttdl(8, 2, 750000, 24, ure), 1., 12)
+        # Without parity the MTTR and the URE do not matter.
+        self.assertEqual(raid.closed_mttdl(4, 0, 750000, 0, 0.5), 187500)
+
+    @unittest.skipIf(raid.numpy is None, 'the Markov model requires numpy')
+    def test_markov(self):
+        # The rebuild of a mirror reads one disk, its LSE is the same
+        # as a URE with the same chance.
+        (row,) = raid.raid_rows(6, markov={'lse': 0.1}, filters=['RAID-1/10/01'])
+        ure = -math.expm1(-0.1*2.0)
+        self.assertAlmostEqual(row.mttdl/raid.markov_mttdl(6, 1, 750000, 24, 2.0, {}, ure)[0], 1., 12)
+        # A certain URE loses the data at the end of the first rebuild,
+        # or at a second failure before it.
+        self.assertAlmostEqual(raid.markov_mttdl(6, 1, 750000, 24, 2.0, {}, 1.)[0],
+                               750000/6. + 1/(5/750000. + 1/24.), 6)
+
+class FleetTest(unittest.TestCase):
+
+    def test_domain_loss(self):
+        # A domain with more disks of the array than its parity loses
+        # the data, otherwise p-d+1 of the other disks must fail before
+        # the domain is repaired.
+        self.assertEqual(raid.domain_loss(8, 2, 3, 750000, 24), 1.)
+        q = -math.expm1(-24/750000.)
+        self.assertAlmostEqual(raid.domain_loss(8, 2, 2, 750000, 24)/(6*q), 1., 12)
+        self.assertAlmostEqual(raid.domain_loss(8, 2, 1, 750000, 24)/(21*q*q), 1., 12)
+
+    def test_fleet(self):
+        # Without domain failures the arrays of the fleet lose data
+        # independently.
+        rows = raid.raid_rows(8, C=24, filters=['RAID-6'])
+        (row,) = raid.fleet_rows(rows, 750000, {'jbods': 100})
+        self.assertEqual(row.extra['fdc'], 100*row.jdc)
+        self.assertAlmostEqual(row.extra['fdle']*row.mttdl_yrs, 100*row.b, 9)
+        self.assertAlmostEqual(row.extra['fmttdl']*row.extra['fdle'], 1., 12)
+        # A JBOD failure loses its arrays when they have more than 2 of
+        # their 8 disks in it, with a span of 3. With a span of 4 it
+        # takes another failure before the JBOD is repaired.
+        (span1,) = raid.fleet_rows(rows, 750000, {'jbods': 100, 'jbod_mtbf': 500000.})
+        (span3,) = raid.fleet_rows(rows, 750000, {'jbods': 100, 'jbod_mtbf': 500000., 'span': 3})
+        (span4,) = raid.fleet_rows(rows, 750000, {'jbods': 100, 'jbod_mtbf': 500000., 'span': 4})
+        self.assertAlmostEqual(span1.extra['fdle'] - row.extra['fdle'], 100*365*24/500000., 9)
+        self.assertAlmostEqual(span3.extra['fdle'], span1.extra['fdle'], 9)
+        self.assertTrue(row.extra['fdle'] < span4.extra['fdle'] < span1.extra['fdle'])
+
+    def test_options(self):
+        self.assertEqual(fail('-n', '8', '--span', '2'), 'the failure domain options require --fleet')
+        self.assertEqual(fail('-n', '8', '--fleet', '10', '--rack-mtbf', '1e6'), '--rack-mtbf requires --rack-size')
+
+@unittest.skipIf(raid.numpy is None, 'the sessions require numpy')
+class SessionTest(unittest.TestCase):
+
+    def test_edits(self):
+        # A session after its edits writes the report of the command
+        # line with the same values.
+        for (args, edits, same) in [
+                ([], ['mttr 12', 'filter RAID-6 Z3', 'size 4'], ['--mttr', '12', '-f', 'RAID-6', '-f', 'Z3', '-s', '4']),
+                (['--mttr', '48', '-f', 'Z'], ['filter', 'mtbf 1000000', 'capacity 36', 'n 3-12'],
+                 ['--mttr', '48', '--mtbf', '1000000', '-c', '36', '-n', '3-12']),
+                (['--markov', '--lse', '0.01', '--ure', '1e-14', '--rebuild-rate', '100'],
+                 ['mttr 12', 'mttr 24', 'min_mttdl 1e10', 'size 8'],
+                 ['--markov', '--lse', '0.01', '--ure', '1e-14', '--rebuild-rate', '100', '--min-mttdl', '1e10', '-s', '8']),
+                (['--fleet', '100', '--jbod-mtbf', '500000'], ['min_ft 2', 'max_afr 1e-8', 'mtbf 500000'],
+                 ['--fleet', '100', '--jbod-mtbf', '500000', '--min-ft', '2', '--max-afr', '1e-8', '--mtbf', '500000'])]:
+            if '-n' not in same:
+                same = ['-n', '4-8'] + same
+            (out, err) = run(*(['-n', '4-8', '--csv', '--interactive'] + args), input='\n'.join(edits + ['show', '']))
+            self.assertEqual(out, run(*(['--csv'] + same))[0])
+            self.assertEqual(err.count('recomputed'), len(edits))
+
+    def test_recompute(self):
+        # An edit only recomputes the columns that depend on it.
+        (out, err) = run('-n', '4-8', '--interactive', input='mttr 12\nsize 4\nfilter Z2\nshow 1\n')
+        self.assertEqual([x.split(' for ')[0] for x in err.splitlines()],
+                         ['recomputed repair, mttdl, select', 'recomputed rio, dc, jdc, select',
+                          'recomputed types, select'])
+        self.assertEqual(len([x for x in out.splitlines() if re.match(r'^ *\d+ +\d+ ', x)]), 1)
+        (out, err) = run('-n', '4-8', '--interactive', input='speed 1\nshow x\n')
+        self.assertEqual(err.splitlines(), ['unknown query parameters: speed',
+                                            'syntax error for show, expected a number but found: x'])
+
+@unittest.skipIf(raid.numpy is None, 'the sweep engine requires numpy')
+class SchemeTest(unittest.TestCase):
+
+    def tearDown(self):
+        del raid.SCHEMES[raid.BUILTIN_SCHEMES:]
+        raid.RAID_TYPES.clear()
+
+    def test_parse(self):
+        rs = raid.parse_scheme('RS(4,2)')
+        self.assertEqual((rs.ft, rs.min, rs.eff, rs.amp), (2, 6, 4/6., 4))
+        self.assertEqual(raid.scheme_layout(rs, 12), (6, 2))
+        r60 = raid.parse_scheme('RAID-60(G=2)')
+        self.assertEqual((r60.ft, r60.min, raid.scheme_value(r60.eff, 12)), (2, 8, 8/12.))
+        self.assertEqual(raid.scheme_layout(r60, 12), (6, 2))
+        d = raid.parse_scheme('dRAID2:8d:2s')
+        self.assertEqual((d.ft, d.min, d.amp, raid.scheme_value(d.spread, 22)), (2, 12, 8, 2.))
+        for spec in ['RS(0,2)', 'RAID-50(G=0)', 'RAID-10(C=0)', 'dRAID2:0d', 'RAID-7']:
+            self.assertRaises(ValueError, raid.parse_scheme, spec)
+        self.assertEqual(fail('--scheme', 'RAID-7'), 'syntax error for --scheme, unknown RAID scheme: RAID-7')
+
+    def test_rows(self):
+        for spec in ['RS(4,2)', 'RAID-50(G=3)', 'RAID-10(C=3)']:
+            raid.register_scheme(raid.parse_scheme(spec))
+        rows = dict((x.type, x) for x in raid.raid_rows(12))
+        # Two stripes of 6 disks, each loses data after 3 failures.
+        self.assertEqual(rows['RS(4,2)'].p, 2)
+        self.assertAlmostEqual(rows['RS(4,2)'].mttdl, raid.closed_mttdl(6, 2, 750000, 24) / 2., delta=1.)
+        # Three RAID-5 groups of 4 disks.
+        self.assertAlmostEqual(rows['RAID-50(G=3)'].mttdl, raid.closed_mttdl(4, 1, 750000, 24) / 3., delta=1.)
+        self.assertEqual(rows['RAID-50(G=3)'].dc, 9*2.)
+        # Four triple mirrors.
+        self.assertAlmostEqual(rows['RAID-10(C=3)'].mttdl, raid.closed_mttdl(3, 2, 750000, 24) / 4., delta=1.)
+        # The schemes that cannot be built from 10 disks are left out.
+        types = [x.type for x in raid.raid_rows(10)]
+        self.assertFalse('RS(4,2)' in types or 'RAID-50(G=3)' in types)
+
+    def test_jobs(self):
+        # The workers register the schemes again with spawn and
+        # forkserver.
+        args = ['-n', '12', '--scheme', 'RS(4,2)', '--mtbf', '500000,750000', '--csv']
+        (serial, err) = run(*args)
+        self.assertTrue('RS(4,2)' in serial)
+        for start in ['spawn', 'forkserver']:
+            self.assertEqual(run(*(args + ['-j', '2']), start=start)[0], serial)
+
+def brute_optimum(Ns, cases, limits, top):
+    """
+    @param Ns      The array sizes.
+    @param cases   The (disk, mtbf, mttr, size, C, cost) tuples.
+    @param limits  The structured filters.
+    @param top     The number of configurations.
+    @returns the (TCO, disk, C, N, type) of the top configurations
+             of all of the rows, by ascending TCO.
+    """
+    rows = []
+    for (disk, mtbf, mttr, size, C, cost) in cases:
+        for N in Ns:
+            for row in raid.cost_rows(raid.raid_rows(N, mtbf, mttr, size, C, limits=limits), cost):
+                if math.isfinite(row.extra['tco']):
+                    rows.append((row.extra['tco'], disk, C, row.n, row.type))
+    return sorted(rows)[:top]
+
+class CostTest(unittest.TestCase):
+
+    COST = {'disk_price': 100., 'disk_watts': 8., 'chassis_price': 1000., 'kwh_price': 0.1,
+            'loss_cost': 0., 'years': 5}
+
+    def test_cost_values(self):
+        # 2000$ and 80W for 16TB, with no data lost.
+        (ctb, wtb, elc, tco) = raid.cost_values(10, 16., float('inf'), self.COST)
+        self.assertEqual((ctb, wtb, elc), (125., 5., 0.))
+        self.assertAlmostEqual(tco, (2000 + 5*80*8.76*0.1)/16.)
+        cost = dict(self.COST, loss_cost=500.)
+        self.assertEqual(raid.cost_values(10, 16., 2., cost)[2], 16*500/2.)
+        # No usable capacity.
+        self.assertEqual(raid.cost_values(10, 0., 2., cost)[0], float('inf'))
+
+    @unittest.skipIf(raid.numpy is None, 'NumPy is not installed')
+    def test_optimize(self):
+        Ns = list(range(1, 41))
+        cases = [(disk, mtbf, mttr, size, C, dict(self.COST, loss_cost=500., disk_price=price))
+                 for (disk, mtbf, mttr, size, price) in [('a', 750000, 24, 2.0, 60.), ('b', 1200000, 12, 4.0, 150.),
+                                                         ('c', 300000, 48, 1.0, 500.)]
+                 for C in [12, 24, 36]]
+        for limits in [{}, {'min_mttdl': 1e4}, {'min_ft': 2, 'max_afr': 1e-4}]:
+            for top in [1, 5, 20]:
+                (results, searched) = raid.optimize([range(1, 41)], cases, limits=limits, top=top, chunk=16)
+                expected = brute_optimum(Ns, cases, limits, top)
+                self.assertEqual([(disk, row.c, row.n, row.type) for (disk, mtbf, mttr, size, row) in results],
+                                 [x[1:] for x in expected])
+                for ((disk, mtbf, mttr, size, row), x) in zip(results, expected):
+                    self.assertAlmostEqual(row.extra['tco'], x[0], delta=1e-9*x[0])
+                # The disk c cannot win, it is never computed.
+                self.assertTrue(searched <= 6, searched)
+
+    @unittest.skipIf(raid.numpy is None, 'NumPy is not installed')
+    def test_catalog(self):
+        d = tempfile.mkdtemp()
+        try:
+            path = os.path.join(d, 'c.csv')
+            with open(path, 'w') as fp:
+                fp.write('name,mtbf,mttr,size,capacity,price,watts\n'
+                         'Cheap,500000,24,4,,80,8\n'
+                         'Fast,1500000,12,2,,150,6\n'
+                         'Big,,,,36,2000\n'
+                         'Small,,,,12,600\n')
+            models = raid.read_catalog(path)
+            self.assertEqual(models[0], ('Cheap, Big', 500000, 24, 4.0, 36,
+                                         {'disk_price': 80., 'disk_watts': 8., 'chassis_price': 2000.}))
+            (out, err) = run('--catalog', path, '-n', '2-24', '--loss-cost', '500', '--min-mttdl', '1000',
+                             '--optimize', '3', '--csv')
+        finally:
+            shutil.rmtree(d)
+        cost = {'disk_price': 0., 'disk_watts': 0., 'chassis_price': 0., 'kwh_price': 0.1,
+                'loss_cost': 500., 'years': 5}
+        cases = [x[:5] + (dict(cost, **x[5]),) for x in models]
+        expected = brute_optimum(range(2, 25), cases, {'min_mttdl': 1000.}, 3)
+        rows = [x for x in csv.reader(io.StringIO(out)) if len(x) > 2 and x[2].isdigit()]
+        self.assertEqual([(x[14], int(x[5]), int(x[3]), x[13]) for x in rows], [x[1:] for x in expected])
+        for (x, y) in zip(rows, expected):
+            self.assertAlmostEqual(float(x[12]), y[0], places=2)
+
+class SpareTest(unittest.TestCase):
+
+    def test_spare_wait(self):
+        # The replacements on order are Poisson, so one spare is
+        # exhausted with the chance 1-exp(-m) of a failure during the
+        # lead time.
+        (BD, mtbf, lead) = (100, 750000., 168.)
+        m = BD*lead/mtbf
+        (wait, exh) = raid.spare_wait(1, BD, mtbf, {'lead': lead})
+        self.assertAlmostEqual(exh, -math.expm1(-m), places=12)
+        # The sum over j >= 1 of P(j)*(1-1/(j+1)).
+        expect = sum(math.exp(-m)*m**j/math.factorial(j)*(1-1./(j+1)) for j in range(1, 60))
+        self.assertAlmostEqual(wait, lead*expect, places=9)
+        self.assertEqual(raid.spare_wait(0, BD, mtbf, {'lead': lead}), (lead, 1.))
+        # More spares wait less and the wait lengthens the MTTR.
+        self.assertTrue(raid.spare_wait(3, BD, mtbf, {'lead': lead})[0] < wait)
+        (row,) = raid.raid_rows(8, C=18, rebuild={'lead': lead}, filters=['RAID-6'])
+        self.assertEqual((row.b, row.s), (2, 2))
+        self.assertTrue(row.wait > 0 and row.mttr == 24 + row.wait)
+        self.assertAlmostEqual(row.mttdl, raid.closed_mttdl(8, 2, 750000, row.mttr), delta=1e-9*row.mttdl)
+
+    def test_spare_delays(self):
+        inf = float('inf')
+        t = raid.numpy.array([[10., 20., 700., inf], [5., inf, inf, inf]])
+        # The second failure waits for the replacement ordered by the
+        # first one.
+        self.assertEqual(raid.spare_delays(t, 1, 500.).tolist(), [[0., 490., 0., 0.], [0., 0., 0., 0.]])
+        self.assertEqual(raid.spare_delays(t, 0, 500.).tolist(), [[500., 500., 500., 0.], [500., 0., 0., 0.]])
+        # A repair starts when its spare is there.
+        s = raid.numpy.array([[[10., inf], [12., 20.]]])
+        e = raid.numpy.array([[[15., inf], [14., 21.]]])
+        spare = raid.numpy.array([[[0., 0.], [8., 0.]]])
+        (t, done) = raid.serial_repairs(s, e, 100., spare)
+        self.assertEqual(t.tolist(), [[[10., inf], [12., 28.]]])
+        self.assertEqual(done.tolist(), [[[15., inf], [22., 29.]]])
+
+    def test_simulate(self):
+        # Two arrays share one spare, the pool is often exhausted, so
+        # the data loss is much more likely than without the pool. It
+        # is a little more likely than with the expected wait of the
+        # analytic model, the waits come with clustered failures.
+        (row,) = raid.raid_rows(4, mtbf=20000, mttr=24, C=9, rebuild={'lead': 500.}, filters=['RAID-5'])
+        self.assertEqual((row.b, row.s), (2, 1))
+        (prob, lo, hi) = raid.simulate(row, 20000, row.mttr-row.wait, 5, trials=20000, seed=1, lead=500.)
+        self.assertTrue(raid.simulate(row, 20000, row.mttr-row.wait, 5, trials=20000, seed=1)[2] < lo)
+        analytic = -math.expm1(-row.b*5*365*24./row.mttdl)
+        self.assertTrue(abs(prob - analytic) < 0.25*analytic, (prob, analytic))
+
+class SensitivityTest(unittest.TestCase):
+
+    def test_closed_form(self):
+        # The elasticities of the closed form are p+1 for the MTBF and
+        # -p for the MTTR, the disk size has no effect without a
+        # rebuild model.
+        (out, err) = run('-n', '3-12', '--sensitivity', '--csv')
+        lines = out.splitlines()
+        header = lines[lines.index('')+1].split(',')
+        rows = [dict(zip(header, x.split(','))) for x in lines if x.startswith(',,')][1:]
+        self.assertTrue(len(rows) > 50)
+        for x in rows:
+            p = int(x['Parity'])
+            self.assertEqual((float(x['E(MTBF)']), float(x['E(MTTR)']), float(x['E(Size)'])), (p+1, -p, 0))
+
+    def test_rebuild(self):
+        # With a rebuild time and a URE the elasticities are the log
+        # derivatives of the MTTDL.
+        rebuild = {'rate': 100., 'load': 50., 'ure': 1e-15}
+        (mtbf, mttr, size, h) = (750000., 24., 8., 1e-4)
+        def log_mttdl(*args):
+            return [math.log(x.mttdl) for x in raid.raid_rows(12, *args, C=24, rebuild=rebuild)]
+        rows = list(raid.sensitivity_rows(raid.raid_rows(12, mtbf, mttr, size, C=24, rebuild=rebuild),
+                                          mtbf, mttr, size, rebuild, {'elasticity': True}))
+        d = math.log1p(h) - math.log1p(-h)
+        for (k, args) in [('eb', lambda f: (mtbf*f, mttr, size)), ('er', lambda f: (mtbf, mttr*f, size)),
+                          ('es', lambda f: (mtbf, mttr, size*f))]:
+            for (row, hi, lo) in zip(rows, log_mttdl(*args(1+h)), log_mttdl(*args(1-h))):
+                self.assertAlmostEqual(row.extra[k], (hi-lo)/d, places=4, msg=(k, row.type))
+        # RAID-0 has no URE term.
+        self.assertEqual((rows[0].type, rows[0].extra['eb'], rows[0].extra['er']), ('RAID-0', 1., 0.))
+
+    @unittest.skipIf(raid.numpy is None, 'NumPy is not installed')
+    def test_uncertainty(self):
+        rows = raid.raid_rows(8)
+        sens = {'draws': 20000, 'mtbf_sd': 0., 'mttr_sd': 0., 'size_sd': 0.}
+        for row in raid.sensitivity_rows(rows, 750000, 24, 2.0, sens=sens):
+            self.assertAlmostEqual(row.extra['q05']/row.mttdl_yrs, 1.)
+            self.assertAlmostEqual(row.extra['q95']/row.mttdl_yrs, 1.)
+        # The log of the MTTDL is normal with the SD (p+1)*sd.
+        sens = dict(sens, mtbf_sd=0.3, seed=1)
+        for row in raid.sensitivity_rows(rows, 750000, 24, 2.0, sens=sens):
+            self.assertAlmostEqual(math.log(row.extra['q50']/row.mttdl_yrs), 0., delta=0.05*(row.p+1))
+            self.assertAlmostEqual(math.log(row.extra['q95']/row.extra['q05']), 2*1.645*0.3*(row.p+1), delta=0.1*(row.p+1))
+        self.assertEqual(fail('-n', '8', '--uncertainty', '100', '--markov'),
+                         '--sensitivity and --uncertainty use the closed form MTTDL, they cannot be used with --markov')
+
+class CompareTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def compare(self, *args):
+        """
+        @param args  The command line arguments.
+        @returns the (counts, rows) tuple of the CSV comparison: the
+                 last three lines and the rows as dictionaries.
+        """
+        lines = run(*(list(args) + ['--csv']))[0].splitlines()
+        header = lines[lines.index('')+1].split(',')
+        rows = [dict(zip(header, x.split(','))) for x in lines if x.startswith(',,')][1:]
+        return (lines[-3:], rows)
+
+    def test_files(self):
+        (a, b) = (os.path.join(self.dir, 'a.csv'), os.path.join(self.dir, 'b.csv'))
+        run('-n', '3-5', '--csv', '-o', a)
+        run('-n', '3-5', '-f', 'Z', '--mttr', '48', '--csv', '-o', b)
+        (counts, rows) = self.compare('--compare', a, '--compare', b)
+        self.assertEqual(counts, ['Matched,8', 'Only A,9', 'Only B,0'])
+        matched = [x for x in rows if x['MTTDL B']]
+        self.assertEqual(sorted((x['N'], x['Parity'], x['Types']) for x in matched),
+                         sorted((n, p, t) for n in '345'
+                                for (p, t) in [('1', 'RAID-5/Z1'), ('2', 'RAID-6/Z2'), ('3', 'RAID-Z3')]
+                                if int(n) > int(p)))
+        # Twice the MTTR divides the MTTDL by 2**p.
+        for x in matched:
+            self.assertAlmostEqual(float(x['MTTDL Ratio']), 0.5**int(x['Parity']), delta=0.01)
+            self.assertEqual(x['DC Ratio'], '1')
+
+    def test_query(self):
+        # One --compare is compared with the command line.
+        (counts, rows) = self.compare('-n', '3-8', '-f', 'Z', '--compare', 'mttr=48')
+        self.assertEqual(counts[0], 'Matched,%d' % (len(rows)))
+        for x in rows:
+            self.assertAlmostEqual(float(x['MTTDL Ratio']), 0.5**int(x['Parity']), delta=1e-3)
+        self.assertEqual(fail('-n', '3-8', '--compare', 'mtbf=fast'),
+                         'syntax error for mtbf, expected a number but found: fast')
+
+    @unittest.skipIf(raid.numpy is None, 'NumPy is not installed')
+    def test_records(self):
+        # The records have the full precision, so the MTTDL that only
+        # fits in a Decimal is compared exactly.
+        a = os.path.join(self.dir, 'a.npy')
+        run('-n', '1-400,1000', '-f', 'RAID-10', '--format', 'npy', '-o', a)
+        (counts, rows) = self.compare('-n', '1-400,1000', '-f', 'RAID-10', '--compare', a, '--compare', '')
+        self.assertEqual(counts, ['Matched,%d' % (len(rows)), 'Only A,0', 'Only B,0'])
+        self.assertEqual(set(x['MTTDL Ratio'] for x in rows), set(['1']))
+
+    def test_rows(self):
+        a = [(3, 1, 'X', 1., 0., 1., 1.), (3, 1, 'X', 2., 0., 1., 1.), (4, 1, 'Y', 1., 0., 1., 1.)]
+        b = [(3, 1, 'X', 3., 0., 1., 1.), (3, 2, 'Z', 1., 0., 1., 1.), (5, 1, 'Y', 1., 0., 1., 1.)]
+        self.assertEqual(list(raid.compare_rows(a, b)),
+                         [(a[0], b[0]), (None, b[1]), (a[1], None), (a[2], None), (None, b[2])])
+        self.assertRaises(ValueError, list, raid.compare_rows(a[::-1], b))
+        (d, q) = raid.compare_delta(raid.decimal.Decimal('1e400'), raid.decimal.Decimal('3e400'))
+        self.assertEqual((d, raid.num2str(q)), (raid.decimal.Decimal('2e400'), '3'))
+        self.assertEqual(raid.compare_delta(0., 1.), (1., float('inf')))
+
+class SweepTest(unittest.TestCase):
+
+    def test_loop_sweep(self):
+        for extra in [['-n', '1-600'], ['-n', '1-400', '-f', 'RAID-10', '--mtbf', '1000000'],
+                      ['-n', '1-400', '--mttr', '1', '-c', '7'], ['-n', '1-40', '--mttr', '0.5', '--mtbf', '1000'],
+                      ['-n', '1-300', '--ure', '1e-14', '--rebuild-rate', '100', '--rebuild-load', '50'],
+                      ['-n', '1-100', '--markov', '--lse', '0.01', '--corr', '2', '--ure', '1e-15'],
+                      ['-n', '1-300', '--fleet', '1000', '--jbod-mtbf', '500000', '--rack-size', '8',
+                       '--rack-mtbf', '1000000', '--span', '3'],
+                      ['-n', '1-120', '--scheme', 'RS(4,2)', '--scheme', 'RAID-60(G=2)',
+                       '--scheme', 'dRAID2:8d:2s', '--rebuild-rate', '100'],
+                      ['-n', '1-200', '-c', '30', '--lead-time', '168'],
+                      ['-n', '1-100', '-c', '40', '--lead-time', '500', '--spares', '3', '--mtbf', '100000', '--markov'],
+                      ['-n', '1-150', '--sensitivity', '--uncertainty', '1000', '--ure', '1e-14', '--rebuild-rate', '100']]:
+            args = ['--csv'] + extra
+            self.assertEqual(run(*args)[0], run(*(args + ['--sweep']))[0])
+
+if __name__ == '__main__':
+    unittest.main()